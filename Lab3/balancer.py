@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ===========================
+#   REPLICA SELECTION
+# ===========================
+# Вибір репліки для читання:
+#   - power-of-two-choices: з двох випадкових реплік беремо дешевшу
+#     за ewma_latency * (inflight + 1)
+#   - circuit breaker на кожен endpoint: після BREAKER_FAILURES помилок підряд
+#     endpoint «відкритий» на cooldown, потім пропускаємо один пробний запит (half-open)
+#   - hedged reads: якщо відповіді немає за hedge_delay — шлемо той самий запит
+#     на іншу репліку і беремо першу відповідь
+
+EWMA_ALPHA = 0.3
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN_S = 5.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamError(Exception):
+    """Репліка відповіла 5xx — для breaker-а це така сама помилка, як таймаут."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+class EndpointStats:
+    __slots__ = ("ewma", "inflight", "failures", "state", "opened_at", "requests", "errors", "hedges")
+
+    def __init__(self):
+        self.ewma = 0.0             # с; 0 — ще не міряли (нові репліки отримують трафік одразу)
+        self.inflight = 0
+        self.failures = 0           # помилок підряд
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+
+
+class ReplicaBalancer:
+    def __init__(self, hedge_delay=0.05, workers=64, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_S):
+        self.hedge_delay = hedge_delay      # 0 вимикає hedging
+        self.failures = failures
+        self.cooldown = cooldown
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def _get(self, endpoint) -> EndpointStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats.setdefault(endpoint, EndpointStats())
+        return stats
+
+    # ---------- circuit breaker ----------
+    def _available(self, stats, now) -> bool:
+        if stats.state == CLOSED:
+            return True
+        if stats.state == OPEN and now - stats.opened_at >= self.cooldown:
+            return True             # можна пустити пробний запит
+        return False
+
+    def _record(self, endpoint, ok: bool, latency=None):
+        with self._lock:
+            stats = self._get(endpoint)
+            if latency is not None:
+                stats.ewma = latency if stats.ewma == 0 else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats.ewma
+            if ok:
+                stats.failures = 0
+                stats.state = CLOSED
+            else:
+                stats.errors += 1
+                stats.failures += 1
+                if stats.state == HALF_OPEN or stats.failures >= self.failures:
+                    stats.state = OPEN
+                    stats.opened_at = time.monotonic()
+
+    def record_probe(self, endpoint, ok: bool, latency=None):
+        """Результат фонового health check-у: живий endpoint закриває breaker після cooldown."""
+        with self._lock:
+            stats = self._get(endpoint)
+            if ok and stats.state != CLOSED and not self._available(stats, time.monotonic()):
+                return              # cooldown ще не минув — не закриваємо передчасно
+        self._record(endpoint, ok, latency)
+
+    # ---------- selection ----------
+    def pick(self, endpoints, exclude=()):
+        """Power-of-two-choices серед доступних endpoint-ів; None, якщо вибирати нема з чого."""
+        candidates = [e for e in endpoints if e not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in candidates if self._available(self._get(e), now)]
+            # усі breaker-и відкриті — краще спробувати, ніж одразу відмовити
+            pool = healthy or candidates
+            if len(pool) == 1:
+                choice = pool[0]
+            else:
+                a, b = random.sample(pool, 2)
+                choice = a if self._cost(a) <= self._cost(b) else b
+            stats = self._get(choice)
+            if stats.state == OPEN:
+                stats.state = HALF_OPEN
+            stats.inflight += 1
+            stats.requests += 1
+        return choice
+
+    def _cost(self, endpoint) -> float:
+        stats = self._stats[endpoint]
+        return (stats.ewma or 1e-4) * (stats.inflight + 1)
+
+    def _timed(self, endpoint, send):
+        start = time.monotonic()
+        try:
+            r = send(endpoint)
+        except Exception:
+            self._record(endpoint, False)
+            raise
+        finally:
+            with self._lock:
+                self._get(endpoint).inflight -= 1
+        if r.status_code >= 500:
+            self._record(endpoint, False, time.monotonic() - start)
+            raise UpstreamError(r)
+        self._record(endpoint, True, time.monotonic() - start)
+        return r
+
+    # ---------- hedged call ----------
+    def call(self, endpoints, send):
+        """
+        Виконує send(endpoint) -> Response на обраній репліці й повертає (endpoint, response).
+        Повільна репліка → hedge на іншу; помилка → повтор на іншій (кожна репліка — не більше разу).
+        Якщо впали всі — кидає останню помилку (5xx повертається як відповідь).
+        """
+        first = self.pick(endpoints)
+        futures = {self._pool.submit(self._timed, first, send): first}
+        tried, hedged, error, failed = {first}, False, None, None
+
+        while futures:
+            timeout = self.hedge_delay if self.hedge_delay and not hedged else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                nxt = self.pick(endpoints, exclude=tried)
+                if nxt is not None:
+                    tried.add(nxt)
+                    with self._lock:
+                        self._get(nxt).hedges += 1
+                    futures[self._pool.submit(self._timed, nxt, send)] = nxt
+                continue
+
+            for f in done:
+                endpoint = futures.pop(f)
+                try:
+                    return endpoint, f.result()
+                except Exception as e:
+                    error, failed = e, endpoint
+            if not futures:
+                nxt = self.pick(endpoints, exclude=tried)
+                if nxt is not None:
+                    tried.add(nxt)
+                    futures[self._pool.submit(self._timed, nxt, send)] = nxt
+
+        if isinstance(error, UpstreamError):
+            return failed, error.response
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    "state": s.state,
+                    "ewma_ms": round(s.ewma * 1000, 3),
+                    "inflight": s.inflight,
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "hedges": s.hedges,
+                }
+                for endpoint, s in self._stats.items()
+            }
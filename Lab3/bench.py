@@ -0,0 +1,415 @@
+"""
+Навантажувальний бенчмарк Lab3: throughput, latency, replication lag і WAL bytes.
+
+За замовчуванням піднімає весь кластер локально — local_s3.py замість MinIO,
+лідерів, follower-ів і coordinator — і після прогону зупиняє його:
+
+    python bench.py
+    python bench.py --shards 3 --followers 2 --concurrency 4 16 64 --duration 15 \\
+        --mix read=80,create=10,exists=5,delete=5 --dist zipfian --zipf-s 0.99 --json run.json
+    python bench.py --json new.json --compare run.json       # порівняти з попереднім прогоном
+    python bench.py --coordinator http://127.0.0.1:5000      # проти вже запущеного кластера
+
+Для кожного рівня concurrency друкує і зберігає в --json:
+  ops/s                     — успішних операцій за секунду (статус < 500)
+  p50/p95/p99               — latency у мс, загалом і окремо для кожної операції
+  lag mean/max              — відставання follower-ів від лідера в записах (семпл кожні 200 мс)
+  catch-up                  — скільки секунд follower-и доганяють лідера після зупинки навантаження
+  WAL bytes                 — байти, записані в shard_*/wal (лише з local_s3)
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TABLE = "bench"
+PRELOAD_BATCH = 500
+
+
+# ===========================
+#   LOCAL CLUSTER
+# ===========================
+class LocalCluster:
+    """local_s3 + N лідерів + M follower-ів на кожного + coordinator як підпроцеси."""
+
+    def __init__(self, n_shards, n_followers, base_port, log_dir, replication="leader", transport="http"):
+        self.n_shards = n_shards
+        self.n_followers = n_followers
+        self.replication = replication
+        self.transport = transport
+        self.base_port = base_port
+        self.log_dir = log_dir
+        self.procs = []
+
+        self.s3_url = f"http://127.0.0.1:{base_port}"
+        self.coordinator_url = f"http://127.0.0.1:{base_port + 1}"
+        self.shards = {
+            sid: {
+                "leader": f"http://127.0.0.1:{base_port + 10 + sid}",
+                "followers": [f"http://127.0.0.1:{base_port + 50 + sid * n_followers + j}"
+                              for j in range(n_followers)],
+            }
+            for sid in range(n_shards)
+        }
+
+    def _spawn(self, name, args, **env):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+        proc = subprocess.Popen(
+            [sys.executable] + args, cwd=HERE, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, "PYTHONUNBUFFERED": "1", **{k: str(v) for k, v in env.items()}},
+        )
+        self.procs.append(proc)
+
+    def start(self):
+        self._spawn("s3", ["local_s3.py", "--port", str(self.base_port)])
+        wait_ready(f"{self.s3_url}/_stats")
+
+        s3_env = {"AWS_ENDPOINT_URL": self.s3_url, "AWS_ACCESS_KEY_ID": "bench",
+                  "AWS_SECRET_ACCESS_KEY": "bench", "AWS_DEFAULT_REGION": "us-east-1", "BUCKET": TABLE,
+                  "RPC_ENABLED": int(self.transport == "rpc")}
+        for sid, shard in self.shards.items():
+            port = shard["leader"].rsplit(":", 1)[1]
+            self._spawn(f"leader{sid}", ["leader.py"], SHARD_ID=sid, INTERNAL_PORT=port, **s3_env)
+        for sid, shard in self.shards.items():
+            wait_ready(f"{shard['leader']}/offset")
+            for j, follower in enumerate(shard["followers"]):
+                self._spawn(f"follower{sid}{chr(ord('a') + j)}", ["follower.py"],
+                            LEADER_URL=shard["leader"], PORT=follower.rsplit(":", 1)[1],
+                            REPLICATION_SOURCE=self.replication, SHARD_ID=sid, **s3_env)
+        for shard in self.shards.values():
+            for follower in shard["followers"]:
+                wait_ready(f"{follower}/offset")
+
+        self._spawn("coordinator", ["coordinator.py"],
+                    SHARDS=json.dumps(self.shards), PORT=self.base_port + 1, SHARD_TRANSPORT=self.transport)
+        wait_ready(f"{self.coordinator_url}/rebalance")
+
+    def stop(self):
+        for proc in reversed(self.procs):
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready in {timeout}s")
+
+
+# ===========================
+#   WORKLOAD
+# ===========================
+class KeyChooser:
+    """Індекс ключа з [0, n): uniform або zipfian (ймовірність рангу r ~ 1 / r^s)."""
+
+    def __init__(self, n, dist, s, seed):
+        self.n = n
+        self.dist = dist
+        if dist == "zipfian":
+            weights = [1 / (rank ** s) for rank in range(1, n + 1)]
+            total = sum(weights)
+            self.cdf = list(itertools.accumulate(w / total for w in weights))
+            # гарячі ранги розкидаємо по ключах, щоб вони не лягли всі на один shard
+            self.perm = list(range(n))
+            random.Random(seed).shuffle(self.perm)
+
+    def choose(self, rnd) -> int:
+        if self.dist == "uniform":
+            return rnd.randrange(self.n)
+        return self.perm[min(bisect.bisect(self.cdf, rnd.random()), self.n - 1)]
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in ("read", "create", "exists", "delete"):
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}")
+        mix[op] = float(weight)
+    return mix
+
+
+def preload(coordinator, n_keys):
+    requests.post(f"{coordinator}/register_table", json={"table_name": TABLE}, timeout=10)
+    for start in range(0, n_keys, PRELOAD_BATCH):
+        items = [{"table_name": TABLE, "partition_key": f"k{i}", "sort_key": "0", "value": {"n": i}}
+                 for i in range(start, min(n_keys, start + PRELOAD_BATCH))]
+        requests.post(f"{coordinator}/batch_write", json={"items": items}, timeout=30).raise_for_status()
+
+
+class Workload:
+    def __init__(self, coordinator, mix, chooser, value_size, seed):
+        self.coordinator = coordinator
+        self.ops = list(mix)
+        self.cum_weights = list(itertools.accumulate(mix.values()))
+        self.chooser = chooser
+        self.value = {"payload": "x" * value_size}
+        self.seed = seed
+        self.created = deque()          # ключі, створені під час прогону, — їх і видаляємо
+        self.new_keys = itertools.count()
+
+    def _request(self, session, op, rnd):
+        base = self.coordinator
+        if op == "create":
+            pkey = f"n{self.seed}-{next(self.new_keys)}"
+            r = session.post(f"{base}/create", json={"table_name": TABLE, "partition_key": pkey,
+                                                     "sort_key": "0", "value": self.value})
+            if r.status_code == 201:
+                self.created.append(pkey)
+            return r
+        if op == "delete":
+            try:
+                pkey = self.created.popleft()
+            except IndexError:
+                pkey = f"k{self.chooser.choose(rnd)}"
+            return session.delete(f"{base}/delete/{TABLE}/{pkey}/0")
+        pkey = f"k{self.chooser.choose(rnd)}"
+        return session.get(f"{base}/{op}/{TABLE}/{pkey}/0")
+
+    def run(self, concurrency, duration) -> dict:
+        """Ганяє concurrency потоків duration секунд; повертає {op: [latency_s, ...]} і помилки."""
+        latencies = {op: [] for op in self.ops}
+        errors = {op: 0 for op in self.ops}
+        deadline = time.monotonic() + duration
+
+        def worker(i):
+            rnd = random.Random(self.seed * 1000 + i)
+            session = requests.Session()
+            local = {op: [] for op in self.ops}
+            local_errors = {op: 0 for op in self.ops}
+            while time.monotonic() < deadline:
+                op = rnd.choices(self.ops, cum_weights=self.cum_weights)[0]
+                start = time.perf_counter()
+                try:
+                    ok = self._request(session, op, rnd).status_code < 500
+                except requests.RequestException:
+                    ok = False
+                if ok:
+                    local[op].append(time.perf_counter() - start)
+                else:
+                    local_errors[op] += 1
+            for op in self.ops:
+                latencies[op].extend(local[op])
+                errors[op] += local_errors[op]
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return latencies, errors, time.monotonic() - started
+
+
+# ===========================
+#   REPLICATION LAG / WAL BYTES
+# ===========================
+def applied_offset(url):
+    try:
+        return requests.get(f"{url}/offset", timeout=1).json()["applied_offset"]
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+
+class LagSampler:
+    """Фоново міряє, на скільки записів follower-и відстають від свого лідера."""
+
+    def __init__(self, shards, interval=0.2):
+        self.shards = shards
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for shard in self.shards.values():
+                leader = applied_offset(shard["leader"])
+                for follower in shard["followers"]:
+                    offset = applied_offset(follower)
+                    if leader is not None and offset is not None:
+                        self.samples.append(max(0, leader - offset))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def catch_up_time(shards, timeout=30.0):
+    """Секунди, за які всі follower-и досягають offset-у свого лідера після навантаження."""
+    targets = {sid: applied_offset(shard["leader"]) or 0 for sid, shard in shards.items()}
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if all((applied_offset(f) or 0) >= targets[sid]
+               for sid, shard in shards.items() for f in shard["followers"]):
+            return round(time.monotonic() - start, 3)
+        time.sleep(0.05)
+    return None
+
+
+def wal_stats(s3_url):
+    if s3_url is None:
+        return None
+    stats = requests.get(f"{s3_url}/_stats", timeout=5).json()
+    wal_bytes = sum(v for prefix, v in stats["put_bytes_by_prefix"].items() if prefix.endswith("/wal"))
+    return {"wal_bytes": wal_bytes, "puts": stats["puts"]}
+
+
+# ===========================
+#   REPORT
+# ===========================
+def percentiles(values) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    values = sorted(values)
+    pick = lambda q: round(values[int(q * (len(values) - 1))] * 1000, 3)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "mean": round(statistics.fmean(values) * 1000, 3)}
+
+
+def run_level(workload, shards, s3_url, concurrency, duration) -> dict:
+    wal_before = wal_stats(s3_url)
+    with LagSampler(shards) as lag:
+        latencies, errors, elapsed = workload.run(concurrency, duration)
+    catch_up = catch_up_time(shards)
+    wal_after = wal_stats(s3_url)
+
+    all_latencies = [v for op_values in latencies.values() for v in op_values]
+    result = {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "ops": len(all_latencies),
+        "ops_per_s": round(len(all_latencies) / elapsed, 1),
+        "errors": sum(errors.values()),
+        "latency_ms": {"all": percentiles(all_latencies),
+                       **{op: {**percentiles(v), "ops": len(v), "errors": errors[op]}
+                          for op, v in latencies.items()}},
+        "replication_lag_records": {
+            "mean": round(statistics.fmean(lag.samples), 2) if lag.samples else None,
+            "max": max(lag.samples) if lag.samples else None,
+        },
+        "catch_up_s": catch_up,
+        "wal_bytes": None,
+        "wal_puts": None,
+    }
+    if wal_before is not None:
+        result["wal_bytes"] = wal_after["wal_bytes"] - wal_before["wal_bytes"]
+        result["wal_puts"] = wal_after["puts"] - wal_before["puts"]
+    return result
+
+
+def print_row(res, baseline=None):
+    lat = res["latency_ms"]["all"]
+    lag = res["replication_lag_records"]
+    line = (f"{res['concurrency']:>5} {res['ops_per_s']:>10} {lat['p50']!s:>8} {lat['p95']!s:>8} "
+            f"{lat['p99']!s:>8} {res['errors']:>6} {lag['mean']!s:>8} {lag['max']!s:>6} "
+            f"{res['catch_up_s']!s:>8} {res['wal_bytes']!s:>11}")
+    if baseline is not None:
+        base_lat = baseline["latency_ms"]["all"]
+        delta = lambda new, old: f"{100 * (new - old) / old:+.1f}%" if new and old else "n/a"
+        line += f"   vs baseline: ops/s {delta(res['ops_per_s'], baseline['ops_per_s'])}, " \
+                f"p99 {delta(lat['p99'], base_lat['p99'])}"
+    print(line)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coordinator", help="URL вже запущеного coordinator-а (інакше піднімаємо кластер)")
+    parser.add_argument("--s3-stats", help="URL local_s3 для WAL bytes, якщо --coordinator")
+    parser.add_argument("--shards", type=int, default=3)
+    parser.add_argument("--followers", type=int, default=2)
+    parser.add_argument("--replication", choices=["leader", "s3"], default="leader",
+                        help="звідки follower-и читають WAL: /stream лідера або сегменти з S3")
+    parser.add_argument("--transport", choices=["http", "rpc"], default="http",
+                        help="як coordinator шле create/read/delete/exists репліками: HTTP або rpc.py")
+    parser.add_argument("--base-port", type=int, default=7000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на кожен рівень concurrency")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("read=80,create=10,exists=5,delete=5"))
+    parser.add_argument("--dist", choices=["uniform", "zipfian"], default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=0.99)
+    parser.add_argument("--keys", type=int, default=10_000, help="скільки ключів завантажити перед прогоном")
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="зберегти результати у файл")
+    parser.add_argument("--compare", help="JSON попереднього прогону для порівняння")
+    args = parser.parse_args()
+
+    cluster = None
+    if args.coordinator:
+        coordinator, s3_url = args.coordinator.rstrip("/"), args.s3_stats
+    else:
+        log_dir = tempfile.mkdtemp(prefix="bench-")
+        print(f"starting local cluster, logs in {log_dir}")
+        cluster = LocalCluster(args.shards, args.followers, args.base_port, log_dir, args.replication,
+                               args.transport)
+        cluster.start()
+        coordinator, s3_url = cluster.coordinator_url, cluster.s3_url
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {res["concurrency"]: res for res in json.load(f)["results"]}
+
+    try:
+        # топологію беремо в coordinator-а — так само і для зовнішнього кластера
+        shards = requests.get(f"{coordinator}/rebalance", timeout=5).json()["shards"]
+        print(f"preloading {args.keys} keys")
+        preload(coordinator, args.keys)
+
+        workload = Workload(coordinator, args.mix, KeyChooser(args.keys, args.dist, args.zipf_s, args.seed),
+                            args.value_size, args.seed)
+        print(f"{'conc':>5} {'ops/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} "
+              f"{'lag avg':>8} {'max':>6} {'catch-up':>8} {'WAL bytes':>11}")
+        results = []
+        for concurrency in args.concurrency:
+            res = run_level(workload, shards, s3_url, concurrency, args.duration)
+            results.append(res)
+            print_row(res, baseline.get(concurrency) if baseline else None)
+    finally:
+        if cluster is not None:
+            cluster.stop()
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("json", "compare")}
+        with open(args.json, "w") as f:
+            json.dump({"timestamp": time.time(), "revision": git_revision(), "config": config,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
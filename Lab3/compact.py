@@ -0,0 +1,160 @@
+import json
+import os
+import sys
+
+from metrics import approx_table_bytes
+
+# ===========================
+#   COMPACT TABLES
+# ===========================
+# STORE_MODE=compact — таблиці data_store зберігають значення як готовий JSON (bytes)
+# замість дерева dict/list на кожен item:
+#   - bytes-об'єкт — один блок пам'яті, без dict/str/int на кожне поле значення
+#   - read віддає ці bytes як є, без повторної серіалізації
+#   - partition key-і інтернуються: усі items однієї партиції посилаються на один str
+# Інтерфейс такий самий, як у dict {(pkey, skey): value}, тож apply_record,
+# query_partition, snapshot-и і міграція працюють з обома режимами.
+
+STORE_MODE = os.getenv("STORE_MODE", "dict")
+
+KEY_TUPLE_BYTES = sys.getsizeof(("", ""))
+_MISSING = object()
+
+
+def dumps(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class CompactTable:
+    __slots__ = ("_items", "_payload_bytes")
+
+    def __init__(self, items=()):
+        self._items = {}                # {(pkey, skey): bytes}
+        self._payload_bytes = 0         # розміри bytes-значень і ключів — для O(1) memory_bytes()
+        for key, value in (items.items() if isinstance(items, dict) else items):
+            self[key] = value
+
+    def _key_bytes(self, key) -> int:
+        return KEY_TUPLE_BYTES + sys.getsizeof(key[1])
+
+    # ---------- dict interface ----------
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def keys(self):
+        return self._items.keys()
+
+    def __getitem__(self, key):
+        return json.loads(self._items[key])
+
+    def get(self, key, default=None):
+        raw = self._items.get(key)
+        return default if raw is None else json.loads(raw)
+
+    def __setitem__(self, key, value):
+        self.put_raw(key, dumps(value))
+
+    def __delitem__(self, key):
+        raw = self._items.pop(key)
+        self._payload_bytes -= sys.getsizeof(raw) + self._key_bytes(key)
+
+    def pop(self, key, *default):
+        if key not in self._items:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def items(self):
+        for key, raw in list(self._items.items()):
+            yield key, json.loads(raw)
+
+    def copy(self):
+        """Поверхнева копія: bytes незмінні, тож значення не копіюються (для snapshot-ів)."""
+        clone = CompactTable()
+        clone._items = self._items.copy()
+        clone._payload_bytes = self._payload_bytes
+        return clone
+
+    # ---------- raw access ----------
+    def get_raw(self, key):
+        """Значення як JSON bytes (None, якщо item-а немає) — можна віддавати без json.dumps."""
+        return self._items.get(key)
+
+    def put_raw(self, key, raw: bytes):
+        pkey, skey = key
+        if type(pkey) is str:
+            pkey = sys.intern(pkey)
+        key = (pkey, skey)
+        old = self._items.get(key)
+        if old is not None:
+            self._payload_bytes -= sys.getsizeof(old) + self._key_bytes(key)
+        self._items[key] = raw
+        self._payload_bytes += sys.getsizeof(raw) + self._key_bytes(key)
+
+    def raw_items(self):
+        return list(self._items.items())
+
+    # ---------- memory ----------
+    def memory_bytes(self) -> int:
+        """Оцінка пам'яті за O(1): сам dict + bytes-значення + tuple і sort key кожного ключа."""
+        return sys.getsizeof(self._items) + self._payload_bytes
+
+    def memory_report(self) -> dict:
+        """Точний розклад пам'яті (O(n) — лише для /memory, не для scrape)."""
+        value_bytes = sum(sys.getsizeof(raw) for raw in self._items.values())
+        pkeys = {id(pkey): sys.getsizeof(pkey) for pkey, _ in self._items}
+        key_bytes = (len(self._items) * KEY_TUPLE_BYTES
+                     + sum(sys.getsizeof(skey) for _, skey in self._items) + sum(pkeys.values()))
+        slots = sys.getsizeof(self._items)
+        return {
+            "mode": "compact",
+            "items": len(self._items),
+            "partitions": len(pkeys),
+            "value_bytes": value_bytes,
+            "key_bytes": key_bytes,
+            "slot_bytes": slots,
+            "total_bytes": value_bytes + key_bytes + slots,
+        }
+
+
+def new_table():
+    """Порожня таблиця для data_store у режимі STORE_MODE."""
+    return CompactTable() if STORE_MODE == "compact" else {}
+
+
+def get_raw(items, key):
+    """JSON bytes значення з таблиці будь-якого режиму (None, якщо item-а немає)."""
+    if isinstance(items, CompactTable):
+        return items.get_raw(key)
+    value = items.get(key, _MISSING)
+    return None if value is _MISSING else dumps(value)
+
+
+def json_with_raw(fields: dict, name: str, raw: bytes) -> bytes:
+    """JSON-об'єкт {**fields, name: raw}: raw (вже готовий JSON) вставляється як є."""
+    head = dumps(fields)[:-1] + (b"," if fields else b"")
+    return head + dumps(name) + b":" + raw + b"}"
+
+
+def memory_report(data_store: dict) -> dict:
+    """Звіт /memory: для compact-таблиць — точний, для dict — вибіркова оцінка."""
+    tables = {}
+    for table, items in list(data_store.items()):
+        if isinstance(items, CompactTable):
+            tables[table] = items.memory_report()
+        else:
+            tables[table] = {"mode": "dict", "items": len(items), "total_bytes": approx_table_bytes(items)}
+    return {
+        "store_mode": STORE_MODE,
+        "total_bytes": sum(t["total_bytes"] for t in tables.values()),
+        "tables": tables,
+    }
@@ -1,12 +1,57 @@
 import connexion
-from flask import jsonify
+import json
+from connexion.lifecycle import ConnexionResponse
+from connexion.resolver import Resolver
+from flask import Response, jsonify, request
 import requests
-import itertools
+import os
+import threading
+import time
+import bloom
+import http_pool
+import hotkeys
+import metrics
+import rebalance
+import rpc
+import scan
+import wire
+from balancer import ReplicaBalancer
+from read_cache import ReadCache
 from hashing import ConsistentHashRing
 
+
+
+def resolve_handler(operation_id):
+    """
+    operationId "coordinator.read" → функція саме цього екземпляра модуля.
+    Під `python coordinator.py` модуль — __main__, і connexion інакше імпортував би
+    другу копію coordinator з власним станом: фонові потоки (health check, bloom)
+    оновлювали б одні replica_offsets / фільтри, а handler-и читали б інші, порожні.
+    """
+    return globals()[operation_id.rpartition(".")[2]]
+
+
 # Ініціалізація connexion (Swagger)
 app = connexion.App(__name__, specification_dir='.')
-app.add_api("openapi.yaml", strict_validation=True, validate_responses=True)
+# VALIDATE_RESPONSES=0 прибирає ще один json-розбір кожної відповіді (відповіді shard-ів ідуть passthrough)
+app.add_api("openapi.yaml", strict_validation=True, resolver=Resolver(resolve_handler),
+            validate_responses=os.getenv("VALIDATE_RESPONSES", "1") == "1")
+
+
+def shard_unavailable(request, exc):
+    """Недоступний / повільний shard → 503 замість 500"""
+    return ConnexionResponse(
+        status_code=503,
+        content_type="application/json",
+        body=json.dumps({"error": f"Shard unavailable: {exc}"}),
+    )
+
+
+app.add_error_handler(requests.RequestException, shard_unavailable)
+
+# /metrics (поза OpenAPI-специфікацією) + latency/лічильники на кожен route
+metrics.instrument_app(app.app)
+app.add_url_rule("/metrics", "metrics", metrics.metrics_response)
 
 # ===========================
 #   SHARD CONFIG
@@ -36,6 +81,10 @@ shards = {
     }
 }
 
+# SHARDS='{"0": {"leader": "...", "followers": [...]}, ...}' — інша топологія (напр. для бенчмарку)
+if os.getenv("SHARDS"):
+    shards = {int(sid): shard for sid, shard in json.loads(os.getenv("SHARDS")).items()}
+
 # ===========================
 #   CONSISTENT HASH RING
 # ===========================
@@ -44,20 +93,201 @@ ring = ConsistentHashRing()
 for shard_id in shards:
     ring.add_node(shard_id)
 
+# Online rebalance: міграція йде між лідерами shard-ів
+rebalancer = rebalance.Rebalancer(leader_url=lambda shard_id: shards[shard_id]["leader"])
+
+
+routed_keys = metrics.Counter("ring_routed_keys_total", "Keys routed to each shard", ["shard"])
+metrics.Gauge("ring_ownership_ratio", "Share of the hash space owned by each shard", ["shard"],
+              callback=lambda: {(shard_id,): share for shard_id, share in ring.ownership().items()})
+
+
+def route(table, pkey):
+    """(shard_id, previous_shard_id): previous != None лише для ключів, що зараз переїжджають"""
+    # маршрутизуємо лише за partition key — уся партиція живе на одному shard-і
+    owner, previous = rebalancer.owners(ring, f"{table}:{pkey}")
+    routed_keys.inc(owner)
+    return owner, previous
+
+
+def switch_ring(new_ring):
+    """Атомарно ставить нове кільце; shard-и, яких у ньому немає, забуваємо."""
+    global ring
+    ring = new_ring
+    for shard_id in [sid for sid in shards if sid not in new_ring.weights]:
+        del shards[shard_id]
+    # items переїхали повз coordinator — старі фільтри їх не містять
+    bloom_filters.clear()
+
+# ===========================
+#   SHARD TRANSPORT
+# ===========================
+# SHARD_TRANSPORT=rpc — create/read/delete/exists ідуть persistent TCP-каналом (rpc.py,
+# репліки з RPC_ENABLED=1); batch, query, міграція і health check — як і раніше, HTTP
+SHARD_TRANSPORT = os.getenv("SHARD_TRANSPORT", "http")
+
+
+def shard_item(endpoint, op, table, pkey, skey, value=None):
+    """Item-операція на репліці; відповідь у формі requests.Response для обох транспортів."""
+    if SHARD_TRANSPORT == "rpc":
+        args = {"value": value} if op == "create" else {}
+        return rpc.call(endpoint, op, table_name=table, partition_key=pkey, sort_key=skey, **args)
+    if op == "create":
+        return http_pool.post(f"{endpoint}/create", json={"table_name": table, "partition_key": pkey,
+                                                          "sort_key": skey, "value": value})
+    send = http_pool.delete if op == "delete" else http_pool.get
+    return send(f"{endpoint}/{op}/{table}/{pkey}/{skey}")
+
 # ===========================
-#   ROUND ROBIN LOAD-BALANCING
+#   READ CACHE
 # ===========================
-# По кожному shard_id буде окремий round-robin ітератор
-read_iterators = {}
+# READ_CACHE_MAX_BYTES=0 вимикає кеш
+READ_CACHE_MAX_BYTES = int(os.getenv("READ_CACHE_MAX_BYTES", str(64 << 20)))
+READ_CACHE_TTL_S = float(os.getenv("READ_CACHE_TTL_S", "30"))
 
-def get_read_target(shard_id: int) -> str:
-    """Повертає наступний endpoint для читання (leader + followers)."""
+cache = ReadCache(READ_CACHE_MAX_BYTES, READ_CACHE_TTL_S) if READ_CACHE_MAX_BYTES > 0 else None
 
-    if shard_id not in read_iterators:
-        endpoints = [shards[shard_id]["leader"]] + shards[shard_id]["followers"]
-        read_iterators[shard_id] = itertools.cycle(endpoints)
+if cache is not None:
+    for stat, help in (("hits", "Read cache hits"), ("misses", "Read cache misses"),
+                       ("hit_ratio", "Read cache hit ratio"), ("bytes", "Read cache memory"),
+                       ("entries", "Read cache entries"), ("evictions", "Read cache LRU evictions")):
+        metrics.Gauge(f"read_cache_{stat}", help, callback=lambda stat=stat: cache.stats()[stat])
 
-    return next(read_iterators[shard_id])
+
+def applied_offset(r):
+    """Offset, до якого репліка застосувала WAL на момент читання (заголовок X-Applied-Offset)."""
+    value = r.headers.get("X-Applied-Offset")
+    return int(value) if value is not None else None
+
+
+def invalidate(table, pkey, skey, shard_id, offset):
+    if cache is not None:
+        cache.invalidate((table, pkey, skey), shard_id, offset)
+
+# ===========================
+#   HOT KEYS
+# ===========================
+# Частота ключів (table, pkey, skey) окремо для читань і записів (hotkeys.py).
+# Гарячі на читання закріплюються в кеші — LRU їх не витісняє, тож shard бачить такий ключ
+# не частіше, ніж раз на TTL / запис; промахи кешу і так розходяться по всіх репліках shard-а
+# (power-of-two-choices). Гарячі на запис лише звітуються: усі записи йдуть на лідера.
+hot_reads = hotkeys.HotKeyTracker(
+    "reads", on_change=(lambda hot, previous: cache.pin(hot)) if cache is not None else None
+)
+hot_writes = hotkeys.HotKeyTracker("writes")
+
+metrics.Gauge("hot_keys", "Keys currently classified as hot", ["kind"],
+              callback=lambda: {("reads",): len(hot_reads.hot), ("writes",): len(hot_writes.hot)})
+
+# ===========================
+#   BLOOM FILTERS
+# ===========================
+# Фільтри таблиць кожного лідера (bloom.py): read/exists ключа, якого точно немає, —
+# без запиту на репліку. Забираються з лідерів: follower-и можуть відставати.
+# BLOOM_ENABLED=0 вимикає.
+BLOOM_ENABLED = os.getenv("BLOOM_ENABLED", "1") == "1"
+bloom_filters = bloom.FilterCache()
+metrics.Gauge("bloom_negative_answers", "read/exists answered from a Bloom filter",
+              callback=lambda: bloom_filters.negatives)
+metrics.Gauge("bloom_filters_bytes", "Memory of Bloom filters pulled from leaders",
+              callback=lambda: bloom_filters.stats()["bytes"])
+
+
+def definitely_missing(shard_id, table, pkey, skey, previous):
+    # під час міграції items переїжджають повз coordinator — фільтрам не віримо
+    if previous is not None or rebalancer.active:
+        return False
+    return bloom_filters.might_contain(shard_id, table, pkey, skey) is False
+
+
+def bloom_endpoints():
+    return {shard_id: shard["leader"] for shard_id, shard in list(shards.items())}
+
+
+def fetch_bloom(url, etag):
+    return http_pool.get(f"{url}/bloom", headers={"If-None-Match": etag} if etag else {})
+
+
+def pull_bloom_filters():
+    bloom.pull_loop(bloom_filters, bloom_endpoints, fetch_bloom, active=lambda: not rebalancer.active)
+
+# ===========================
+#   REPLICA SELECTION
+# ===========================
+# Замість статичного round-robin: power-of-two-choices за EWMA latency та inflight,
+# circuit breaker на кожен endpoint і hedged reads (див. balancer.py).
+HEDGE_DELAY_MS = float(os.getenv("HEDGE_DELAY_MS", "50"))          # 0 вимикає hedging
+HEALTH_CHECK_INTERVAL_S = float(os.getenv("HEALTH_CHECK_INTERVAL_S", "0.5"))
+
+balancer = ReplicaBalancer(hedge_delay=HEDGE_DELAY_MS / 1000)
+metrics.Gauge("replica_ewma_latency_seconds", "EWMA read latency per replica", ["endpoint"],
+              callback=lambda: {(e,): st["ewma_ms"] / 1000 for e, st in balancer.stats().items()})
+metrics.Gauge("replica_inflight_requests", "In-flight reads per replica", ["endpoint"],
+              callback=lambda: {(e,): st["inflight"] for e, st in balancer.stats().items()})
+metrics.Gauge("replica_breaker_open", "1 if the replica's circuit breaker is not closed", ["endpoint"],
+              callback=lambda: {(e,): int(st["state"] != "closed") for e, st in balancer.stats().items()})
+
+# Read-your-writes: останній відомий applied offset кожної репліки.
+# Оновлюється з X-Applied-Offset кожної відповіді та фоновим health check-ом (/offset).
+replica_offsets = {}
+
+
+def read_candidates(shard_id: int, min_offset: int = 0) -> list:
+    """
+    Endpoint-и, з яких можна читати (leader + followers).
+    З min_offset — лише follower-и, які вже застосували цей offset; якщо таких немає — лідер.
+    """
+    shard = shards[shard_id]
+    if min_offset:
+        caught_up = [f for f in shard["followers"] if replica_offsets.get(f, 0) >= min_offset]
+        return caught_up or [shard["leader"]]
+    return [shard["leader"]] + shard["followers"]
+
+
+def track_offset(endpoint, r):
+    offset = applied_offset(r)
+    if offset is not None and offset > replica_offsets.get(endpoint, 0):
+        replica_offsets[endpoint] = offset
+    return offset
+
+
+def read_from_replica(shard_id, send, min_offset=0):
+    """
+    send(target) -> Response. Читає з найдешевшої здорової репліки, що наздогнала min_offset;
+    якщо її відповідь усе ж старіша (напр. follower перезапустився) — повторює на лідері.
+    """
+    target, r = balancer.call(read_candidates(shard_id, min_offset), send)
+    offset = track_offset(target, r)
+    leader = shards[shard_id]["leader"]
+    if min_offset and target != leader and (offset is None or offset < min_offset):
+        r = send(leader)
+    return r
+
+
+def health_check_loop():
+    """
+    Фоново опитує /offset усіх реплік: відкриває breaker мертвим, закриває ожилим
+    і оновлює replica_offsets, щоб follower-и без read-трафіку не «застрягали» позаду.
+    """
+    while True:
+        endpoints = [e for shard in list(shards.values()) for e in [shard["leader"]] + shard["followers"]]
+        for endpoint, offset in zip(endpoints, http_pool.fan_out(probe, endpoints)):
+            if offset is not None:
+                replica_offsets[endpoint] = offset
+        time.sleep(HEALTH_CHECK_INTERVAL_S)
+
+
+def probe(endpoint):
+    start = time.monotonic()
+    try:
+        r = http_pool.get(f"{endpoint}/offset")
+        r.raise_for_status()
+        offset = r.json()["applied_offset"]
+    except Exception:
+        balancer.record_probe(endpoint, False)
+        return None
+    balancer.record_probe(endpoint, True, time.monotonic() - start)
+    return offset
 
 
 # ===========================
@@ -78,10 +308,11 @@ def get_read_target(shard_id: int) -> str:
 def register_table(body):
     table_name = body.get("table_name")
 
-    # Реєстрація таблиці на всіх нодах (лідер + фоловери)
-    for shard in shards.keys():
-        leader = shards[shard]["leader"]
-        requests.post(f"{leader}/register_table", json={"table_name": table_name})
+    # Реєстрація таблиці на всіх лідерах (паралельно; фоловери отримають її з WAL)
+    http_pool.fan_out(
+        lambda leader: http_pool.post(f"{leader}/register_table", json={"table_name": table_name}),
+        [shard["leader"] for shard in shards.values()],
+    )
     return jsonify({"status": f"Table {table_name} registered on all shards"}), 201
 
 # ---------------------------
@@ -92,29 +323,51 @@ def create(body):
     pkey = body["partition_key"]
     skey = body["sort_key"]
 
-    compound_key = f"{table}:{pkey}:{skey}"
-
     # Визначаємо shard_id через консистентне хешування
-    shard_id = ring.get_node(compound_key)
+    shard_id, previous = route(table, pkey)
     leader = shards[shard_id]["leader"]
+    hot_writes.record((table, pkey, skey))
+
+    if previous is not None:
+        # ключ ще може лежати у старого власника — не дозволяємо дублікат
+        r = shard_item(shards[previous]["leader"], "exists", table, pkey, skey)
+        if r.json().get("exists"):
+            return jsonify({"error": "Item already exists"}), 400
 
     # Всі записи — тільки на лідера
-    r = requests.post(f"{leader}/create", json=body)
-    return jsonify(r.json()), r.status_code
+    with bloom_filters.writing([(shard_id, table, pkey, skey)]):
+        r = shard_item(leader, "create", table, pkey, skey, body["value"])
+    invalidate(table, pkey, skey, shard_id, wire.decode(r).get("offset"))
+    return wire.passthrough(r)
 
 
 # ---------------------------
 #         READ → LB
 # ---------------------------
-def read(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    shard_id = ring.get_node(compound_key)
-
-    # Отримуємо наступний endpoint (RR)
-    target = get_read_target(shard_id)
-
-    r = requests.get(f"{target}/read/{table_name}/{partition_key}/{sort_key}")
-    return jsonify(r.json()), r.status_code
+def read(table_name, partition_key, sort_key, min_offset=0):
+    shard_id, previous = route(table_name, partition_key)
+    cache_key = (table_name, partition_key, sort_key)
+    hot_reads.record(cache_key)
+
+    if cache is not None and previous is None:
+        cached = cache.get(cache_key, min_offset)
+        if cached is not None:
+            status, payload = cached
+            return Response(payload, status, mimetype=wire.JSON)
+    if definitely_missing(shard_id, table_name, partition_key, sort_key, previous):
+        return jsonify({"error": "Not found"}), 404
+
+    # Репліка, що наздогнала min_offset (або наступна за RR)
+    send = lambda target: shard_item(target, "read", table_name, partition_key, sort_key)
+    r = read_from_replica(shard_id, send, min_offset)
+    if r.status_code == 404 and previous is not None:
+        r = read_from_replica(previous, send)
+
+    # ключі, що переїжджають, не кешуємо: відповідь могла прийти від старого власника.
+    # У кеші — bytes відповіді репліки: і промах, і влучання віддаються без json.loads/jsonify
+    if cache is not None and previous is None and r.status_code in (200, 404):
+        cache.put(cache_key, r.status_code, r.content, len(r.content), shard_id, applied_offset(r))
+    return wire.passthrough(r)
 
 
 # ---------------------------
@@ -136,34 +389,332 @@ def read(table_name, partition_key, sort_key):
 #     return jsonify({"results": results}), 200
 
 def delete(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    shard_id = ring.get_node(compound_key)
+    shard_id, previous = route(table_name, partition_key)
 
     leader=shards[shard_id]["leader"]
+    hot_writes.record((table_name, partition_key, sort_key))
 
     # Видаляємо на всіх
     results = []
-    r = requests.delete(f"{leader}/delete/{table_name}/{partition_key}/{sort_key}")
+    r = shard_item(leader, "delete", table_name, partition_key, sort_key)
     results.append({"node": leader, "status": r.status_code})
+    invalidate(table_name, partition_key, sort_key, shard_id, r.json().get("offset"))
+
+    if previous is not None:
+        # ключ переїжджає — видаляємо і у старого власника
+        rebalancer.record_delete(shard_id, table_name, partition_key, sort_key)
+        old_leader = shards[previous]["leader"]
+        r = shard_item(old_leader, "delete", table_name, partition_key, sort_key)
+        results.append({"node": old_leader, "status": r.status_code})
+        invalidate(table_name, partition_key, sort_key, previous, r.json().get("offset"))
 
     return jsonify({"results": results}), 200
 
 # ---------------------------
 #         EXISTS
 # ---------------------------
-def exists(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    shard_id = ring.get_node(compound_key)
+def exists(table_name, partition_key, sort_key, min_offset=0):
+    shard_id, previous = route(table_name, partition_key)
+    hot_reads.record((table_name, partition_key, sort_key))
+
+    # закешований /read відповідає і на exists
+    if cache is not None and previous is None:
+        cached = cache.get((table_name, partition_key, sort_key), min_offset)
+        if cached is not None:
+            return jsonify({"exists": cached[0] == 200}), 200
+    if definitely_missing(shard_id, table_name, partition_key, sort_key, previous):
+        return jsonify({"exists": False}), 200
 
     # Беремо лише для читання — load balancing
-    target = get_read_target(shard_id)
+    send = lambda target: shard_item(target, "exists", table_name, partition_key, sort_key)
+    r = read_from_replica(shard_id, send, min_offset)
+    if previous is not None and not r.json().get("exists"):
+        r = read_from_replica(previous, send)
+    return wire.passthrough(r)
+
+
+# ---------------------------
+#        QUERY → LB
+# ---------------------------
+def query(table_name, partition_key, begins_with=None, start=None, end=None,
+          exclusive_start_key=None, limit=100, min_offset=0):
+    # уся партиція лежить на одному shard-і — запит іде на одну репліку
+    shard_id, previous = route(table_name, partition_key)
+
+    params = {"begins_with": begins_with, "start": start, "end": end,
+              "exclusive_start_key": exclusive_start_key, "limit": limit}
+    params = {k: v for k, v in params.items() if v is not None}
+    if previous is None:
+        return wire.passthrough(read_from_replica(
+            shard_id,
+            lambda target: http_pool.get(f"{target}/query/{table_name}/{partition_key}", params=params),
+            min_offset,
+        ))
+
+    # партиція переїжджає — частина items ще у старого власника; сторінки зливаємо тут
+    send = lambda target: http_pool.get(f"{target}/query/{table_name}/{partition_key}", params=params,
+                                        headers=wire.ACCEPT_BINARY)
+    r = read_from_replica(shard_id, send, min_offset)
+    if r.status_code == 200:
+        r_prev = read_from_replica(previous, send)
+        if r_prev.status_code == 200:
+            return jsonify(rebalance.merge_query_pages(wire.decode(r), wire.decode(r_prev), limit)), 200
+    return jsonify(wire.decode(r)), r.status_code
+
+
+# ---------------------------
+#   BATCH → scatter-gather
+# ---------------------------
+def route_many(items):
+    """route() для батчу: [(shard_id, previous_shard_id)] у порядку items — з одного знімка кілець"""
+    return rebalancer.owners_many(ring, (f"{item['table_name']}:{item['partition_key']}" for item in items))
+
+
+def group_by_shard(items, routes):
+    """Групує items за shard_id: {shard_id: [(index у запиті, item), ...]}"""
+    groups = {}
+    for i, (item, (owner, _)) in enumerate(zip(items, routes)):
+        groups.setdefault(owner, []).append((i, item))
+    for owner, group in groups.items():
+        routed_keys.inc(owner, amount=len(group))
+    return groups
+
+
+def item_result(item, res):
+    return {"table_name": item["table_name"], "partition_key": item["partition_key"],
+            "sort_key": item["sort_key"], **res}
+
+
+def scatter_gather(items, routes, path, body_field, leader_only):
+    """
+    Розсилає по одному батч-запиту на кожен shard паралельно
+    і збирає результати назад у порядку items.
+    Записи (leader_only) — на лідера; читання — на репліку, що наздогнала
+    найбільший min_offset серед ключів групи.
+    """
+    groups = group_by_shard(items, routes)
+    results = [None] * len(items)
+
+    def _send(shard_id, group):
+        payload = {body_field: [item for _, item in group]}
+        send = lambda target: http_pool.post(f"{target}/{path}", json=payload, headers=wire.ACCEPT_BINARY)
+        try:
+            if leader_only:
+                r = send(shards[shard_id]["leader"])
+            else:
+                min_offset = max(item.get("min_offset", 0) for _, item in group)
+                r = read_from_replica(shard_id, send, min_offset)
+            return group, wire.decode(r)["results"]
+        except Exception as e:
+            return group, [{"status": 503, "error": f"Shard {shard_id} unavailable: {e}"}] * len(group)
+
+    for group, shard_results in http_pool.fan_out(lambda g: _send(*g), groups.items()):
+        for (i, item), res in zip(group, shard_results):
+            results[i] = item_result(item, res)
+    return results
+
+
+def blocked_by_previous(items, routes):
+    """
+    Як і в create: ключ, що переїжджає, ще може лежати у старого власника — дублікат не пишемо.
+    {index: результат} для items, які писати не можна (один batch_read на лідера старого shard-а).
+    """
+    by_shard = {}
+    for i, (_, previous) in enumerate(routes):
+        if previous is not None:
+            by_shard.setdefault(previous, []).append(i)
+
+    def _check(shard_id, idx):
+        keys = [{k: items[i][k] for k in ("table_name", "partition_key", "sort_key")} for i in idx]
+        try:
+            r = http_pool.post(f"{shards[shard_id]['leader']}/batch_read", json={"keys": keys},
+                               headers=wire.ACCEPT_BINARY)
+            return idx, wire.decode(r)["results"], None
+        except Exception as e:
+            return idx, None, e
+
+    blocked = {}
+    for idx, found, error in http_pool.fan_out(lambda g: _check(*g), by_shard.items()):
+        for j, i in enumerate(idx):
+            if error is not None:
+                blocked[i] = {"status": 503, "error": f"Shard unavailable: {error}"}
+            elif found[j].get("found"):
+                blocked[i] = {"status": 400, "error": "Item already exists"}
+    return blocked
+
+
+def batch_write(body):
+    # Всі записи — тільки на лідерів
+    items = body["items"]
+    routes = route_many(items)
+    blocked = blocked_by_previous(items, routes)
+    todo = [i for i in range(len(items)) if i not in blocked]
+    with bloom_filters.writing([(routes[i][0], items[i]["table_name"], items[i]["partition_key"],
+                                 items[i]["sort_key"]) for i in todo]):
+        written = scatter_gather([items[i] for i in todo], [routes[i] for i in todo],
+                                 "batch_create", "items", leader_only=True)
+    if cache is not None:
+        for res, i in zip(written, todo):
+            invalidate(res["table_name"], res["partition_key"], res["sort_key"], routes[i][0], res.get("offset"))
+    results = [None] * len(items)
+    for i, res in zip(todo, written):
+        results[i] = res
+    for i, res in blocked.items():
+        results[i] = item_result(items[i], res)
+    return jsonify({"results": results}), 200
+
+
+def batch_get(body):
+    # Читання — через load balancing
+    keys = body["keys"]
+    routes = route_many(keys)
+    results = scatter_gather(keys, routes, "batch_read", "keys", leader_only=False)
+
+    # під час міграції промахи перевіряємо ще й у старого власника
+    by_shard = {}
+    for i, (res, (_, previous)) in enumerate(zip(results, routes)):
+        if not res.get("found") and previous is not None:
+            by_shard.setdefault(previous, []).append(i)
+    for shard_id, idx in by_shard.items():
+        payload = {"keys": [keys[i] for i in idx]}
+        r = read_from_replica(shard_id, lambda target: http_pool.post(f"{target}/batch_read", json=payload,
+                                                                      headers=wire.ACCEPT_BINARY))
+        for i, res in zip(idx, wire.decode(r)["results"]):
+            if res.get("found"):
+                results[i].update(res)
+    return jsonify({"results": results}), 200
+
+
+# ---------------------------
+#   SCAN / EXPORT → replicas
+# ---------------------------
+exports = {}        # table -> scan.ExportJob (останній експорт таблиці)
+
+
+def make_scan(table_name, segments, cursor=None):
+    """
+    TableScan по всіх shard-ах: segments потоків на кожен shard або позиції з курсора.
+    Сегменти одного shard-а розподіляються між його репліками (з закритим breaker-ом).
+    """
+    topology = sorted(shards)
+    if cursor is None:
+        positions = {f"{shard_id}|{i}": None for shard_id in shards for i in range(segments)}
+    else:
+        segments, positions, cursor_topology = scan.decode_cursor(cursor)
+        if cursor_topology != topology:
+            raise ValueError("Shards changed since the cursor was issued, restart the scan")
+
+    breakers = balancer.stats()
+
+    def open_stream(stream_id, after):
+        shard_id, segment = stream_id.rsplit("|", 1)
+        replicas = read_candidates(int(shard_id))
+        replicas = [e for e in replicas if breakers.get(e, {}).get("state", "closed") == "closed"] or replicas
+        params = {"segment": segment, "total_segments": segments}
+        if after is not None:
+            params["after"] = json.dumps(after)
+        target = replicas[int(segment) % len(replicas)]
+        return http_pool.get(f"{target}/scan/{table_name}", params=params, stream=True)
+
+    return scan.TableScan(positions, segments, open_stream, topology)
+
+
+def scan_table(table_name):
+    """
+    GET /scan/<table_name>?segments=&cursor= — NDJSON-стрім усіх items таблиці (формат — у scan.py).
+    Поза OpenAPI-специфікацією: connexion буферизує і валідує *json-відповіді, а цю треба стрімити.
+    """
+    try:
+        segments = min(max(int(request.args.get("segments", scan.SCAN_SEGMENTS)), 1), 64)
+    except ValueError:
+        return jsonify({"error": "segments must be an integer"}), 400
+    cursor = request.args.get("cursor")
+    # під час міграції items переїжджають між shard-ами — скан пропустив би або повторив їх
+    if rebalancer.active:
+        return jsonify({"error": "Rebalance in progress, retry the scan later"}), 409
+    try:
+        table_scan = make_scan(table_name, segments, cursor).start()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except scan.ScanError as e:
+        return jsonify({"error": str(e)}), e.status
+    return Response(scan.ndjson_response(table_scan), mimetype=scan.NDJSON)
+
+
+app.add_url_rule("/scan/<table_name>", "scan_table", scan_table)
+
+
+def start_export(table_name, segments=scan.SCAN_SEGMENTS):
+    job = exports.get(table_name)
+    if (job is not None and job.running) or rebalancer.active:
+        return jsonify({"error": "Export already running or rebalance in progress"}), 409
+    job = exports[table_name] = scan.ExportJob(
+        table_name, lambda cursor: make_scan(table_name, segments, cursor)
+    ).start()
+    return jsonify(job.status), 202
+
+
+def export_status(table_name):
+    job = exports.get(table_name)
+    if job is None:
+        return jsonify({"error": "No export for this table"}), 404
+    return jsonify(job.status), 200
+
+
+# ---------------------------
+#   RESHARDING
+# ---------------------------
+def add_shard(body):
+    shard_id = body["shard_id"]
+    if shard_id in ring.weights or rebalancer.active:
+        return jsonify({"error": "Shard already in ring or rebalance in progress"}), 409
+    shards[shard_id] = {"leader": body["leader"], "followers": body.get("followers", [])}
+    new_ring = ring.copy()
+    new_ring.add_node(shard_id, body.get("weight", 1))
+    rebalancer.start(ring, new_ring, switch_ring)
+    return jsonify({"status": "rebalance started", "shard_id": shard_id}), 202
+
+
+def remove_shard(body):
+    shard_id = body["shard_id"]
+    if shard_id not in ring.weights or len(ring.weights) == 1 or rebalancer.active:
+        return jsonify({"error": "Unknown/last shard or rebalance in progress"}), 409
+    new_ring = ring.copy()
+    new_ring.remove_node(shard_id)
+    rebalancer.start(ring, new_ring, switch_ring)
+    return jsonify({"status": "rebalance started", "shard_id": shard_id}), 202
+
+
+def rebalance_status():
+    return jsonify({**rebalancer.status, "shards": shards}), 200
+
+
+# ---------------------------
+#   REPLICAS / CACHE STATS
+# ---------------------------
+def replicas_status():
+    return jsonify({"endpoints": balancer.stats(), "applied_offsets": replica_offsets}), 200
+
+
+def cache_stats():
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cache.stats()}), 200
+
+
+def bloom_stats():
+    return jsonify({"enabled": BLOOM_ENABLED, **bloom_filters.stats()}), 200
+
 
-    r = requests.get(f"{target}/exists/{table_name}/{partition_key}/{sort_key}")
-    return jsonify(r.json()), r.status_code
+def hot_keys(top=20):
+    return jsonify({"reads": hot_reads.stats(top), "writes": hot_writes.stats(top)}), 200
 
 
 # ===========================
 #   RUN
 # ===========================
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    threading.Thread(target=health_check_loop, daemon=True).start()
+    if BLOOM_ENABLED:
+        threading.Thread(target=pull_bloom_filters, daemon=True).start()
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")))
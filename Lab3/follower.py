@@ -1,15 +1,81 @@
+import boto3
+import json
 import requests
 import threading
 import time
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 import os
+import snapshot
+import store
+import wal
+import compact
+import wire
+import metrics
+import rpc
+import scan
 
 LEADER_URL = os.getenv("LEADER_URL", "http://leader0:5001")
-SYNC_INTERVAL = 0.5                  # 50ms
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "2"))
+STREAM_READ_TIMEOUT = float(os.getenv("STREAM_READ_TIMEOUT", "15"))   # > heartbeat лідера (5s)
+RECONNECT_DELAY = float(os.getenv("RECONNECT_DELAY", "0.5"))
+
+# REPLICATION_SOURCE=s3 — закомічені сегменти WAL читаємо прямо з bucket-а лідера
+# (ranged GET-ами за маніфестом), а в лідера питаємо лише хвіст, якого ще немає в маніфесті
+REPLICATION_SOURCE = os.getenv("REPLICATION_SOURCE", "leader")
+SHARD_ID = int(os.getenv("SHARD_ID", "1"))
+BUCKET = os.getenv("BUCKET", "my-bucket")
+S3_CHUNK_BYTES = int(os.getenv("S3_CHUNK_BYTES", str(1 << 20)))
+MANIFEST_POLL_S = float(os.getenv("MANIFEST_POLL_S", "1"))
+TAIL_FROM_LEADER = os.getenv("TAIL_FROM_LEADER", "1") == "1"     # 0 — лише S3 (lag ~ інтервал маніфесту)
+TAIL_FETCH_LIMIT = int(os.getenv("TAIL_FETCH_LIMIT", "1000"))
+
+WAL_PREFIX = f"shard_{SHARD_ID}/wal"
+MANIFEST_KEY = wal.manifest_key(WAL_PREFIX)
+
+s3 = boto3.client(
+    "s3",
+    endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
+    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+) if REPLICATION_SOURCE == "s3" else None
 
 app = Flask(__name__)
 data_store = {}
+sort_index = {}                  # {table: {pkey: [sorted skeys]}}
 last_offset = 0
+# змінює data_store / sort_index лише цикл реплікації; читання йдуть без локу,
+# тож пачка записів і заміна стору snapshot-ом — кожна під одним захопленням
+store_lock = threading.Lock()
+
+# ===========================
+# METRICS
+# ===========================
+metrics.instrument_app(app)
+metrics.table_gauges(data_store)
+applied_records = metrics.Counter("follower_applied_records_total", "WAL records applied from the leader")
+stream_reconnects = metrics.Counter("follower_stream_reconnects_total", "Replication stream reconnects")
+s3_segment_bytes = metrics.Counter("follower_s3_segment_bytes_total", "WAL bytes read directly from S3")
+leader_tail_records = metrics.Counter("follower_leader_tail_records_total",
+                                      "WAL records fetched from the leader past the S3 manifest")
+
+
+# Найбільший offset лідера, який бачив цикл реплікації: X-Applied-Offset відповіді /stream,
+# last_offset з /fetch і маніфесту S3, самі застосовані записи. Scrape лише читає його —
+# жодного блокуючого запиту до лідера з /metrics.
+leader_offset = 0
+
+
+def observe_leader_offset(offset):
+    global leader_offset
+    if offset is not None and int(offset) > leader_offset:
+        leader_offset = int(offset)
+
+
+metrics.Gauge("follower_applied_offset", "Last WAL offset applied by this follower", callback=lambda: last_offset)
+metrics.Gauge("follower_leader_offset", "Latest leader offset seen by the replication loop",
+              callback=lambda: leader_offset)
+metrics.Gauge("follower_lag_records", "How many records this follower is behind the leader",
+              callback=lambda: max(0, leader_offset - last_offset))
 
 
 # def sync_loop():
@@ -51,57 +117,296 @@ last_offset = 0
 #             pass
 #         time.sleep(SYNC_INTERVAL)
 
-def sync_loop():
+def apply_records(records: list):
+    """
+    Застосовує пачку WAL-записів; уже застосовані (offset <= last_offset) пропускаються,
+    тож джерела (S3 і лідер) можуть перекриватись.
+    """
+    global last_offset
+    with store_lock:
+        records = [rec for rec in records if rec["offset"] > last_offset]
+        for rec in records:
+            store.apply_record(data_store, rec, sort_index)
+        if records:
+            last_offset = records[-1]["offset"]
+    if records:
+        applied_records.inc(amount=len(records))
+        observe_leader_offset(last_offset)
+
+
+def apply_lines(lines: list):
+    """Пачка рядків WAL → один json.loads на всю пачку замість виклику на кожен рядок."""
+    lines = [line for line in lines if line.strip()]      # порожній рядок — heartbeat
+    if lines:
+        apply_records(json.loads(b"[" + b",".join(lines) + b"]"))
+
+
+def replace_store(loaded: dict, offset: int):
+    """
+    Замінює стор завантаженим snapshot-ом. Індекс будується заздалегідь, а таблиці
+    підміняються по одній присвоєнням — читання бачить стару або нову таблицю, а не порожню.
+    """
     global last_offset
+    index = store.build_index(loaded)
+    with store_lock:
+        for table in [t for t in data_store if t not in loaded]:
+            del data_store[table]
+            sort_index.pop(table, None)
+        for table, items in loaded.items():
+            data_store[table] = items
+            sort_index[table] = index.get(table, {})
+        last_offset = offset
+    observe_leader_offset(offset)
+
+
+def bootstrap_from_snapshot() -> bool:
+    """
+    Завантажує найновіший snapshot лідера замість replay усього WAL з offset 1.
+    Повертає False, якщо snapshot-а ще немає.
+    """
+    with requests.get(f"{LEADER_URL}/snapshot", stream=True,
+                      timeout=(CONNECT_TIMEOUT, STREAM_READ_TIMEOUT)) as r:
+        if r.status_code == 404:
+            return False
+        r.raise_for_status()
+        loaded = {}
+        offset = snapshot.load_snapshot(r.raw, loaded)
+
+    replace_store(loaded, offset)
+    print(f"[Follower] bootstrapped from snapshot at offset {offset}")
+    return True
+
+
+def sync_loop():
+    """
+    Тримає відкритий реплікаційний потік лідера (/stream, chunked NDJSON)
+    і застосовує записи одразу після commit. Новий follower спершу
+    завантажує snapshot, а потім стрімить лише хвіст WAL. Якщо з'єднання обірвалося
+    або лідер мовчить довше за STREAM_READ_TIMEOUT — перепідключаємось з last_offset.
+    """
+    need_snapshot = last_offset == 0
     while True:
         try:
-            r = requests.get(f"{LEADER_URL}/fetch?from_offset={last_offset + 1}")
-            records = r.json()
-            for rec in records:
-                op = rec.get("op", "create")
-                table = rec.get("table")
-                key = (rec.get("pkey"), rec.get("skey"))
-                offset = rec.get("offset")
-
-                if op == "create_table":
-                    if table not in data_store:
-                        data_store[table] = {}
-
-                elif op == "create":
-                    value = rec["value"]
-                    if table not in data_store:
-                        data_store[table] = {}
-                    data_store[table][key] = value
-
-                elif op == "delete":
-                    if table in data_store and key in data_store[table]:
-                        del data_store[table][key]
-
-                last_offset = max(last_offset, offset)
+            if need_snapshot:
+                bootstrap_from_snapshot()
+                need_snapshot = False
+            with requests.get(
+                f"{LEADER_URL}/stream",
+                params={"from_offset": last_offset + 1},
+                stream=True,
+                timeout=(CONNECT_TIMEOUT, STREAM_READ_TIMEOUT),
+            ) as r:
+                if r.status_code == 410:
+                    # потрібні записи вже є лише в snapshot-і
+                    need_snapshot = True
+                    continue
+                r.raise_for_status()
+                observe_leader_offset(r.headers.get("X-Applied-Offset"))
+                # застосовуємо все, що прийшло одним шматком, пачкою; обрізаний рядок чекає наступного
+                carry = b""
+                for chunk in r.iter_content(chunk_size=None):
+                    lines = (carry + chunk).split(b"\n")
+                    carry = lines.pop()
+                    apply_lines(lines)
+        except Exception as e:
+            print(f"[Follower] replication stream lost ({e}), reconnecting from offset {last_offset + 1}")
+            stream_reconnects.inc()
+        time.sleep(RECONNECT_DELAY)
+
+
+# ===========================
+# REPLICATION FROM S3
+# ===========================
+def get_segment_range(key: str, start: int, end: int) -> bytes:
+    body = s3.get_object(Bucket=BUCKET, Key=key, Range=f"bytes={start}-{end - 1}")["Body"].read()
+    s3_segment_bytes.inc(amount=len(body))
+    return body
+
+
+def get_segment(key: str) -> bytes:
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    s3_segment_bytes.inc(amount=len(body))
+    return body
+
+
+# стиснені сегменти (після компакції лідера) читаються цілими і розпаковуються — розміри в маніфесті
+# для них теж у розпакованих байтах
+fetch_segment_range = wal.SegmentReader(get_segment_range, get_segment)
+
 
+def read_manifest():
+    try:
+        return json.loads(s3.get_object(Bucket=BUCKET, Key=MANIFEST_KEY)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return None                     # лідер ще нічого не опублікував
+
+
+def catch_up_from_s3(manifest: dict):
+    """Snapshot (якщо відстали від початку маніфесту) + усі сегменти після last_offset."""
+    observe_leader_offset(manifest.get("last_offset"))
+    snap = manifest.get("snapshot")
+    if last_offset + 1 < manifest["start_offset"] and snap and snap["offset"] > last_offset:
+        loaded = {}
+        obj = s3.get_object(Bucket=BUCKET, Key=snap["key"])
+        replace_store(loaded, snapshot.load_snapshot(obj["Body"], loaded))
+        print(f"[Follower] bootstrapped from S3 snapshot at offset {last_offset}")
+
+    for key, first, last, size in manifest["segments"]:
+        if last <= last_offset:
+            continue
+        for lines in wal.read_segment_chunks(fetch_segment_range, key, size, S3_CHUNK_BYTES):
+            apply_lines(lines)
+
+
+def tail_from_leader(until: float):
+    """Long-poll /fetch лідера для записів, яких ще немає в маніфесті, до моменту until."""
+    while True:
+        wait_ms = int((until - time.monotonic()) * 1000)
+        if wait_ms <= 0:
+            return
+        r = requests.get(f"{LEADER_URL}/fetch",
+                         params={"from_offset": last_offset + 1, "limit": TAIL_FETCH_LIMIT, "wait_ms": wait_ms},
+                         timeout=(CONNECT_TIMEOUT, wait_ms / 1000 + STREAM_READ_TIMEOUT))
+        if r.status_code == 410:
+            time.sleep(RECONNECT_DELAY)  # потрібне вже лише в snapshot-і — його візьмемо з маніфесту
+            return
+        r.raise_for_status()
+        body = r.json()
+        observe_leader_offset(body["last_offset"])
+        records = body["records"]
+        leader_tail_records.inc(amount=len(records))
+        apply_records(records)
+
+
+def s3_sync_loop():
+    """
+    REPLICATION_SOURCE=s3: маніфест → snapshot / сегменти з S3 → хвіст від лідера.
+    Якщо лідер недоступний (рестарт), follower далі доганяє з S3 — із затримкою
+    публікації маніфесту, але без зупинки.
+    """
+    while True:
+        try:
+            manifest = read_manifest()
+            if manifest is not None:
+                catch_up_from_s3(manifest)
+            if TAIL_FROM_LEADER:
+                tail_from_leader(time.monotonic() + MANIFEST_POLL_S)
+            else:
+                time.sleep(MANIFEST_POLL_S)
         except Exception as e:
-            pass
-        time.sleep(SYNC_INTERVAL)
+            print(f"[Follower] replication from S3 failed ({e}), retrying from offset {last_offset + 1}")
+            time.sleep(RECONNECT_DELAY)
+
+
 
+@app.before_request
+def capture_applied_offset():
+    # фіксуємо offset ДО читання: відповідь гарантовано містить усі записи <= нього
+    g.applied_offset = last_offset
+
+
+@app.after_request
+def add_applied_offset(response):
+    """X-Applied-Offset — за ним coordinator вирішує, чи можна кешувати відповідь."""
+    if "applied_offset" in g:
+        response.headers["X-Applied-Offset"] = str(g.applied_offset)
+    return response
 
 
 @app.route("/read/<table>/<pkey>/<skey>")
 def read(table, pkey, skey):
-    key = (pkey, skey)
-    if table in data_store and key in data_store[table]:
-        return jsonify({"value": data_store[table][key]}), 200
-    return jsonify({"error": "Not found"}), 404
+    return wire.json_response(*store.read_item(data_store, table, (pkey, skey)))
+
+
+@app.route("/batch_read", methods=["POST"])
+def batch_read():
+    """Читає кілька items за один запит; для відсутніх — found: false."""
+    keys = [(item.get("table_name"), (item.get("partition_key"), item.get("sort_key")))
+            for item in request.json.get("keys", [])]
+    if wire.wants_msgpack():
+        results = []
+        for table, key in keys:
+            items = data_store.get(table, {})
+            results.append({"found": True, "value": items[key]} if key in items else {"found": False})
+        return wire.respond({"results": results})
+
+    # JSON: значення вставляються як є (у STORE_MODE=compact — без серіалізації)
+    results = []
+    for table, key in keys:
+        raw = compact.get_raw(data_store.get(table, {}), key)
+        results.append(b'{"found":false}' if raw is None else compact.json_with_raw({"found": True}, "value", raw))
+    return Response(b'{"results":[' + b",".join(results) + b"]}", mimetype="application/json")
+
+
+@app.route("/query/<table>/<pkey>")
+def query(table, pkey):
+    """Діапазонний запит по партиції: begins_with / start+end / limit / exclusive_start_key."""
+    if table not in data_store:
+        return jsonify({"error": "Table not found"}), 404
+    try:
+        args = store.parse_query_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    items, last_key = store.query_partition(data_store, sort_index, table, pkey, **args)
+    return wire.respond({"items": items, "last_evaluated_key": last_key})
+
+
+@app.route("/scan/<table>")
+def scan_table(table):
+    """Один сегмент паралельного скану таблиці (NDJSON з курсорами, див. scan.py)."""
+    if table not in data_store:
+        return jsonify({"error": "Table not found"}), 404
+    try:
+        segment, total, after = scan.parse_segment_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    keys = scan.scan_keys(sort_index.get(table, {}), segment, total, after)
+    items = data_store[table]
+    return Response(scan.ndjson_segment(keys, lambda key: compact.get_raw(items, key)), mimetype=scan.NDJSON)
+
+
+@app.route("/offset")
+def offset():
+    """Applied offset репліки — coordinator за ним обирає, куди слати read-your-writes читання."""
+    return jsonify({"applied_offset": last_offset})
+
+
+@app.route("/memory")
+def memory():
+    """Скільки пам'яті займає кожна таблиця (STORE_MODE=compact — точний розклад)."""
+    return jsonify(compact.memory_report(data_store))
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.metrics_response()
 
 
 @app.route("/exists/<table>/<pkey>/<skey>")
 def exists(table, pkey, skey):
-    key = (pkey, skey)
-    exists = table in data_store and key in data_store[table]
-    return jsonify({"exists": exists})
+    return jsonify({"exists": store.item_exists(data_store, table, (pkey, skey))})
+
+
+# ===========================
+#   RPC (rpc.py)
+# ===========================
+# read/exists через persistent TCP-канал coordinator-а (RPC_ENABLED=1); записи follower не приймає
+rpc_server = rpc.RpcServer(
+    {
+        "read": lambda table_name, partition_key, sort_key:
+            store.read_item(data_store, table_name, (partition_key, sort_key)),
+        "exists": lambda table_name, partition_key, sort_key:
+            ({"exists": store.item_exists(data_store, table_name, (partition_key, sort_key))}, 200),
+    },
+    applied_offset=lambda: last_offset,
+)
 
 
 if __name__ == "__main__":
     # стартуємо фоновий потік синхронізації
-    t = threading.Thread(target=sync_loop, daemon=True)
+    t = threading.Thread(target=s3_sync_loop if REPLICATION_SOURCE == "s3" else sync_loop, daemon=True)
     t.start()
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    port = int(os.getenv("PORT", "5000"))
+    if rpc.RPC_ENABLED:
+        rpc_server.start(port + rpc.RPC_PORT_OFFSET)
+    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
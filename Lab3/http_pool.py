@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Counter, Histogram
+
+# ===========================
+#   OUTBOUND HTTP LAYER
+# ===========================
+# Спільний клієнт для запитів coordinator → shard:
+#   - keep-alive пул з'єднань на кожен shard (urllib3 тримає окремий пул на host)
+#   - таймаути за замовчуванням, щоб повільний shard не вішав handler
+#   - обмежений пул потоків для паралельного fan-out
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "1"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))          # з'єднань на один shard
+FANOUT_WORKERS = int(os.getenv("HTTP_FANOUT_WORKERS", "32"))
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=64, pool_maxsize=POOL_MAXSIZE)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+upstream_requests = Counter("upstream_requests_total", "Outbound requests per upstream shard/replica",
+                            ["upstream", "method", "status"])
+upstream_latency = Histogram("upstream_request_duration_seconds",
+                             "Outbound request latency (until response headers)", ["upstream", "method"])
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    upstream = "/".join(url.split("/", 3)[:3])      # scheme://host:port
+    start = time.perf_counter()
+    try:
+        r = _session.request(method, url, **kwargs)
+    except requests.RequestException:
+        upstream_requests.inc(upstream, method, "error")
+        raise
+    upstream_latency.observe(time.perf_counter() - start, upstream, method)
+    upstream_requests.inc(upstream, method, str(r.status_code))
+    return r
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
+
+
+def fan_out(func, args_list) -> list:
+    """Викликає func(args) для кожного елемента паралельно; результати — у тому ж порядку."""
+    args_list = list(args_list)
+    if len(args_list) <= 1:
+        return [func(args) for args in args_list]
+    return list(_executor.map(func, args_list))
@@ -1,10 +1,26 @@
 import boto3
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import os
 import botocore
 import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+import threading
+import wal
+import snapshot
+import store
+import sequencer as seq
+import compact
+import wire
+import metrics
+import rpc
+import scan
+import bloom
+from hashing import range_filter
 app = Flask(__name__)
+metrics.instrument_app(app)
 
 # ===========================
 # CONFIG
@@ -16,7 +32,54 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 BUCKET = os.getenv("BUCKET", "my-bucket")
 PORT = int(os.getenv("INTERNAL_PORT", "5001"))
 
-WAL_KEY = f"shard_{SHARD_ID}/wal.jsonl"
+# Group commit: скільки записів / байт / мс чекаємо перед одним PUT сегмента
+WAL_FLUSH_MAX_RECORDS = int(os.getenv("WAL_FLUSH_MAX_RECORDS", "256"))
+WAL_FLUSH_MAX_BYTES = int(os.getenv("WAL_FLUSH_MAX_BYTES", str(1 << 20)))
+WAL_FLUSH_INTERVAL_MS = float(os.getenv("WAL_FLUSH_INTERVAL_MS", "5"))
+# скільки батчів може одночасно бути в PUT-і (застосовуються все одно по порядку)
+WAL_PIPELINE_DEPTH = int(os.getenv("WAL_PIPELINE_DEPTH", "4"))
+
+# /fetch: скільки останніх записів тримаємо в пам'яті та ліміти однієї відповіді
+WAL_TAIL_MAX_RECORDS = int(os.getenv("WAL_TAIL_MAX_RECORDS", "10000"))
+WAL_TAIL_MAX_BYTES = int(os.getenv("WAL_TAIL_MAX_BYTES", str(16 << 20)))
+FETCH_DEFAULT_LIMIT = int(os.getenv("FETCH_DEFAULT_LIMIT", "1000"))
+FETCH_DEFAULT_MAX_BYTES = int(os.getenv("FETCH_DEFAULT_MAX_BYTES", str(1 << 20)))
+FETCH_MAX_WAIT_MS = int(os.getenv("FETCH_MAX_WAIT_MS", "30000"))
+
+# /stream: як часто шлемо heartbeat, якщо нових записів немає
+STREAM_HEARTBEAT_S = float(os.getenv("STREAM_HEARTBEAT_S", "5"))
+
+# Snapshot-и: як часто перевіряємо, скільки нових записів потрібно для нового snapshot-а,
+# і скільки останніх snapshot-ів зберігаємо
+SNAPSHOT_INTERVAL_S = float(os.getenv("SNAPSHOT_INTERVAL_S", "300"))
+SNAPSHOT_MIN_RECORDS = int(os.getenv("SNAPSHOT_MIN_RECORDS", "10000"))
+SNAPSHOT_RETAIN = int(os.getenv("SNAPSHOT_RETAIN", "2"))
+
+# Recovery: скільки ranged GET-ів WAL іде паралельно, розмір одного шматка, скільки байт
+# можна завантажити наперед (пам'ять recovery) і як часто логувати прогрес
+WAL_RECOVERY_WORKERS = int(os.getenv("WAL_RECOVERY_WORKERS", "8"))
+WAL_RECOVERY_CHUNK_BYTES = int(os.getenv("WAL_RECOVERY_CHUNK_BYTES", str(4 << 20)))
+WAL_RECOVERY_BUFFER_BYTES = int(os.getenv("WAL_RECOVERY_BUFFER_BYTES", str(64 << 20)))
+WAL_RECOVERY_LOG_INTERVAL_S = float(os.getenv("WAL_RECOVERY_LOG_INTERVAL_S", "5"))
+
+# Маніфест WAL для follower-ів з REPLICATION_SOURCE=s3: як часто публікуємо (лише якщо щось змінилось)
+WAL_MANIFEST_INTERVAL_S = float(os.getenv("WAL_MANIFEST_INTERVAL_S", "1"))
+
+# Компакція WAL: фоновий прохід переписує запечатаний префікс (усе, крім останніх
+# WAL_COMPACT_TAIL_RECORDS записів), лишаючи останній запис кожного ключа, у стиснені сегменти.
+# Tombstone прибирається, коли він старший за WAL_TOMBSTONE_RETENTION_S і вже є в snapshot-і.
+WAL_COMPACT_INTERVAL_S = float(os.getenv("WAL_COMPACT_INTERVAL_S", "60"))
+WAL_COMPACT_MIN_BYTES = int(os.getenv("WAL_COMPACT_MIN_BYTES", str(16 << 20)))   # сирих байт у префіксі
+WAL_COMPACT_TAIL_RECORDS = int(os.getenv("WAL_COMPACT_TAIL_RECORDS", "10000"))
+WAL_COMPACT_SEGMENT_BYTES = int(os.getenv("WAL_COMPACT_SEGMENT_BYTES", str(8 << 20)))
+WAL_COMPRESS_LEVEL = int(os.getenv("WAL_COMPRESS_LEVEL", "6"))
+WAL_TOMBSTONE_RETENTION_S = float(os.getenv("WAL_TOMBSTONE_RETENTION_S", "86400"))
+
+WAL_PREFIX = f"shard_{SHARD_ID}/wal"
+SNAPSHOT_PREFIX = f"shard_{SHARD_ID}/snapshots"
+MANIFEST_KEY = wal.manifest_key(WAL_PREFIX)
+COMPACTION_KEY = wal.compaction_key(WAL_PREFIX)
+LEGACY_WAL_KEY = f"shard_{SHARD_ID}/wal.jsonl"   # старий формат: один об'єкт на весь WAL
 
 s3 = boto3.client(
     "s3",
@@ -28,18 +91,23 @@ s3 = boto3.client(
 
 
 
+s3_retries = metrics.Counter("s3_retries_total", "S3 calls retried by retry_s3", ["reason"])
+
+
 def retry_s3(func, retries=10, delay=2, allow_missing=False):
     for attempt in range(1, retries + 1):
         try:
             return func()
         except botocore.exceptions.EndpointConnectionError:
             print(f"[S3] MinIO not ready, retrying ({attempt}/{retries})...")
+            s3_retries.inc("endpoint_connection")
         except botocore.exceptions.ClientError as e:
             code = e.response["Error"].get("Code")
             if code in ("NoSuchBucket", "NoSuchKey"):
                 if allow_missing and code == "NoSuchKey":
                     return None  # просто повертаємо None, WAL ще немає
                 print(f"[S3] {code}, retrying ({attempt}/{retries})...")
+                s3_retries.inc(code)
             else:
                 raise
         time.sleep(delay)
@@ -60,61 +128,488 @@ ensure_bucket()
 
 
 data_store = {}                  # локальна база
-last_offset = 0
+sort_index = {}                  # {table: {pkey: [sorted skeys]}}
+snapshot_offset = 0              # offset, який покриває останній snapshot
+compaction_marker = None         # останній закомічений маркер компакції WAL
+wal_garbage = []                 # сегменти поза маркером — видаляються наступним проходом компакції
+unindexed_segments = []          # живі сегменти до snapshot-а, які recovery не читала (їх теж компактимо)
+recovery_status = {}             # прогрес / підсумок останнього recovery (GET /wal)
+
+# ===========================
+# METRICS
+# ===========================
+wal_append_latency = metrics.Histogram("wal_append_duration_seconds",
+                                       "Time a write waits for its WAL group commit to become durable")
+wal_put_latency = metrics.Histogram("wal_segment_put_duration_seconds", "S3 PUT latency of one WAL segment")
+wal_batch_records = metrics.Histogram("wal_batch_records", "Records per WAL segment (group commit batch)",
+                                      buckets=metrics.SIZE_BUCKETS)
+wal_batch_bytes = metrics.Histogram("wal_batch_bytes", "Bytes per WAL segment", buckets=metrics.SIZE_BUCKETS)
+fetch_records = metrics.Histogram("replication_response_records", "WAL records per /fetch response or /stream chunk",
+                                  ["endpoint"], buckets=metrics.SIZE_BUCKETS)
+fetch_bytes = metrics.Histogram("replication_response_bytes", "Bytes per /fetch response or /stream chunk",
+                                ["endpoint"], buckets=metrics.SIZE_BUCKETS)
+metrics.Gauge("leader_last_offset", "Last offset handed out by the leader", callback=lambda: sequencer.last_offset)
+metrics.Gauge("leader_applied_offset", "All writes up to this offset are applied", callback=lambda: sequencer.applied_offset)
+metrics.Gauge("leader_pending_writes", "Writes sequenced but not yet durable and applied",
+              callback=lambda: sequencer.pending())
+metrics.Gauge("leader_committed_offset", "Last durable WAL offset", callback=lambda: wal_index.last_offset)
+wal_compactions = metrics.Counter("wal_compactions_total", "WAL compaction passes", ["result"])
+wal_compaction_latency = metrics.Histogram("wal_compaction_duration_seconds", "Duration of one WAL compaction pass")
+wal_compaction_dropped = metrics.Counter("wal_compaction_dropped_records_total",
+                                         "Records removed by WAL compaction", ["reason"])
+metrics.Gauge("wal_segments", "Indexed WAL segments", ["kind"], callback=lambda: {
+    ("compressed",): wal_index.stats()["compressed_segments"],
+    ("raw",): wal_index.stats()["segments"] - wal_index.stats()["compressed_segments"],
+})
+metrics.Gauge("wal_start_offset", "Oldest offset still readable from the WAL", callback=lambda: wal_index.start_offset)
+metrics.table_gauges(data_store)
+for stat in ("bytes", "estimated_fpr"):
+    metrics.Gauge(f"bloom_filter_{stat}", f"Bloom filter {stat} per table", ["table"],
+                  callback=lambda stat=stat: {(t,): st[stat] for t, st in bloom_filters.stats()["tables"].items()})
 
 # ===========================
 # HELPERS
 # ===========================
-def append_wal(record: dict):
-    """Append record to S3 WAL"""
-    s3.put_object(
-        Bucket=BUCKET,
-        Key=WAL_KEY,
-        Body=(json.dumps(record) + "\n").encode()
-        # ⚠ У реальному продакшн потрібен multi-part append або DynamoDB
-    )
+def stable_offset() -> int:
+    """Найбільший offset, до якого (включно) всі записи вже застосовані до data_store."""
+    return sequencer.applied_offset
+
+
+def put_segment(first_offset: int, body: bytes):
+    """Записує один сегмент WAL (незмінний об'єкт) у S3."""
     def _put():
         return s3.put_object(
             Bucket=BUCKET,
-            Key=WAL_KEY,
-            Body=(json.dumps(record) + "\n").encode()
+            Key=wal.segment_key(WAL_PREFIX, first_offset),
+            Body=body
         )
-    retry_s3(_put)
+    with wal_put_latency.time():
+        retry_s3(_put)
+
+
+def get_segment_range(key: str, start: int, end: int) -> bytes:
+    """Ranged GET шматка сегмента [start, end)."""
+    def _get():
+        return s3.get_object(Bucket=BUCKET, Key=key, Range=f"bytes={start}-{end - 1}")
+    return retry_s3(_get)["Body"].read()
+
+
+def get_segment(key: str) -> bytes:
+    return retry_s3(lambda: s3.get_object(Bucket=BUCKET, Key=key))["Body"].read()
+
+
+# сирі й стиснені (після компакції) сегменти читаються однаково
+fetch_segment_range = wal.SegmentReader(get_segment_range, get_segment)
+
+
+wal_index = wal.WalIndex(
+    tail_max_records=WAL_TAIL_MAX_RECORDS,
+    tail_max_bytes=WAL_TAIL_MAX_BYTES,
+)
+
+
+def on_wal_commit(first_offset: int, entries: list):
+    wal_batch_records.observe(len(entries))
+    wal_batch_bytes.observe(sum(len(line) for _, line in entries))
+    sequencer.on_commit(entries)
+    wal_index.add_segment(wal.segment_key(WAL_PREFIX, first_offset), entries)
+
+
+wal_writer = wal.GroupCommitWriter(
+    put_segment,
+    max_records=WAL_FLUSH_MAX_RECORDS,
+    max_bytes=WAL_FLUSH_MAX_BYTES,
+    max_latency=WAL_FLUSH_INTERVAL_MS / 1000.0,
+    on_commit=on_wal_commit,
+    on_abort=lambda offsets: sequencer.on_abort(offsets),
+    max_inflight=WAL_PIPELINE_DEPTH,
+    discard_segment=lambda first_offset: retry_s3(
+        lambda: s3.delete_object(Bucket=BUCKET, Key=wal.segment_key(WAL_PREFIX, first_offset)),
+        retries=3, delay=1),
+)
+
+# усі записи йдуть через sequencer: offset-и, перевірки й застосування — в одному порядку
+sequencer = seq.Sequencer(
+    data_store, wal_writer,
+    apply=lambda rec: apply_record(rec),
+)
+
+
+def apply_record(rec: dict):
+    store.apply_record(data_store, rec, sort_index)
+    op = rec.get("op", "create")
+    if op == "create":
+        bloom_filters.add(rec["table"], rec["pkey"], rec["skey"])
+    elif op == "delete":
+        bloom_filters.remove(rec["table"], rec["pkey"], rec["skey"])
+
+
+# Bloom filter-и таблиць для coordinator-а (bloom.py); будуються з data_store на першому GET /bloom
+bloom_filters = bloom.TableFilters(lambda: list(data_store), lambda table: list(data_store.get(table, ())))
+
+
+def wait_durable(batch: seq.WriteBatch):
+    """Чекає, поки записи батчу стануть durable у WAL і застосуються до data_store."""
+    with wal_append_latency.time():
+        batch.wait()
+
+
+def live_wal_segments() -> list:
+    """Живі сегменти WAL за маркером компакції: [(key, розмір об'єкта)]; решта ключів іде в wal_garbage."""
+    global compaction_marker, wal_garbage
+    objects = retry_s3(lambda: wal.list_segments(s3, BUCKET, WAL_PREFIX, with_sizes=True), retries=3, delay=1)
+    obj = retry_s3(lambda: s3.get_object(Bucket=BUCKET, Key=COMPACTION_KEY),
+                   retries=3, delay=1, allow_missing=True)
+    compaction_marker = json.loads(obj["Body"].read()) if obj is not None else None
+    sizes = dict(objects)
+    live, wal_garbage = wal.live_segments([key for key, _ in objects], compaction_marker)
+    return [(key, sizes.get(key, 0)) for key in live]
+
+
+def wal_segments_to_replay(from_offset: int = 1) -> list:
+    """
+    [(key, розмір)] сегментів WAL для recovery за порядком: спершу legacy wal.jsonl, потім сегменти.
+    Сегменти, які повністю лежать до from_offset, пропускаються (запам'ятовуються в unindexed_segments).
+    """
+    def _head_legacy():
+        try:
+            return s3.head_object(Bucket=BUCKET, Key=LEGACY_WAL_KEY)
+        except botocore.exceptions.ClientError as e:
+            # HEAD не має тіла, тож відсутній ключ — це "404", а не NoSuchKey
+            if e.response["Error"].get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    segments = live_wal_segments()
+    replay = []
+
+    # після першої компакції legacy-лог уже в стиснених сегментах
+    if compaction_marker is None and (not segments or wal.segment_first_offset(segments[0][0]) > from_offset):
+        head = retry_s3(_head_legacy, retries=3, delay=1)
+        if head is not None:
+            replay.append((LEGACY_WAL_KEY, head["ContentLength"]))
+
+    for i, (key, size) in enumerate(segments):
+        if i + 1 < len(segments) and wal.segment_first_offset(segments[i + 1][0]) <= from_offset:
+            unindexed_segments.append(key)
+            continue
+        replay.append((key, size))
+    return replay
 
-def load_wal():
-    """Load WAL with retry (safe on empty/minio cold start)."""
-    global last_offset
 
-    def _load():
-        return s3.get_object(Bucket=BUCKET, Key=WAL_KEY)
+# ===========================
+# SNAPSHOTS
+# ===========================
+# snapshot і компакція WAL читають і змінюють snapshot_offset / маркер компакції / wal_index —
+# виконуються по одному (фонові цикли, POST /snapshot і POST /wal/compact)
+maintenance_lock = threading.Lock()
+
 
+class MaintenanceBusy(Exception):
+    """Snapshot або компакція WAL уже виконується."""
+
+
+@contextmanager
+def maintenance(wait=True):
+    if not maintenance_lock.acquire(blocking=wait):
+        raise MaintenanceBusy("Snapshot or WAL compaction already in progress")
     try:
-        obj = retry_s3(_load, retries=3, delay=1, allow_missing=True)
-        if obj is None:
-            print(f"[Leader {SHARD_ID}] WAL empty, starting fresh")
-            return
+        yield
+    finally:
+        maintenance_lock.release()
 
-        lines = obj["Body"].read().decode().splitlines()
-        for line in lines:
-            rec = json.loads(line)
-            table, key, value, offset = (
-                rec["table"],
-                (rec["pkey"], rec["skey"]),
-                rec["value"],
-                rec["offset"],
-            )
-            if table not in data_store:
-                data_store[table] = {}
-            data_store[table][key] = value
-            last_offset = max(last_offset, offset)
 
-        print(f"[Leader {SHARD_ID}] WAL loaded, last_offset={last_offset}")
+def take_snapshot(wait=True):
+    """Записує snapshot data_store у S3 і видаляє старі (лишаємо SNAPSHOT_RETAIN)."""
+    global snapshot_offset
+
+    with maintenance(wait):
+        # offset беремо ДО копіювання: усі записи <= offset уже в data_store,
+        # а частково застосовані пізніші записи ідемпотентно перезапишуться при replay
+        offset = stable_offset()
+        if offset <= snapshot_offset:
+            return None
+        tables = {name: items.copy() for name, items in list(data_store.items())}
+        body = snapshot.encode_snapshot(offset, tables)
+
+        key = snapshot.snapshot_key(SNAPSHOT_PREFIX, offset)
+        retry_s3(lambda: s3.put_object(Bucket=BUCKET, Key=key, Body=body))
+        snapshot_offset = offset
+        print(f"[Leader {SHARD_ID}] Snapshot at offset {offset} ({len(body)} bytes)")
+        # спершу маніфест з новим snapshot-ом, потім видалення старих — follower не побачить ключ, якого вже немає
+        publish_manifest()
+
+        keys = retry_s3(lambda: wal.list_segments(s3, BUCKET, SNAPSHOT_PREFIX))
+        for old in keys[:-SNAPSHOT_RETAIN]:
+            retry_s3(lambda: s3.delete_object(Bucket=BUCKET, Key=old))
+        return offset
+
+
+# ===========================
+# WAL MANIFEST
+# ===========================
+published_manifest = None        # (last_offset, snapshot_offset, покоління компакції) опублікованого маніфесту
+
+
+def publish_manifest():
+    """
+    Записує в S3 список закомічених сегментів після останнього snapshot-а.
+    Follower-и з REPLICATION_SOURCE=s3 читають сегменти за ним напряму з bucket-а,
+    тож навантаження на лідера не росте з кількістю реплік.
+    """
+    global published_manifest
+    state = (wal_index.last_offset, snapshot_offset, (compaction_marker or {}).get("generation"))
+    if state == published_manifest:
+        return
+    manifest = wal_index.manifest(after_offset=snapshot_offset)
+    manifest["snapshot"] = ({"key": snapshot.snapshot_key(SNAPSHOT_PREFIX, snapshot_offset), "offset": snapshot_offset}
+                            if snapshot_offset else None)
+    body = json.dumps(manifest, separators=(",", ":")).encode()
+    retry_s3(lambda: s3.put_object(Bucket=BUCKET, Key=MANIFEST_KEY, Body=body))
+    published_manifest = state
+
+
+def manifest_loop():
+    while True:
+        time.sleep(WAL_MANIFEST_INTERVAL_S)
+        try:
+            publish_manifest()
+        except Exception as e:
+            print(f"[Leader {SHARD_ID}] Manifest publish failed: {e}")
+
+
+def snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_S)
+        try:
+            if sequencer.last_offset - snapshot_offset >= SNAPSHOT_MIN_RECORDS:
+                take_snapshot()
+        except Exception as e:
+            print(f"[Leader {SHARD_ID}] Snapshot failed: {e}")
+
+
+# ===========================
+# WAL COMPACTION
+# ===========================
+def compact_wal(force=False, wait=True):
+    """
+    Один прохід компакції запечатаного префікса WAL (wal.compact_segments) у стиснені сегменти.
+    Результат комітиться атомарно записом маркера; до того recovery і follower-и бачать старі
+    сегменти. Джерела попереднього проходу видаляються лише тепер — читачі, які ще йшли
+    за старим маніфестом, встигли їх дочитати.
+    Повертає статистику проходу або None, якщо компактити нічого.
+    wait=False — MaintenanceBusy, якщо snapshot чи інша компакція вже йде.
+    """
+    global compaction_marker, wal_garbage, unindexed_segments
+
+    with maintenance(wait):
+        for key in wal_garbage:
+            retry_s3(lambda: s3.delete_object(Bucket=BUCKET, Key=key))
+        wal_garbage = []
+
+        prefix = wal_index.sealed_prefix(wal_index.last_offset - WAL_COMPACT_TAIL_RECORDS)
+        raw_bytes = sum(size for key, _, size, _ in prefix if not wal.is_compressed(key))
+        pending_raw = any(not wal.is_compressed(key) for key in unindexed_segments)
+        if not prefix and not unindexed_segments:
+            return None
+        if not force and raw_bytes < WAL_COMPACT_MIN_BYTES and not pending_raw:
+            return None
+
+        started = time.time()
+        # у не прочитаних recovery сегментах час commit-у невідомий — рахуємо від старту процесу
+        sources = ([(key, started) for key in unindexed_segments]
+                   + [(key, committed_at) for key, _, _, committed_at in prefix])
+        tombstone_before = started - WAL_TOMBSTONE_RETENTION_S
+        drop_before = snapshot_offset
+
+        def drop_tombstone(offset, deleted_at):
+            # follower, що відстав за offset, і так завантажить snapshot, у якому цього item-а вже немає
+            return offset <= drop_before and deleted_at <= tombstone_before
+
+        generation = (compaction_marker or {}).get("generation", 0) + 1
+        stats, segments, written = {}, [], []
+        with wal_compaction_latency.time():
+            for entries in wal.compact_segments(sources, fetch_segment_range.segment, drop_tombstone,
+                                                WAL_COMPACT_SEGMENT_BYTES, stats):
+                key = wal.compacted_key(WAL_PREFIX, entries[0][0], generation)
+                body = wal.compress_segment(b"".join(line for _, line in entries), WAL_COMPRESS_LEVEL)
+                retry_s3(lambda: s3.put_object(Bucket=BUCKET, Key=key, Body=body))
+                segments.append((key, entries))
+                written.append(len(body))
+
+            horizon = max([last for _, last, _, _ in prefix] + [stats["last_offset"],
+                                                                (compaction_marker or {}).get("horizon", 0)])
+            start_offset = max(wal_index.start_offset, stats["max_dropped_tombstone"] + 1)
+            marker = {
+                "generation": generation,
+                "horizon": horizon,
+                "start_offset": start_offset,
+                "segments": [[key, entries[0][0], entries[-1][0], sum(len(line) for _, line in entries)]
+                             for key, entries in segments],
+                "compacted_at": started,
+            }
+            retry_s3(lambda: s3.put_object(Bucket=BUCKET, Key=COMPACTION_KEY,
+                                           Body=json.dumps(marker, separators=(",", ":")).encode()))
+
+        source_keys = [key for key, _ in sources]
+        wal_index.replace_prefix(source_keys, segments, started, start_offset)
+        compaction_marker = marker
+        wal_garbage = source_keys
+        unindexed_segments = []
+        publish_manifest()
+
+        wal_compactions.inc("compacted")
+        wal_compaction_dropped.inc("superseded", amount=stats["superseded"])
+        wal_compaction_dropped.inc("tombstone", amount=stats["tombstones"])
+        result = {
+            "generation": generation,
+            "horizon": horizon,
+            "source_segments": len(sources),
+            "segments": len(segments),
+            "records": stats["records"],
+            "superseded": stats["superseded"],
+            "tombstones_dropped": stats["tombstones"],
+            "compressed_bytes": sum(written),
+            "start_offset": start_offset,
+        }
+        print(f"[Leader {SHARD_ID}] WAL compacted: {result}")
+        return result
+
+
+def compaction_loop():
+    while True:
+        time.sleep(WAL_COMPACT_INTERVAL_S)
+        try:
+            compact_wal()
+        except Exception as e:
+            wal_compactions.inc("failed")
+            print(f"[Leader {SHARD_ID}] WAL compaction failed: {e}")
+
+
+def latest_snapshot_key():
+    keys = retry_s3(lambda: wal.list_segments(s3, BUCKET, SNAPSHOT_PREFIX), retries=3, delay=1)
+    return keys[-1] if keys else None
+
+
+def load_latest_snapshot():
+    """Завантажує найновіший snapshot (якщо битий — пробуємо старіший)."""
+    global snapshot_offset
+
+    keys = retry_s3(lambda: wal.list_segments(s3, BUCKET, SNAPSHOT_PREFIX), retries=3, delay=1)
+    for key in reversed(keys):
+        try:
+            obj = retry_s3(lambda: s3.get_object(Bucket=BUCKET, Key=key))
+            loaded = {}
+            offset = snapshot.load_snapshot(obj["Body"], loaded)
+        except Exception as e:
+            print(f"[Leader {SHARD_ID}] Snapshot {key} unreadable ({e}), trying older")
+            continue
+        data_store.clear()
+        data_store.update(loaded)
+        sort_index.clear()
+        sort_index.update(store.build_index(data_store))
+        sequencer.reset(offset)
+        snapshot_offset = offset
+        print(f"[Leader {SHARD_ID}] Snapshot loaded, offset={offset}")
+        return offset
+    return 0
+
+
+def load_wal():
+    """
+    Recovery: найновіший snapshot + replay лише хвоста WAL після нього
+    (with retry, safe on empty/minio cold start). Заодно будує offset-індекс.
+    WAL читається потоком: WAL_RECOVERY_WORKERS паралельних ranged GET-ів наперед
+    (не більше WAL_RECOVERY_BUFFER_BYTES), рядки розбираються і застосовуються по порядку
+    offset-ів, тож пам'ять не залежить від розміру WAL.
+    """
+    last_offset = 0
+    try:
+        from_offset = load_latest_snapshot() + 1
+        last_offset = from_offset - 1
+        count = 0
+        segments = wal_segments_to_replay(from_offset)
+        progress = RecoveryProgress(len(segments), sum(size for _, size in segments))
+
+        offsets, positions, tail, pos = array("q"), array("q"), deque(maxlen=WAL_TAIL_MAX_RECORDS), 0
+        for seg_key, lines, segment_end, fetched in wal.fetch_parallel(
+                get_segment_range, fetch_segment_range.segment, segments,
+                WAL_RECOVERY_CHUNK_BYTES, WAL_RECOVERY_WORKERS, WAL_RECOVERY_BUFFER_BYTES):
+            for line in lines:
+                rec = json.loads(line)
+                offsets.append(rec["offset"])
+                positions.append(pos)
+                pos += len(line)
+                tail.append((rec["offset"], line))
+                if rec["offset"] < from_offset:
+                    continue
+                count += 1
+                store.apply_record(data_store, rec, sort_index)
+                last_offset = max(last_offset, rec["offset"])
+            progress.update(fetched, len(lines), segment_end)
+            if not segment_end:
+                continue
+            positions.append(pos)
+            if not wal_index.last_offset:
+                # записи до першого проіндексованого сегмента доступні лише через snapshot
+                wal_index.start_offset = min(offsets[0], from_offset) if offsets else from_offset
+            wal_index.add_indexed_segment(seg_key, offsets, positions, tail)
+            offsets, positions, tail, pos = array("q"), array("q"), deque(maxlen=WAL_TAIL_MAX_RECORDS), 0
+        progress.finish()
+        if not wal_index.last_offset:
+            wal_index.start_offset = from_offset
+        if compaction_marker is not None:
+            # tombstone-и до start_offset маркера вже прибрані — ці offset-и є лише в snapshot-і
+            wal_index.start_offset = max(wal_index.start_offset, compaction_marker["start_offset"])
+        wal_index.last_offset = max(wal_index.last_offset, last_offset)
+
+        if count == 0 and last_offset == 0:
+            print(f"[Leader {SHARD_ID}] WAL empty, starting fresh")
+            return
+        print(f"[Leader {SHARD_ID}] WAL loaded ({count} records replayed), last_offset={last_offset}")
 
     except botocore.exceptions.ClientError as e:
         if e.response["Error"]["Code"] == "NoSuchKey":
             print(f"[Leader {SHARD_ID}] WAL empty")
         else:
             raise
+    finally:
+        # наступний запис продовжить нумерацію після відновлених
+        sequencer.reset(max(sequencer.last_offset, last_offset))
+
+class RecoveryProgress:
+    """Прогрес recovery в лог раз на WAL_RECOVERY_LOG_INTERVAL_S: байти, записи, пропускна здатність, ETA."""
+
+    def __init__(self, segments: int, total_bytes: int):
+        self.started = self.logged = time.monotonic()
+        recovery_status.clear()
+        recovery_status.update(state="running", segments_total=segments, segments=0,
+                               bytes_total=total_bytes, bytes=0, records=0)
+
+    def update(self, fetched: int, records: int, segment_end: bool):
+        recovery_status["bytes"] += fetched
+        recovery_status["records"] += records
+        recovery_status["segments"] += segment_end
+        now = time.monotonic()
+        if now - self.logged >= WAL_RECOVERY_LOG_INTERVAL_S:
+            self.logged = now
+            print(f"[Leader {SHARD_ID}] Recovery: {self._summary(now)}")
+
+    def finish(self):
+        now = time.monotonic()
+        recovery_status.update(state="done", duration_s=round(now - self.started, 3))
+        print(f"[Leader {SHARD_ID}] Recovery finished in {now - self.started:.1f}s: {self._summary(now)}")
+
+    def _summary(self, now) -> str:
+        st = recovery_status
+        elapsed = max(now - self.started, 1e-6)
+        rate = st["bytes"] / elapsed
+        eta = (st["bytes_total"] - st["bytes"]) / rate if rate else 0.0
+        st.update(mb_per_s=round(rate / 2**20, 2), records_per_s=round(st["records"] / elapsed))
+        return (f"{st['segments']}/{st['segments_total']} segments, "
+                f"{st['bytes'] / 2**20:.1f}/{st['bytes_total'] / 2**20:.1f} MB, {st['records']} records, "
+                f"{st['mb_per_s']} MB/s, {st['records_per_s']} records/s, ETA {eta:.0f}s")
+
 
 # ===========================
 # API
@@ -131,81 +626,247 @@ def load_wal():
 
 @app.route("/register_table", methods=["POST"])
 def register_table():
-    global last_offset
     body = request.json
     table_name = body.get("table_name")
     if not table_name:
         return jsonify({"error": "Missing table_name"}), 400
-    if table_name not in data_store:
-        data_store[table_name] = {}
-
-        # записуємо у WAL
-        last_offset += 1
-        record = {
-            "offset": last_offset,
-            "op": "create_table",
-            "table": table_name
-        }
-        append_wal(record)
+    with sequencer.batch() as batch:
+        if not batch.table_exists(table_name):
+            # записуємо у WAL
+            batch.add({"op": "create_table", "table": table_name})
+    try:
+        wait_durable(batch)
+    except Exception as e:
+        return jsonify({"error": f"WAL write failed: {e}"}), 503
+
+    return jsonify({"status": f"table {table_name} registered", "offset": sequencer.last_offset}), 201
+
+
+def create_item(table_name, partition_key, sort_key, value=None):
+    """(body, status) — спільне для HTTP /create і RPC create."""
+    # перевірка і видача offset-у — атомарно: паралельний create того самого ключа побачить цей запис
+    with sequencer.batch() as batch:
+        if not batch.table_exists(table_name):
+            return {"error": "Table not found"}, 404
+        if batch.item_exists(table_name, (partition_key, sort_key)):
+            return {"error": "Item already exists"}, 400
+        record = batch.add({
+            "table": table_name,
+            "pkey": partition_key,
+            "skey": sort_key,
+            "value": value
+        })
+
+    # append в S3 WAL — відповідаємо лише після durable commit батчу і застосування
+    try:
+        wait_durable(batch)
+    except Exception as e:
+        return {"error": f"WAL write failed: {e}"}, 503
 
-    return jsonify({"status": f"table {table_name} registered", "offset": last_offset}), 201
+    return {"status": "created", "offset": record["offset"]}, 201
 
 
 @app.route("/create", methods=["POST"])
 def create():
-    global last_offset
     body = request.json
-    table = body["table_name"]
-    pkey = body["partition_key"]
-    skey = body["sort_key"]
-    value = body["value"]
+    return wire.json_response(*create_item(body["table_name"], body["partition_key"],
+                                           body["sort_key"], body["value"]))
 
-    if table not in data_store:
-        return jsonify({"error": "Table not found"}), 404
-    key = (pkey, skey)
-    if key in data_store[table]:
-        return jsonify({"error": "Item already exists"}), 400
 
-    last_offset += 1
-    record = {
-        "offset": last_offset,
-        "table": table,
-        "pkey": pkey,
-        "skey": skey,
-        "value": value
-    }
+def snapshot_required():
+    """Записи до start_offset є лише в snapshot — follower має спершу завантажити його."""
+    return jsonify({
+        "error": "Offset is older than the WAL tail, bootstrap from /snapshot",
+        "start_offset": wal_index.start_offset,
+    }), 410
+
+
+@app.route("/snapshot", methods=["GET"])
+def get_snapshot():
+    """Віддає найновіший snapshot (gzip NDJSON) потоком з S3; offset — у X-Snapshot-Offset."""
+    key = latest_snapshot_key()
+    if key is None:
+        return jsonify({"error": "No snapshot"}), 404
+    obj = retry_s3(lambda: s3.get_object(Bucket=BUCKET, Key=key))
+    return Response(
+        obj["Body"].iter_chunks(),
+        mimetype="application/gzip",
+        headers={"X-Snapshot-Offset": str(snapshot.snapshot_offset(key))},
+    )
+
 
-    # записуємо локально
-    data_store[table][key] = value
-    # append в S3 WAL
-    append_wal(record)
+@app.route("/snapshot", methods=["POST"])
+def create_snapshot():
+    """Примусово робить snapshot (наприклад, перед плановим рестартом)."""
+    try:
+        offset = take_snapshot(wait=False)
+    except MaintenanceBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"status": "snapshot taken" if offset else "up to date",
+                    "offset": snapshot_offset}), 201 if offset else 200
+
+
+@app.route("/wal", methods=["GET"])
+def wal_stats():
+    """Стан WAL: сегменти (сирі / стиснені), межі offset-ів, остання компакція і recovery."""
+    return jsonify({**wal_index.stats(), "snapshot_offset": snapshot_offset, "recovery": recovery_status,
+                    "compaction": {k: v for k, v in (compaction_marker or {}).items() if k != "segments"}})
+
+
+@app.route("/wal/compact", methods=["POST"])
+def wal_compact():
+    """Примусова компакція WAL (без очікування порогу WAL_COMPACT_MIN_BYTES)."""
+    try:
+        result = compact_wal(force=True, wait=False)
+    except MaintenanceBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(result or {"status": "nothing to compact"}), 200
+
+
+@app.route("/batch_create", methods=["POST"])
+def batch_create():
+    """
+    Створює кілька items за один запит: усі валідні записи йдуть у WAL
+    одним group commit-ом. Статус — окремо для кожного item.
+    """
+    items = request.json.get("items", [])
+    results = [None] * len(items)
+    records = []
+
+    with sequencer.batch() as batch:
+        for i, item in enumerate(items):
+            table = item.get("table_name")
+            key = (item.get("partition_key"), item.get("sort_key"))
+            if not batch.table_exists(table):
+                results[i] = {"status": 404, "error": "Table not found"}
+            elif batch.item_exists(table, key):
+                results[i] = {"status": 400, "error": "Item already exists"}
+            else:
+                records.append((i, batch.add({
+                    "table": table,
+                    "pkey": key[0],
+                    "skey": key[1],
+                    "value": item.get("value")
+                })))
+
+    try:
+        wait_durable(batch)
+        for i, rec in records:
+            results[i] = {"status": 201, "offset": rec["offset"]}
+    except Exception as e:
+        for i, _ in records:
+            results[i] = {"status": 503, "error": f"WAL write failed: {e}"}
 
-    return jsonify({"status": "created", "offset": last_offset}), 201
+    return wire.respond({"results": results})
+
+
+@app.route("/batch_read", methods=["POST"])
+def batch_read():
+    """Читає кілька items за один запит; для відсутніх — found: false."""
+    keys = [(item.get("table_name"), (item.get("partition_key"), item.get("sort_key")))
+            for item in request.json.get("keys", [])]
+    if wire.wants_msgpack():
+        results = []
+        for table, key in keys:
+            items = data_store.get(table, {})
+            results.append({"found": True, "value": items[key]} if key in items else {"found": False})
+        return wire.respond({"results": results})
+
+    # JSON: значення вставляються як є (у STORE_MODE=compact — без серіалізації)
+    results = []
+    for table, key in keys:
+        raw = compact.get_raw(data_store.get(table, {}), key)
+        results.append(b'{"found":false}' if raw is None else compact.json_with_raw({"found": True}, "value", raw))
+    return Response(b'{"results":[' + b",".join(results) + b"]}", mimetype="application/json")
 
 
 @app.route("/fetch")
 def fetch():
-    """Follower запитує записи від from_offset"""
+    """
+    Follower запитує записи від from_offset.
+    Відповідь: {"records": [...], "next_offset": cursor, "last_offset": ...};
+    next_offset — курсор, з якого продовжувати наступний запит.
+    wait_ms > 0 — long-poll: якщо нових записів немає, чекаємо на commit.
+    """
     from_offset = int(request.args.get("from_offset", 1))
-    try:
-        obj = s3.get_object(Bucket=BUCKET, Key=WAL_KEY)
-        lines = obj["Body"].read().decode().splitlines()
-        records = []
-        for line in lines:
-            rec = json.loads(line)
-            if rec["offset"] >= from_offset:
-                records.append(rec)
-        return jsonify(records)
-    except s3.exceptions.NoSuchKey:
-        return jsonify([])
+    limit = int(request.args.get("limit", FETCH_DEFAULT_LIMIT))
+    max_bytes = int(request.args.get("max_bytes", FETCH_DEFAULT_MAX_BYTES))
+    wait_ms = min(int(request.args.get("wait_ms", 0)), FETCH_MAX_WAIT_MS)
+
+    if from_offset < wal_index.start_offset:
+        return snapshot_required()
+    if wait_ms > 0:
+        wal_index.wait_for(from_offset, wait_ms / 1000.0)
+
+    lines, next_offset = wal_index.read(from_offset, fetch_segment_range, limit, max_bytes)
+
+    # рядки WAL уже є готовим JSON — склеюємо їх без повторного json.loads/dumps
+    body = (b'{"records":[' + b",".join(line.rstrip(b"\n") for line in lines)
+            + b'],"next_offset":' + str(next_offset).encode()
+            + b',"last_offset":' + str(wal_index.last_offset).encode() + b"}")
+    fetch_records.observe(len(lines), "fetch")
+    fetch_bytes.observe(len(body), "fetch")
+    return Response(body, mimetype="application/json")
+
+
+@app.route("/stream")
+def stream():
+    """
+    Реплікаційний потік: chunked NDJSON, по одному WAL-запису на рядок.
+    З'єднання тримається відкритим; нові записи пушаться одразу після commit.
+    Порожній рядок — heartbeat, щоб follower міг помітити мертве з'єднання.
+    """
+    from_offset = int(request.args.get("from_offset", 1))
+    if from_offset < wal_index.start_offset:
+        return snapshot_required()
+
+    def generate():
+        cursor = from_offset
+        while True:
+            lines, cursor = wal_index.read(
+                cursor, fetch_segment_range, FETCH_DEFAULT_LIMIT, FETCH_DEFAULT_MAX_BYTES
+            )
+            if lines:
+                chunk = b"".join(lines)
+                fetch_records.observe(len(lines), "stream")
+                fetch_bytes.observe(len(chunk), "stream")
+                yield chunk
+            elif not wal_index.wait_for(cursor, STREAM_HEARTBEAT_S):
+                yield b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@app.before_request
+def capture_applied_offset():
+    # фіксуємо offset ДО читання: відповідь гарантовано містить усі записи <= нього
+    g.applied_offset = stable_offset()
+
+
+@app.after_request
+def add_applied_offset(response):
+    """X-Applied-Offset — за ним coordinator вирішує, чи можна кешувати відповідь."""
+    if "applied_offset" in g:
+        response.headers["X-Applied-Offset"] = str(g.applied_offset)
+    return response
 
 
 @app.route("/read/<table>/<pkey>/<skey>")
 def read(table, pkey, skey):
-    key = (pkey, skey)
-    if table in data_store and key in data_store[table]:
-        return jsonify({"value": data_store[table][key]}), 200
-    return jsonify({"error": "Not found"}), 404
+    return wire.json_response(*store.read_item(data_store, table, (pkey, skey)))
+
+
+@app.route("/query/<table>/<pkey>")
+def query(table, pkey):
+    """Діапазонний запит по партиції: begins_with / start+end / limit / exclusive_start_key."""
+    if table not in data_store:
+        return jsonify({"error": "Table not found"}), 404
+    try:
+        args = store.parse_query_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    items, last_key = store.query_partition(data_store, sort_index, table, pkey, **args)
+    return wire.respond({"items": items, "last_evaluated_key": last_key})
 
 
 # @app.route("/delete/<table>/<pkey>/<skey>", methods=["DELETE"])
@@ -216,40 +877,183 @@ def read(table, pkey, skey):
 #         return jsonify({"status": "deleted"}), 200
 #     return jsonify({"error": "Not found"}), 404
 
+def delete_item(table_name, partition_key, sort_key):
+    """(body, status) — спільне для HTTP /delete і RPC delete."""
+    with sequencer.batch() as batch:
+        if not batch.item_exists(table_name, (partition_key, sort_key)):
+            return {"error": "Not found"}, 404
+        # append у WAL
+        record = batch.add({
+            "table": table_name,
+            "pkey": partition_key,
+            "skey": sort_key,
+            "value": None,         # None означає видалення
+            "op": "delete"         # додаємо поле операції
+        })
+    try:
+        wait_durable(batch)
+    except Exception as e:
+        return {"error": f"WAL write failed: {e}"}, 503
+
+    return {"status": "deleted", "offset": record["offset"]}, 200
+
+
 @app.route("/delete/<table>/<pkey>/<skey>", methods=["DELETE"])
 def delete(table, pkey, skey):
-    global last_offset
-    key = (pkey, skey)
+    return wire.json_response(*delete_item(table, pkey, skey))
+
+
+
+# ===========================
+# MIGRATION (online rebalance)
+# ===========================
+MIGRATE_WAL_BATCH = 1000
+
+
+def write_chunks(items: list, add):
+    """
+    Пише items через sequencer пачками по MIGRATE_WAL_BATCH (одна пачка — один group commit).
+    add(batch, item) перевіряє item і додає запис (True, якщо додав); повертає к-сть доданих.
+    """
+    written = 0
+    for i in range(0, len(items), MIGRATE_WAL_BATCH):
+        with sequencer.batch() as batch:
+            written += sum(1 for item in items[i:i + MIGRATE_WAL_BATCH] if add(batch, item))
+        wait_durable(batch)
+    return written
+
+
+@app.route("/migrate/export", methods=["POST"])
+def migrate_export():
+    """
+    Стрімить (NDJSON) усі items, чий route key (table:pkey) потрапляє в ranges.
+    Першими йдуть рядки create_table, щоб новий shard мав усі таблиці.
+    """
+    contains = range_filter(request.json["ranges"])
+
+    def generate():
+        for table in list(data_store):
+            yield json.dumps({"op": "create_table", "table": table}) + "\n"
+        for table, items in list(data_store.items()):
+            for (pkey, skey), value in list(items.items()):
+                if contains(f"{table}:{pkey}"):
+                    yield json.dumps({"table": table, "pkey": pkey, "skey": skey, "value": value}) + "\n"
 
-    if table not in data_store or key not in data_store[table]:
-        return jsonify({"error": "Not found"}), 404
+    return Response(generate(), mimetype="application/x-ndjson")
 
-    # видаляємо локально
-    del data_store[table][key]
 
-    # append у WAL
-    last_offset += 1
-    record = {
-        "offset": last_offset,
-        "table": table,
-        "pkey": pkey,
-        "skey": skey,
-        "value": None,         # None означає видалення
-        "op": "delete"         # додаємо поле операції
-    }
-    append_wal(record)
+@app.route("/migrate/import", methods=["POST"])
+def migrate_import():
+    """
+    Bulk import з /migrate/export через WAL (пачками по MIGRATE_WAL_BATCH).
+    Вже наявні items не перезаписуються — вони записані під час міграції і новіші.
+    """
+    def add(batch, rec):
+        table = rec["table"]
+        if rec.get("op") == "create_table":
+            if not batch.table_exists(table):
+                batch.add({"op": "create_table", "table": table})
+            return False
+        if batch.item_exists(table, (rec["pkey"], rec["skey"])):
+            return False
+        batch.add({"table": table, "pkey": rec["pkey"], "skey": rec["skey"], "value": rec["value"]})
+        return True
 
-    return jsonify({"status": "deleted", "offset": last_offset}), 200
+    lines = [json.loads(line) for line in request.get_data().splitlines() if line]
+    return jsonify({"imported": write_chunks(lines, add)}), 200
 
 
+@app.route("/migrate/purge", methods=["POST"])
+def migrate_purge():
+    """Видаляє (через WAL) items з ranges після того, як вони переїхали на інший shard."""
+    contains = range_filter(request.json["ranges"])
+
+    def add(batch, item):
+        table, (pkey, skey) = item
+        if not batch.item_exists(table, (pkey, skey)):
+            return False
+        batch.add({"table": table, "pkey": pkey, "skey": skey, "value": None, "op": "delete"})
+        return True
+
+    keys = [(table, key) for table, items in list(data_store.items())
+            for key in list(items) if contains(f"{table}:{key[0]}")]
+    return jsonify({"purged": write_chunks(keys, add)}), 200
+
+
+@app.route("/scan/<table>")
+def scan_table(table):
+    """Один сегмент паралельного скану таблиці (NDJSON з курсорами, див. scan.py)."""
+    if table not in data_store:
+        return jsonify({"error": "Table not found"}), 404
+    try:
+        segment, total, after = scan.parse_segment_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    keys = scan.scan_keys(sort_index.get(table, {}), segment, total, after)
+    items = data_store[table]
+    return Response(scan.ndjson_segment(keys, lambda key: compact.get_raw(items, key)), mimetype=scan.NDJSON)
+
+
+@app.route("/offset")
+def offset():
+    """Health check coordinator-а + offset, до якого застосовано всі записи."""
+    return jsonify({"applied_offset": stable_offset()})
+
+
+@app.route("/bloom")
+def bloom_export():
+    """Bloom filter-и всіх таблиць у бінарному форматі bloom.py; If-None-Match → 304, якщо нічого не змінилось."""
+    etag = bloom_filters.etag           # до encode: зміни під час нього дадуть новий ETag наступного разу
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+    return Response(bloom_filters.encode(), mimetype=bloom.BINARY, headers={"ETag": etag})
+
+
+@app.route("/bloom/stats")
+def bloom_stats():
+    return jsonify(bloom_filters.stats())
+
+
+@app.route("/memory")
+def memory():
+    """Скільки пам'яті займає кожна таблиця (STORE_MODE=compact — точний розклад)."""
+    return jsonify(compact.memory_report(data_store))
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.metrics_response()
+
 
 @app.route("/exists/<table>/<pkey>/<skey>")
 def exists(table, pkey, skey):
-    key = (pkey, skey)
-    exists = table in data_store and key in data_store[table]
-    return jsonify({"exists": exists})
+    return jsonify({"exists": store.item_exists(data_store, table, (pkey, skey))})
+
+
+# ===========================
+#   RPC (rpc.py)
+# ===========================
+# Ті самі item-операції через persistent TCP-канал coordinator-а (RPC_ENABLED=1).
+# create/delete чекають durable commit WAL — виконуються в пулі, щоб не тримати з'єднання.
+rpc_server = rpc.RpcServer(
+    {
+        "create": create_item,
+        "delete": delete_item,
+        "read": lambda table_name, partition_key, sort_key:
+            store.read_item(data_store, table_name, (partition_key, sort_key)),
+        "exists": lambda table_name, partition_key, sort_key:
+            ({"exists": store.item_exists(data_store, table_name, (partition_key, sort_key))}, 200),
+    },
+    blocking=("create", "delete"),
+    applied_offset=stable_offset,
+)
 
 
 if __name__ == "__main__":
     load_wal()
-    app.run(host="0.0.0.0", port=PORT)
\ No newline at end of file
+    threading.Thread(target=snapshot_loop, daemon=True).start()
+    threading.Thread(target=manifest_loop, daemon=True).start()
+    threading.Thread(target=compaction_loop, daemon=True).start()
+    if rpc.RPC_ENABLED:
+        rpc_server.start(PORT + rpc.RPC_PORT_OFFSET)
+    app.run(host="0.0.0.0", port=PORT, threaded=True)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Мінімальний S3-сумісний сервер у пам'яті — заміна MinIO для локальних бенчмарків.
+
+    python local_s3.py --port 9100
+    AWS_ENDPOINT_URL=http://127.0.0.1:9100 python leader.py
+
+Підтримує рівно те, чим користуються leader/follower: CreateBucket, PutObject,
+GetObject (з Range), HeadObject, DeleteObject(s), ListObjectsV2 (з пагінацією).
+GET /_stats — лічильники запитів і байтів (бенчмарк рахує з них WAL bytes).
+"""
+import argparse
+import threading
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+objects = {}                    # (bucket, key) -> bytes
+stats = {"puts": 0, "put_bytes": 0, "gets": 0, "get_bytes": 0, "lists": 0, "deletes": 0,
+         "put_bytes_by_prefix": {}}
+lock = threading.Lock()
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def xml_response(body: str, status=200):
+    return Response('<?xml version="1.0" encoding="UTF-8"?>' + body, status, mimetype="application/xml")
+
+
+def no_such_key(key):
+    return xml_response(f"<Error><Code>NoSuchKey</Code><Key>{escape(key)}</Key>"
+                        "<Message>The specified key does not exist.</Message></Error>", 404)
+
+
+def decode_aws_chunked(data: bytes) -> bytes:
+    """Тіло з Content-Encoding: aws-chunked: '<hex size>[;ext]\\r\\n<data>\\r\\n' ... '0\\r\\n<trailers>'."""
+    out, pos = [], 0
+    while True:
+        end = data.index(b"\r\n", pos)
+        size = int(data[pos:end].split(b";", 1)[0], 16)
+        if size == 0:
+            return b"".join(out)
+        out.append(data[end + 2:end + 2 + size])
+        pos = end + 2 + size + 2
+
+
+def parse_range(header: str, length: int):
+    start, _, end = header.removeprefix("bytes=").partition("-")
+    if not start:                               # bytes=-N — останні N байт
+        return max(0, length - int(end)), length
+    return int(start), min(length, int(end) + 1 if end else length)
+
+
+@app.route("/_stats")
+def get_stats():
+    with lock:
+        return jsonify({**stats, "objects": len(objects),
+                        "stored_bytes": sum(len(v) for v in objects.values())})
+
+
+@app.route("/<bucket>", methods=["PUT", "HEAD"])
+def create_bucket(bucket):
+    return Response(status=200)
+
+
+@app.route("/<bucket>", methods=["GET"])
+def list_objects(bucket):
+    prefix = request.args.get("prefix", "")
+    max_keys = int(request.args.get("max-keys", "1000"))
+    after = request.args.get("continuation-token") or request.args.get("start-after", "")
+    with lock:
+        stats["lists"] += 1
+        keys = sorted(k for (b, k) in objects if b == bucket and k.startswith(prefix) and k > after)
+        page = [(k, len(objects[(bucket, k)])) for k in keys[:max_keys]]
+    truncated = len(keys) > max_keys
+    contents = "".join(f"<Contents><Key>{escape(k)}</Key><Size>{size}</Size></Contents>" for k, size in page)
+    token = f"<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>" if truncated else ""
+    return xml_response(
+        f'<ListBucketResult xmlns="{S3_NS}"><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>'
+        f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+        f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>"
+    )
+
+
+@app.route("/<bucket>", methods=["POST"])
+def delete_objects(bucket):
+    root = ElementTree.fromstring(request.get_data())
+    keys = [el.text for el in root.iter() if el.tag.rsplit("}", 1)[-1] == "Key"]
+    with lock:
+        for key in keys:
+            objects.pop((bucket, key), None)
+        stats["deletes"] += len(keys)
+    deleted = "".join(f"<Deleted><Key>{escape(k)}</Key></Deleted>" for k in keys)
+    return xml_response(f'<DeleteResult xmlns="{S3_NS}">{deleted}</DeleteResult>')
+
+
+@app.route("/<bucket>/<path:key>", methods=["PUT"])
+def put_object(bucket, key):
+    body = request.get_data()
+    if "aws-chunked" in request.headers.get("Content-Encoding", ""):
+        body = decode_aws_chunked(body)
+    with lock:
+        objects[(bucket, key)] = body
+        stats["puts"] += 1
+        stats["put_bytes"] += len(body)
+        prefix = key.rsplit("/", 1)[0]
+        stats["put_bytes_by_prefix"][prefix] = stats["put_bytes_by_prefix"].get(prefix, 0) + len(body)
+    return Response(status=200, headers={"ETag": f'"{hash(body) & 0xFFFFFFFF:08x}"'})
+
+
+@app.route("/<bucket>/<path:key>", methods=["GET", "HEAD"])
+def get_object(bucket, key):
+    with lock:
+        data = objects.get((bucket, key))
+    if data is None:
+        return no_such_key(key)
+
+    status, headers = 200, {}
+    if "Range" in request.headers:
+        start, end = parse_range(request.headers["Range"], len(data))
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(data)}"
+        data, status = data[start:end], 206
+    if request.method == "HEAD":
+        return Response(status=status, headers={**headers, "Content-Length": str(len(data))})
+
+    with lock:
+        stats["gets"] += 1
+        stats["get_bytes"] += len(data)
+    return Response(data, status, headers=headers, mimetype="application/octet-stream")
+
+
+@app.route("/<bucket>/<path:key>", methods=["DELETE"])
+def delete_object(bucket, key):
+    with lock:
+        objects.pop((bucket, key), None)
+        stats["deletes"] += 1
+    return Response(status=204)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory S3 stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    app.run(host=args.host, port=args.port, threaded=True)
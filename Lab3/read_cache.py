@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ===========================
+#   COORDINATOR READ CACHE
+# ===========================
+# LRU + TTL кеш відповідей /read, обмежений за пам'яттю.
+#
+# Інвалідація через offset-и лідера: коли запис/видалення проходить через coordinator,
+# лідер повертає offset — ключ видаляється з кешу, а для shard-а запам'ятовується
+# найбільший підтверджений offset. Відповідь репліки кладеться в кеш лише тоді,
+# коли її X-Applied-Offset >= цього offset-а, тож кеш не може «пережити» підтверджений
+# запис навіть якщо читання стартувало до нього або прийшло з відсталого follower-а.
+#
+# Гарячі ключі (hotkeys.py) закріплюються: LRU їх не витісняє, тож скан чи потік холодних
+# ключів не вимиває з кешу саме те, що найбільше навантажує shard. TTL і інвалідація діють як завжди.
+
+ENTRY_OVERHEAD = 200            # приблизна ціна запису OrderedDict + tuple-ів, байт
+
+
+class ReadCache:
+    def __init__(self, max_bytes=64 << 20, ttl=30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()   # key -> (expires_at, size, status, payload, applied_offset)
+        self._bytes = 0
+        self._write_offsets = {}        # shard_id -> найбільший підтверджений offset запису
+        self._pinned = frozenset()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.rejected_stale = 0
+
+    def get(self, key, min_offset=0):
+        """Повертає (status, payload) або None; min_offset — read-your-writes токен клієнта."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[4] < min_offset:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key, status, payload, size, shard_id, applied_offset):
+        """Кладе відповідь у кеш, якщо репліка вже бачила всі підтверджені записи shard-а."""
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if applied_offset is None or applied_offset < self._write_offsets.get(shard_id, 0):
+                self.rejected_stale += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, status, payload, applied_offset)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            # закріплені ключі пропускаємо; якщо лишились лише вони — ліміт тимчасово перевищено
+            old_key = next((key for key in self._entries if key not in self._pinned), None)
+            if old_key is None:
+                return
+            self._drop(old_key)
+            self.evictions += 1
+
+    def pin(self, keys):
+        """Новий набір закріплених ключів (гарячі ключі coordinator-а)."""
+        self._pinned = frozenset(keys)
+
+    def invalidate(self, key, shard_id, offset):
+        """Викликається після підтвердженого create/delete з offset-ом від лідера."""
+        with self._lock:
+            if offset is not None:
+                self._write_offsets[shard_id] = max(self._write_offsets.get(shard_id, 0), offset)
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pinned": sum(key in self._entries for key in self._pinned),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "rejected_stale": self.rejected_stale,
+            }
@@ -0,0 +1,284 @@
+import base64
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from contextlib import closing
+
+from compact import json_with_raw
+
+# ===========================
+#   PARALLEL TABLE SCAN
+# ===========================
+# Повний скан таблиці без знання ключів наперед:
+#   - кожен shard ділить свої партиції на total_segments сегментів (crc32(pkey) % total_segments)
+#     і віддає сегмент як NDJSON у порядку (pkey, skey)
+#   - після кожних SCAN_CHUNK items shard пише рядок {"cursor": [pkey, skey]} — з нього сегмент
+#     можна продовжити (?after=...); кінець сегмента — {"cursor": null}
+#   - coordinator читає всі сегменти всіх shard-ів паралельно і пересилає items клієнту цілими
+#     chunk-ами (без json.loads кожного item-а); після кожного chunk-а — курсор усього скану
+# Пам'ять не залежить від розміру таблиці: shard тримає один chunk і список pkey сегмента,
+# coordinator — обмежену чергу chunk-ів (SCAN_QUEUE_CHUNKS).
+# Скан не є snapshot-ом: записи, зроблені під час скану, можуть потрапити або не потрапити в нього.
+
+SCAN_CHUNK = int(os.getenv("SCAN_CHUNK", "500"))                    # items між курсорами shard-а
+SCAN_SEGMENTS = int(os.getenv("SCAN_SEGMENTS", "4"))                # сегментів на кожен shard
+SCAN_QUEUE_CHUNKS = int(os.getenv("SCAN_QUEUE_CHUNKS", "16"))
+STREAM_READ_BYTES = 64 << 10
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_RETRIES = int(os.getenv("EXPORT_RETRIES", "5"))
+EXPORT_RETRY_DELAY_S = float(os.getenv("EXPORT_RETRY_DELAY_S", "2"))
+
+NDJSON = "application/x-ndjson"
+_CURSOR_PREFIX = b'{"cursor"'
+
+
+class ScanError(Exception):
+    """Shard відмовив у скані (напр. 404 — таблиці немає)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ScanInterrupted(Exception):
+    """Потік сегмента обірвався посеред скану; cursor — звідки продовжити."""
+
+    def __init__(self, cursor: str, error: Exception):
+        super().__init__(f"{type(error).__name__}: {error}")
+        self.cursor = cursor
+        self.error = error
+
+
+# ---------- shard side ----------
+def segment_of(pkey: str, total_segments: int) -> int:
+    return zlib.crc32(pkey.encode()) % total_segments
+
+
+def parse_segment_args(args):
+    """(segment, total_segments, after) з query string /scan; ValueError — некоректні параметри."""
+    total = int(args.get("total_segments", 1))
+    segment = int(args.get("segment", 0))
+    if not 0 <= segment < total:
+        raise ValueError(f"segment must be in [0, {total})")
+    after = json.loads(args["after"]) if "after" in args else None
+    if after is not None and len(after) != 2:
+        raise ValueError("after must be [partition_key, sort_key]")
+    return segment, total, after
+
+
+def scan_keys(partitions: dict, segment=0, total_segments=1, after=None):
+    """(pkey, skey) партицій сегмента за зростанням; after — продовжити після цього ключа."""
+    pkeys = sorted(p for p in list(partitions) if segment_of(p, total_segments) == segment)
+    start = bisect.bisect_left(pkeys, after[0]) if after is not None else 0
+    for pkey in pkeys[start:]:
+        skeys = list(partitions.get(pkey, ()))
+        lo = bisect.bisect_right(skeys, after[1]) if after is not None and pkey == after[0] else 0
+        for skey in skeys[lo:]:
+            yield pkey, skey
+
+
+def ndjson_segment(keys, get_raw, chunk=SCAN_CHUNK):
+    """
+    NDJSON сегмента: get_raw(key) -> JSON bytes значення (None — item-а вже немає).
+    Віддається chunk-ами: chunk items + рядок курсора; останній рядок — {"cursor": null}.
+    """
+    lines, last = [], None
+    for key in keys:
+        raw = get_raw(key)
+        if raw is None:
+            continue
+        lines.append(json_with_raw({"partition_key": key[0], "sort_key": key[1]}, "value", raw))
+        last = key
+        if len(lines) >= chunk:
+            lines.append(json.dumps({"cursor": last}).encode())
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    lines.append(b'{"cursor":null}')
+    yield b"\n".join(lines) + b"\n"
+
+
+# ---------- coordinator side ----------
+def encode_cursor(segments: int, positions: dict, topology=None) -> str:
+    state = json.dumps({"segments": segments, "positions": positions, "topology": topology},
+                       separators=(",", ":"))
+    return base64.urlsafe_b64encode(state.encode()).decode()
+
+
+def decode_cursor(token: str):
+    """(segments, positions, topology) з курсора; ValueError — курсор пошкоджений."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return int(state["segments"]), dict(state["positions"]), state.get("topology")
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid scan cursor: {e}") from e
+
+
+class TableScan:
+    """
+    Паралельний скан потоків {stream_id: after}; open_stream(stream_id, after) -> requests.Response
+    (stream=True). Готові потоки зникають з positions, тож курсор містить лише те, що лишилось.
+    topology (набір shard-ів) записується в курсор: після зміни кільця продовжувати скан не можна.
+    """
+
+    def __init__(self, positions: dict, segments: int, open_stream, topology=None,
+                 queue_chunks=SCAN_QUEUE_CHUNKS):
+        self.positions = dict(positions)
+        self.segments = segments
+        self.topology = topology
+        self.items = 0
+        self._open_stream = open_stream
+        self._queue = queue.Queue(maxsize=queue_chunks)
+        self._stop = threading.Event()
+
+    @property
+    def cursor(self):
+        return encode_cursor(self.segments, self.positions, self.topology) if self.positions else None
+
+    def start(self):
+        """Відкриває всі потоки паралельно; помилка відкриття (напр. 404 таблиці) кидається тут."""
+        opened = {stream_id: Future() for stream_id in self.positions}
+        for stream_id, after in self.positions.items():
+            threading.Thread(target=self._pump, args=(stream_id, after, opened[stream_id]), daemon=True).start()
+        try:
+            for future in opened.values():
+                future.result()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _pump(self, stream_id, after, opened: Future):
+        try:
+            r = self._open_stream(stream_id, after)
+        except Exception as e:
+            opened.set_exception(e)
+            return
+        with closing(r):
+            if r.status_code != 200:
+                try:
+                    message = r.json()["error"]
+                except (ValueError, KeyError, TypeError):
+                    message = r.text
+                opened.set_exception(ScanError(r.status_code, message))
+                return
+            opened.set_result(None)
+            try:
+                lines = []
+                for line in r.iter_lines(chunk_size=STREAM_READ_BYTES):
+                    if not line.startswith(_CURSOR_PREFIX):
+                        if line:
+                            lines.append(line)
+                        continue
+                    position = json.loads(line)["cursor"]
+                    if not self._put((stream_id, lines, position)) or position is None:
+                        return
+                    lines = []
+                raise ScanError(502, f"scan stream {stream_id} ended without a final cursor")
+            except Exception as e:
+                self._put((stream_id, None, e))
+
+    def chunks(self):
+        """(NDJSON bytes items, курсор після них) за мірою надходження; обрив — ScanInterrupted."""
+        try:
+            while self.positions:
+                stream_id, lines, position = self._queue.get()
+                if lines is None:
+                    raise ScanInterrupted(self.cursor, position)
+                if position is None:
+                    del self.positions[stream_id]
+                else:
+                    self.positions[stream_id] = position
+                self.items += len(lines)
+                yield (b"\n".join(lines) + b"\n" if lines else b""), self.cursor
+        finally:
+            self.stop()
+
+
+def ndjson_response(table_scan: TableScan):
+    """Тіло /scan: items, {"cursor": ...} після кожного chunk-а, в кінці {"cursor": null, "count": N}."""
+    try:
+        for data, cursor in table_scan.chunks():
+            yield data + json.dumps({"cursor": cursor}).encode() + b"\n"
+    except ScanInterrupted as e:
+        # клієнт продовжує з e.cursor — уже віддані items не повторяться
+        yield json.dumps({"error": str(e), "cursor": e.cursor}).encode() + b"\n"
+        return
+    yield json.dumps({"cursor": None, "count": table_scan.items}).encode() + b"\n"
+
+
+class ExportJob:
+    """
+    Фоновий експорт таблиці в NDJSON-файл (лише items). Обрив потоку — продовження з курсора
+    (до EXPORT_RETRIES разів); файл з'являється під остаточним ім'ям лише після повного скану.
+    make_scan(cursor) -> TableScan (ще не запущений).
+    """
+
+    def __init__(self, table: str, make_scan, export_dir=EXPORT_DIR):
+        os.makedirs(export_dir, exist_ok=True)
+        self.path = os.path.join(export_dir, f"{table}-{time.strftime('%Y%m%d-%H%M%S')}.ndjson")
+        self._make_scan = make_scan
+        self.status = {"table": table, "state": "running", "path": self.path, "items": 0, "bytes": 0,
+                       "retries": 0, "cursor": None, "error": None,
+                       "started_at": time.time(), "finished_at": None}
+
+    @property
+    def running(self) -> bool:
+        return self.status["state"] == "running"
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            with open(self.path + ".part", "wb") as f:
+                self._export(f)
+            os.replace(self.path + ".part", self.path)
+            self.status["state"] = "done"
+        except Exception as e:
+            self.status.update(state="failed", error=f"{type(e).__name__}: {e}")
+            print(f"[Export] {self.status['table']} failed: {e}")
+        self.status["finished_at"] = time.time()
+
+    def _export(self, f):
+        cursor = None
+        while True:
+            try:
+                table_scan = self._make_scan(cursor).start()
+                for data, cursor in table_scan.chunks():
+                    f.write(data)
+                    self.status["items"] += data.count(b"\n")
+                    self.status["bytes"] += len(data)
+                    self.status["cursor"] = cursor
+                return
+            except ScanError as e:
+                if e.status < 500:
+                    raise
+                error = e
+            except ScanInterrupted as e:
+                cursor, error = e.cursor, e.error
+            except OSError as e:            # shard недоступний на старті (requests.ConnectionError)
+                error = e
+            self.status["retries"] += 1
+            if self.status["retries"] > EXPORT_RETRIES:
+                raise error
+            print(f"[Export] {self.status['table']}: {error}, resuming in {EXPORT_RETRY_DELAY_S}s")
+            time.sleep(EXPORT_RETRY_DELAY_S)
@@ -0,0 +1,130 @@
+import threading
+from contextlib import contextmanager
+
+# ===========================
+#   WRITE SEQUENCER
+# ===========================
+# Єдиний шлях запису лідера:
+#   1. під локом перевіряємо умови запису (таблиця є / item-а ще немає) з урахуванням
+#      записів, які вже отримали offset, але ще не застосовані (pending)
+#   2. там же видаємо offset-и і ставимо записи в чергу WAL — порядок у черзі = порядок offset-ів,
+#      тож сегменти йдуть без перестановок
+#   3. після durable commit батчу записи застосовуються до data_store строго за offset-ом
+#      в одному потоці (commit-потік GroupCommitWriter-а)
+#   4. якщо батч не записано — скасовуються і всі пізніші pending записи (вони могли
+#      спиратися на його записи); їхні клієнти отримують помилку, offset-и лишаються дірою
+# Лок тримається лише на перевірку і постановку в чергу: запити не чекають один на одного
+# під час PUT-у в S3, а кілька батчів можуть писатись паралельно.
+
+
+class WriteBatch:
+    """Записи одного запиту; збирається всередині `with sequencer.batch() as batch`."""
+
+    def __init__(self, sequencer):
+        self._sequencer = sequencer
+        self.records = []
+        self._pending = []
+
+    def table_exists(self, table) -> bool:
+        return self._sequencer._table_exists(table)
+
+    def item_exists(self, table, key) -> bool:
+        return self._sequencer._item_exists(table, key)
+
+    def add(self, record: dict) -> dict:
+        """Видає offset; наступні перевірки (в т.ч. інших запитів) уже бачать цей запис."""
+        return self._sequencer._add(self, record)
+
+    def wait(self):
+        """Чекає durable commit і застосування; кидає помилку WAL, якщо батч не записано."""
+        self._sequencer.writer.wait(self._pending)
+
+
+class Sequencer:
+    def __init__(self, data_store: dict, writer, apply):
+        self.data_store = data_store
+        self.writer = writer            # wal.GroupCommitWriter (enqueue / wait)
+        self.apply = apply              # apply(record) — у commit-потоці, за зростанням offset-ів
+        self.last_offset = 0            # останній виданий offset
+        self.applied_offset = 0         # усі записи <= нього застосовані (або відкинуті)
+        self._lock = threading.Lock()
+        self._records = {}              # offset -> record, ще не застосований
+        self._tables = {}               # table -> к-сть pending create_table
+        self._items = {}                # (table, key) -> [(offset, op), ...] pending записи item-а
+
+    def reset(self, offset: int):
+        """Після recovery: наступний запис отримає offset + 1."""
+        with self._lock:
+            self.last_offset = self.applied_offset = offset
+
+    def pending(self) -> int:
+        return len(self._records)
+
+    @contextmanager
+    def batch(self):
+        batch = WriteBatch(self)
+        with self._lock:
+            try:
+                yield batch
+            except BaseException:
+                self._forget(batch.records)
+                raise
+            if batch.records:
+                batch._pending = self.writer.enqueue(batch.records)
+
+    # ---------- перевірки з урахуванням pending ----------
+    def _table_exists(self, table) -> bool:
+        return table in self.data_store or table in self._tables
+
+    def _item_exists(self, table, key) -> bool:
+        pending = self._items.get((table, key))
+        if pending:
+            return pending[-1][1] != "delete"
+        return key in self.data_store.get(table, ())
+
+    def _add(self, batch, record: dict) -> dict:
+        self.last_offset += 1
+        record = {"offset": self.last_offset, **record}
+        op = record.get("op", "create")
+        if op == "create_table":
+            self._tables[record["table"]] = self._tables.get(record["table"], 0) + 1
+        else:
+            key = (record["table"], (record["pkey"], record["skey"]))
+            self._items.setdefault(key, []).append((record["offset"], op))
+        self._records[record["offset"]] = record
+        batch.records.append(record)
+        return record
+
+    def _forget(self, records):
+        for record in records:
+            self._records.pop(record["offset"], None)
+            if record.get("op") == "create_table":
+                left = self._tables.pop(record["table"]) - 1
+                if left:
+                    self._tables[record["table"]] = left
+            else:
+                key = (record["table"], (record["pkey"], record["skey"]))
+                pending = [p for p in self._items.pop(key) if p[0] != record["offset"]]
+                if pending:
+                    self._items[key] = pending
+
+    # ---------- callbacks GroupCommitWriter-а ----------
+    def on_commit(self, entries: list):
+        """Батч durable: застосовуємо записи за порядком offset-ів."""
+        with self._lock:
+            records = [self._records[offset] for offset, _ in entries if offset in self._records]
+            for record in records:
+                self.apply(record)
+            self._forget(records)
+            self.applied_offset = max(self.applied_offset, entries[-1][0])
+
+    def on_abort(self, offsets: list) -> int:
+        """
+        Батч не записано. Усі записи, що вже отримали offset, могли бути перевірені з урахуванням
+        його записів (create_table → create item, create після delete), тож скасовуються разом з ним.
+        Повертає offset, до якого writer відкидає решту конвеєра; offset-и лишаються дірою в WAL.
+        """
+        with self._lock:
+            self._forget(list(self._records.values()))
+            self.applied_offset = max(self.applied_offset, self.last_offset)
+            return self.last_offset
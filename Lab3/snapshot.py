@@ -0,0 +1,59 @@
+import gzip
+import io
+import json
+
+import compact
+
+# ===========================
+#   SNAPSHOTS
+# ===========================
+# Snapshot — стиснутий NDJSON зі станом data_store на певний offset:
+#   shard_{id}/snapshots/{offset}.ndjson.gz
+# Перший рядок — заголовок {"offset": ..., "tables": [...]},
+# далі по одному рядку на item: {"table", "pkey", "skey", "value"}.
+
+SNAPSHOT_DIGITS = 20
+
+
+def snapshot_key(prefix: str, offset: int) -> str:
+    return f"{prefix}/{offset:0{SNAPSHOT_DIGITS}d}.ndjson.gz"
+
+
+def snapshot_offset(key: str) -> int:
+    name = key.rsplit("/", 1)[-1]
+    return int(name.split(".", 1)[0])
+
+
+def encode_snapshot(offset: int, tables: dict) -> bytes:
+    """Серіалізує копію data_store ({table: {(pkey, skey): value}}) у gzip NDJSON."""
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as f:
+        f.write(json.dumps({"offset": offset, "tables": list(tables)}).encode() + b"\n")
+        for table, items in tables.items():
+            if isinstance(items, compact.CompactTable):
+                # значення вже JSON — вставляємо без json.loads/dumps
+                for (pkey, skey), raw in items.raw_items():
+                    f.write(compact.json_with_raw({"table": table, "pkey": pkey, "skey": skey}, "value", raw) + b"\n")
+                continue
+            for (pkey, skey), value in items.items():
+                f.write(json.dumps(
+                    {"table": table, "pkey": pkey, "skey": skey, "value": value},
+                    separators=(",", ":"),
+                ).encode() + b"\n")
+    return buf.getvalue()
+
+
+def load_snapshot(fileobj, data_store: dict) -> int:
+    """
+    Потоково читає snapshot (file-like, gzip) у data_store.
+    Повертає offset, який покриває snapshot.
+    """
+    with gzip.GzipFile(fileobj=fileobj) as f:
+        header = json.loads(f.readline())
+        for table in header["tables"]:
+            if table not in data_store:
+                data_store[table] = compact.new_table()
+        for line in f:
+            rec = json.loads(line)
+            data_store[rec["table"]][(rec["pkey"], rec["skey"])] = rec["value"]
+    return header["offset"]
@@ -0,0 +1,149 @@
+import bisect
+
+import compact
+
+# ===========================
+#   LOCAL STORE HELPERS
+# ===========================
+# Спільна логіка застосування WAL-записів до data_store
+# для leader (replay), follower (реплікація) та snapshot-ів.
+#
+# sort_index: {table: {pkey: [skey, ...]}} — відсортовані sort key-і кожної партиції,
+# щоб діапазонні запити по партиції не сканували весь shard.
+
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 1000
+
+_MISSING = object()
+
+
+def apply_record(data_store: dict, rec: dict, sort_index: dict = None):
+    """Застосовує один WAL-запис (create_table / create / delete) до data_store."""
+    op = rec.get("op", "create")
+    table = rec.get("table")
+
+    if op == "create_table":
+        get_table(data_store, table)
+
+    # запити читають sort_index і data_store без локу: індекс ніколи не посилається
+    # на ключ, значення якого ще (або вже) немає — спершу значення, потім індекс, і навпаки
+    elif op == "create":
+        key = (rec["pkey"], rec["skey"])
+        items = get_table(data_store, table)
+        new = key not in items
+        items[key] = rec["value"]
+        if sort_index is not None and new:
+            index_add(sort_index, table, rec["pkey"], rec["skey"])
+
+    elif op == "delete":
+        key = (rec["pkey"], rec["skey"])
+        if table in data_store and key in data_store[table]:
+            if sort_index is not None:
+                index_remove(sort_index, table, rec["pkey"], rec["skey"])
+            del data_store[table][key]
+
+
+def read_item(data_store: dict, table: str, key: tuple):
+    """Відповідь read для HTTP і RPC: (body, status); body — JSON bytes з уже збереженим значенням."""
+    raw = compact.get_raw(data_store.get(table, {}), key)
+    if raw is None:
+        return {"error": "Not found"}, 404
+    # у STORE_MODE=compact значення вже JSON — віддаємо bytes без повторної серіалізації
+    return compact.json_with_raw({}, "value", raw), 200
+
+
+def item_exists(data_store: dict, table: str, key: tuple) -> bool:
+    return table in data_store and key in data_store[table]
+
+
+def get_table(data_store: dict, table: str):
+    """Таблиця data_store; створює порожню (dict або CompactTable — за STORE_MODE)."""
+    items = data_store.get(table)
+    if items is None:
+        items = data_store[table] = compact.new_table()
+    return items
+
+
+# ===========================
+#   SORT KEY INDEX
+# ===========================
+def index_add(sort_index: dict, table: str, pkey: str, skey: str):
+    skeys = sort_index.setdefault(table, {}).setdefault(pkey, [])
+    i = bisect.bisect_left(skeys, skey)
+    if i == len(skeys) or skeys[i] != skey:
+        skeys.insert(i, skey)
+
+
+def index_remove(sort_index: dict, table: str, pkey: str, skey: str):
+    partition = sort_index.get(table, {})
+    skeys = partition.get(pkey)
+    if not skeys:
+        return
+    i = bisect.bisect_left(skeys, skey)
+    if i < len(skeys) and skeys[i] == skey:
+        del skeys[i]
+    if not skeys:
+        del partition[pkey]
+
+
+def build_index(data_store: dict) -> dict:
+    """Будує sort_index з нуля (після завантаження snapshot-а)."""
+    sort_index = {}
+    for table, items in data_store.items():
+        partitions = sort_index.setdefault(table, {})
+        for pkey, skey in items:
+            partitions.setdefault(pkey, []).append(skey)
+        for skeys in partitions.values():
+            skeys.sort()
+    return sort_index
+
+
+def _prefix_end(prefix: str) -> str:
+    """Найменший рядок, більший за всі рядки з префіксом prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def query_partition(data_store: dict, sort_index: dict, table: str, pkey: str,
+                    begins_with=None, start=None, end=None,
+                    exclusive_start_key=None, limit=QUERY_DEFAULT_LIMIT):
+    """
+    Діапазонний запит по одній партиції (за зростанням sort key).
+    begins_with — префікс sort key; start/end — межі between (включно);
+    exclusive_start_key — продовжити після цього sort key (пагінація).
+    Повертає (items, last_evaluated_key); last_evaluated_key = None, якщо далі нічого немає.
+    """
+    skeys = sort_index.get(table, {}).get(pkey, [])
+    lo, hi = 0, len(skeys)
+    if begins_with:
+        lo = bisect.bisect_left(skeys, begins_with)
+        hi = bisect.bisect_left(skeys, _prefix_end(begins_with))
+    if start is not None:
+        lo = max(lo, bisect.bisect_left(skeys, start))
+    if end is not None:
+        hi = min(hi, bisect.bisect_right(skeys, end))
+    if exclusive_start_key is not None:
+        lo = max(lo, bisect.bisect_right(skeys, exclusive_start_key))
+
+    limit = max(1, min(limit, QUERY_MAX_LIMIT))
+    page = skeys[lo:min(hi, lo + limit)]
+    # item, видалений після того, як ми взяли сторінку з індексу, просто пропускаємо
+    table_items = data_store.get(table, {})
+    values = [(skey, table_items.get((pkey, skey), _MISSING)) for skey in page]
+    items = [{"sort_key": skey, "value": value} for skey, value in values if value is not _MISSING]
+    last_key = page[-1] if page and lo + len(page) < hi else None
+    return items, last_key
+
+
+def parse_query_args(args) -> dict:
+    """Параметри /query з query string (request.args) → kwargs для query_partition; ValueError — 400."""
+    try:
+        limit = int(args.get("limit", QUERY_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer") from None
+    return {
+        "begins_with": args.get("begins_with"),
+        "start": args.get("start"),
+        "end": args.get("end"),
+        "exclusive_start_key": args.get("exclusive_start_key"),
+        "limit": limit,
+    }
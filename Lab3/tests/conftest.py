@@ -0,0 +1,135 @@
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+# модулі Lab3 імпортуються плоско (import wal), як і в контейнері
+LAB3 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAB3)
+
+
+def load_module(name, filename, **env):
+    """Ще один незалежний екземпляр модуля (напр. другий лідер в одному процесі); env — до імпорту."""
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(LAB3, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def s3_endpoint():
+    """local_s3.py у фоновому потоці — той самий stand-in S3, що й у бенчмарку."""
+    import local_s3
+
+    url, server = serve(local_s3.app)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def leader(s3_endpoint):
+    """Модуль leader.py з WAL у local_s3 (конфіг читається з env під час імпорту)."""
+    os.environ.update(
+        AWS_ENDPOINT_URL=s3_endpoint,
+        AWS_ACCESS_KEY_ID="test",
+        AWS_SECRET_ACCESS_KEY="test",
+        AWS_DEFAULT_REGION="us-east-1",
+        BUCKET="test-bucket",
+        SHARD_ID="1",
+        WAL_FLUSH_INTERVAL_MS="1",
+    )
+    import leader
+
+    leader.load_wal()
+    return leader
+
+
+@pytest.fixture
+def leader_client(leader):
+    return leader.app.test_client()
+
+
+def serve(app):
+    """Flask app на випадковому порту у фоновому потоці; повертає (url, server)."""
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+@pytest.fixture(scope="session")
+def leader_url(leader):
+    url, server = serve(leader.app)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def follower(leader_url):
+    """follower.py, що реплікує leader_url через /stream (потік sync_loop уже запущено)."""
+    os.environ.update(LEADER_URL=leader_url, REPLICATION_SOURCE="leader", RECONNECT_DELAY="0.05")
+    import follower
+
+    threading.Thread(target=follower.sync_loop, daemon=True).start()
+    return follower
+
+
+def wait_until(predicate, timeout=5.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def restart_leader(leader):
+    """Імітує рестарт лідера: скидає стан у пам'яті і відновлює його з S3 через load_wal()."""
+    import wal
+
+    leader.data_store.clear()
+    leader.sort_index.clear()
+    leader.wal_index = wal.WalIndex(tail_max_records=leader.WAL_TAIL_MAX_RECORDS,
+                                    tail_max_bytes=leader.WAL_TAIL_MAX_BYTES)
+    leader.snapshot_offset = 0
+    leader.compaction_marker = None
+    leader.unindexed_segments = []
+    leader.sequencer.reset(0)
+    leader.load_wal()
+
+
+@pytest.fixture(scope="session")
+def leader2(leader):
+    """Лідер другого shard-а (SHARD_ID=2) у тому ж local_s3."""
+    module = load_module("leader_2", "leader.py", SHARD_ID="2")
+    module.load_wal()
+    url, server = serve(module.app)
+    module.url = url
+    yield module
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def coordinator(leader_url, follower, leader2):
+    """coordinator.py над двома shard-ами: 0 — leader + follower, 1 — лише leader2."""
+    follower_url, _ = serve(follower.app)
+    os.environ["SHARDS"] = json.dumps({
+        "0": {"leader": leader_url, "followers": [follower_url]},
+        "1": {"leader": leader2.url, "followers": []},
+    })
+    import coordinator
+
+    return coordinator
+
+
+@pytest.fixture(scope="session")
+def client(coordinator):
+    return coordinator.app.test_client()
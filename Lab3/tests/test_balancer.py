@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+from balancer import BREAKER_FAILURES, CLOSED, HALF_OPEN, OPEN, ReplicaBalancer
+
+DEAD = "http://127.0.0.1:9"
+
+
+class Reply:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens_after_cooldown():
+    balancer = ReplicaBalancer(hedge_delay=0, cooldown=0.05)
+    for _ in range(BREAKER_FAILURES):
+        balancer.record_probe("a", False)
+    assert balancer.stats()["a"]["state"] == OPEN
+    assert all(balancer.pick(["a", "b"]) == "b" for _ in range(20))
+
+    # живий probe до кінця cooldown breaker не закриває
+    balancer.record_probe("a", True, 0.001)
+    assert balancer.stats()["a"]["state"] == OPEN
+    time.sleep(0.06)
+    assert balancer.pick(["a"]) == "a"
+    assert balancer.stats()["a"]["state"] == HALF_OPEN
+    balancer._record("a", False)
+    assert balancer.stats()["a"]["state"] == OPEN
+
+
+def test_call_retries_failed_replica_on_another():
+    balancer = ReplicaBalancer(hedge_delay=0)
+
+    def send(endpoint):
+        if endpoint == "bad":
+            raise requests.ConnectionError("down")
+        return Reply()
+
+    for _ in range(10):
+        endpoint, r = balancer.call(["bad", "good"], send)
+        assert (endpoint, r.status_code) == ("good", 200)
+
+
+def test_call_returns_5xx_when_every_replica_fails():
+    balancer = ReplicaBalancer(hedge_delay=0)
+    endpoint, r = balancer.call(["a", "b"], lambda endpoint: Reply(503))
+    assert r.status_code == 503
+
+
+def test_call_raises_when_every_replica_is_unreachable():
+    balancer = ReplicaBalancer(hedge_delay=0)
+    with pytest.raises(requests.ConnectionError):
+        balancer.call(["a", "b"], lambda endpoint: (_ for _ in ()).throw(requests.ConnectionError("down")))
+
+
+def test_slow_replica_is_hedged():
+    balancer = ReplicaBalancer(hedge_delay=0.01)
+
+    def send(endpoint):
+        if endpoint == "slow":
+            time.sleep(0.3)
+        return Reply()
+
+    start = time.monotonic()
+    results = [balancer.call(["slow", "fast"], send)[0] for _ in range(5)]
+    assert results == ["fast"] * 5
+    assert time.monotonic() - start < 0.3 * 5
+
+
+def test_health_probe_trips_breaker_of_down_replica(client, coordinator, monkeypatch):
+    shard = coordinator.shards[0]
+    monkeypatch.setitem(coordinator.shards, 0, {**shard, "followers": shard["followers"] + [DEAD]})
+    for _ in range(BREAKER_FAILURES):
+        assert coordinator.probe(DEAD) is None
+    assert coordinator.balancer.stats()[DEAD]["state"] == OPEN
+
+    client.post("/register_table", json={"table_name": "breaker"})
+    owned = next(f"p{i}" for i in range(100) if coordinator.route("breaker", f"p{i}")[0] == 0)
+    client.post("/create", json={"table_name": "breaker", "partition_key": owned, "sort_key": "s", "value": {}})
+    requests_before = coordinator.balancer.stats()[DEAD]["requests"]
+    for _ in range(20):
+        assert client.get(f"/read/breaker/{owned}/s").status_code in (200, 404)
+    assert coordinator.balancer.stats()[DEAD]["requests"] == requests_before
+
+    assert coordinator.probe(shard["leader"]) is not None
+    assert coordinator.balancer.stats()[shard["leader"]]["state"] == CLOSED
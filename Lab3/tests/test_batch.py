@@ -0,0 +1,63 @@
+from conftest import wait_until
+
+
+def items(table, n, pkey="p"):
+    return [{"table_name": table, "partition_key": f"{pkey}{i}", "sort_key": "s", "value": {"i": i}} for i in range(n)]
+
+
+def test_batch_write_goes_to_owning_leaders(client, coordinator, leader, leader2):
+    client.post("/register_table", json={"table_name": "batch"})
+    batch = items("batch", 20)
+    results = client.post("/batch_write", json={"items": batch}).json()["results"]
+    assert [res["status"] for res in results] == [201] * 20
+    assert all(res["offset"] > 0 for res in results)
+
+    stores = {0: leader.data_store, 1: leader2.data_store}
+    for item in batch:
+        owner = coordinator.ring.get_node(f"batch:{item['partition_key']}")
+        for shard_id, data_store in stores.items():
+            assert ((item["partition_key"], "s") in data_store["batch"]) == (shard_id == owner)
+
+
+def test_batch_write_reports_status_per_item(client):
+    client.post("/register_table", json={"table_name": "batch_status"})
+    client.post("/batch_write", json={"items": items("batch_status", 1)})
+    r = client.post("/batch_write", json={"items": items("batch_status", 2) + items("no_such_table", 1)})
+    assert [res["status"] for res in r.json()["results"]] == [400, 201, 404]
+
+
+def test_batch_get_keeps_request_order(client, follower, leader):
+    client.post("/register_table", json={"table_name": "batch_get"})
+    client.post("/batch_write", json={"items": items("batch_get", 5)})
+    assert wait_until(lambda: follower.last_offset >= leader.wal_index.last_offset)
+    keys = [{"table_name": "batch_get", "partition_key": f"p{i}", "sort_key": "s"} for i in (4, 9, 0)]
+    results = client.post("/batch_get", json={"keys": keys}).json()["results"]
+    assert [(res["partition_key"], res["found"]) for res in results] == [("p4", True), ("p9", False), ("p0", True)]
+    assert results[0]["value"] == {"i": 4}
+
+
+def test_unavailable_leader_fails_only_its_items(client, coordinator, monkeypatch):
+    monkeypatch.setitem(coordinator.shards, 1, {"leader": "http://127.0.0.1:9", "followers": []})
+    batch = items("batch", 20, pkey="dead")
+    results = client.post("/batch_write", json={"items": batch}).json()["results"]
+    for item, res in zip(batch, results):
+        owner = coordinator.ring.get_node(f"batch:{item['partition_key']}")
+        assert res["status"] == (503 if owner == 1 else 201)
+
+
+def test_batch_write_rejects_keys_still_on_previous_owner(client, coordinator, leader, leader2, monkeypatch):
+    from hashing import ConsistentHashRing
+
+    old, new = ConsistentHashRing(), ConsistentHashRing()
+    old.add_node(0)
+    new.add_node(1)
+    client.post("/register_table", json={"table_name": "moving"})
+    monkeypatch.setattr(coordinator, "ring", old)
+    client.post("/batch_write", json={"items": items("moving", 1)})
+
+    # p0 переїжджає з shard-а 0 на 1 і ще лежить на старому — як і create, дублікат не пишемо
+    monkeypatch.setattr(coordinator.rebalancer, "rings", (old, new))
+    results = client.post("/batch_write", json={"items": items("moving", 2)}).json()["results"]
+    assert [res["status"] for res in results] == [400, 201]
+    assert ("p0", "s") not in leader2.data_store["moving"]
+    assert ("p1", "s") in leader2.data_store["moving"]
@@ -0,0 +1,73 @@
+import argparse
+import random
+from collections import Counter
+
+import boto3
+import pytest
+
+import bench
+import local_s3
+
+
+def s3(endpoint):
+    return boto3.client("s3", endpoint_url=endpoint, region_name="us-east-1",
+                        aws_access_key_id="test", aws_secret_access_key="test")
+
+
+def test_local_s3_put_get_range_and_list_pages(s3_endpoint):
+    client = s3(s3_endpoint)
+    client.create_bucket(Bucket="bench-test")
+    for i in range(5):
+        client.put_object(Bucket="bench-test", Key=f"dir/{i}", Body=f"value-{i}".encode())
+    assert client.get_object(Bucket="bench-test", Key="dir/3")["Body"].read() == b"value-3"
+    assert client.get_object(Bucket="bench-test", Key="dir/3", Range="bytes=6-")["Body"].read() == b"3"
+
+    pages = client.get_paginator("list_objects_v2").paginate(Bucket="bench-test", Prefix="dir/",
+                                                              PaginationConfig={"PageSize": 2})
+    assert [obj["Key"] for page in pages for obj in page["Contents"]] == [f"dir/{i}" for i in range(5)]
+
+    client.delete_object(Bucket="bench-test", Key="dir/0")
+    with pytest.raises(client.exceptions.NoSuchKey):
+        client.get_object(Bucket="bench-test", Key="dir/0")
+
+
+def test_local_s3_decodes_aws_chunked_and_ranges():
+    assert local_s3.decode_aws_chunked(b"3;chunk-signature=x\r\nabc\r\n2\r\nde\r\n0\r\n\r\n") == b"abcde"
+    assert local_s3.parse_range("bytes=2-4", 10) == (2, 5)
+    assert local_s3.parse_range("bytes=-3", 10) == (7, 10)
+
+
+def test_wal_bytes_are_counted_per_prefix(s3_endpoint, leader_client):
+    before = bench.wal_stats(s3_endpoint)
+    leader_client.post("/register_table", json={"table_name": "bench_wal"})
+    after = bench.wal_stats(s3_endpoint)
+    assert after["wal_bytes"] > before["wal_bytes"]
+    assert after["puts"] > before["puts"]
+    assert bench.wal_stats(None) is None
+
+
+def test_catch_up_time_waits_for_followers(coordinator, leader_client):
+    leader_client.post("/register_table", json={"table_name": "bench_lag"})
+    assert bench.catch_up_time(coordinator.shards, timeout=5) is not None
+    dead = {0: {"leader": coordinator.shards[0]["leader"], "followers": ["http://127.0.0.1:9"]}}
+    assert bench.catch_up_time(dead, timeout=0.1) is None
+
+
+def test_zipfian_keys_are_skewed_and_uniform_are_not():
+    rnd = random.Random(1)
+    zipf = Counter(bench.KeyChooser(100, "zipfian", 1.2, seed=1).choose(rnd) for _ in range(5000))
+    uniform = Counter(bench.KeyChooser(100, "uniform", 1.2, seed=1).choose(rnd) for _ in range(5000))
+    assert all(0 <= key < 100 for key in zipf | uniform)
+    assert zipf.most_common(1)[0][1] > 5 * uniform.most_common(1)[0][1]
+
+
+def test_parse_mix():
+    assert bench.parse_mix("read=0.8,create=0.2") == {"read": 0.8, "create": 0.2}
+    with pytest.raises(argparse.ArgumentTypeError):
+        bench.parse_mix("read=1,scan=1")
+
+
+def test_percentiles_in_milliseconds():
+    assert bench.percentiles([]) == {"p50": None, "p95": None, "p99": None, "mean": None}
+    result = bench.percentiles([i / 1000 for i in range(1, 101)])
+    assert (result["p50"], result["p99"]) == (50.0, 99.0)
@@ -0,0 +1,46 @@
+import bloom
+
+
+def test_bloom_etag_is_not_reused_after_restart(leader, leader_client, monkeypatch):
+    leader_client.post("/register_table", json={"table_name": "bloom_etag"})
+    leader_client.get("/bloom")                             # перший encode будує фільтри
+    etag = leader_client.get("/bloom").headers["ETag"]
+    assert leader_client.get("/bloom", headers={"If-None-Match": etag}).status_code == 304
+
+    # новий процес лідера: той самий лічильник version, але інший boot_id
+    restarted = bloom.TableFilters(lambda: list(leader.data_store),
+                                   lambda table: list(leader.data_store.get(table, ())))
+    restarted.version = leader.bloom_filters.version
+    monkeypatch.setattr(leader, "bloom_filters", restarted)
+    r = leader_client.get("/bloom", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert "bloom_etag" in bloom.decode_filters(r.data)
+
+
+def test_coordinator_answers_negatives_locally(client, coordinator, monkeypatch):
+    client.post("/register_table", json={"table_name": "bloom_t"})
+    present = [(f"p{i}", "s") for i in range(20)]
+    for pkey, skey in present:
+        assert client.post("/create", json={"table_name": "bloom_t", "partition_key": pkey, "sort_key": skey,
+                                            "value": {"v": 1}}).status_code == 201
+    bloom.pull(coordinator.bloom_filters, coordinator.bloom_endpoints(), coordinator.fetch_bloom)
+
+    asked = []
+    shard_item = coordinator.shard_item
+    monkeypatch.setattr(coordinator, "shard_item", lambda endpoint, op, *args, **kwargs:
+                        asked.append(op) or shard_item(endpoint, op, *args, **kwargs))
+    misses = [(f"absent{i}", "s") for i in range(50)
+              if not any(coordinator.bloom_filters.might_contain(shard_id, "bloom_t", f"absent{i}", "s")
+                         for shard_id in coordinator.bloom_endpoints())]
+    assert misses
+    negatives = coordinator.bloom_filters.negatives
+    for pkey, skey in misses:
+        assert client.get(f"/exists/bloom_t/{pkey}/{skey}").json() == {"exists": False}
+        assert client.get(f"/read/bloom_t/{pkey}/{skey}").status_code == 404
+    assert coordinator.bloom_filters.negatives >= negatives + 2 * len(misses)
+    assert asked == []                                      # репліки не питали
+
+    for pkey, skey in present:
+        assert client.get(f"/read/bloom_t/{pkey}/{skey}").status_code == 200
+    coordinator.bloom_filters.clear()
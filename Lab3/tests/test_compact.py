@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import compact
+import store
+
+
+def test_compact_table_behaves_like_a_dict():
+    table = compact.CompactTable({("p", "a"): {"x": [1, 2]}})
+    table[("p", "b")] = "v"
+    assert len(table) == 2 and ("p", "a") in table
+    assert table[("p", "a")] == {"x": [1, 2]}
+    assert table.get(("p", "z"), "default") == "default"
+    assert dict(table.items()) == {("p", "a"): {"x": [1, 2]}, ("p", "b"): "v"}
+    assert table.pop(("p", "b")) == "v"
+    assert table.pop(("p", "b"), None) is None
+    with pytest.raises(KeyError):
+        table.pop(("p", "b"))
+    with pytest.raises(KeyError):
+        del table[("p", "b")]
+
+
+def test_values_are_stored_and_served_as_raw_json():
+    table = compact.CompactTable()
+    table[("p", "a")] = {"n": 1}
+    assert table.get_raw(("p", "a")) == b'{"n":1}'
+    assert compact.get_raw({("p", "a"): {"n": 1}}, ("p", "a")) == b'{"n":1}'
+    assert compact.get_raw(table, ("p", "zz")) is None
+    body = compact.json_with_raw({"found": True}, "value", table.get_raw(("p", "a")))
+    assert json.loads(body) == {"found": True, "value": {"n": 1}}
+
+
+def test_partition_keys_are_interned():
+    table = compact.CompactTable()
+    table[("".join(["par", "t"]), "a")] = 1
+    table[("".join(["pa", "rt"]), "b")] = 2
+    first, second = list(table)
+    assert first[0] is second[0]
+    assert table.memory_report()["partitions"] == 1
+
+
+def test_memory_bytes_tracks_puts_overwrites_and_deletes():
+    table = compact.CompactTable()
+    empty = table.memory_bytes()
+    table[("p", "a")] = "x" * 1000
+    grown = table.memory_bytes()
+    assert grown > empty + 1000
+    table[("p", "a")] = "x"
+    assert table.memory_bytes() < grown - 900
+    del table[("p", "a")]
+    # dict не стискається після видалення, але payload-и вже не рахуються
+    assert table.memory_bytes() == table.memory_report()["slot_bytes"]
+
+    copy = compact.CompactTable({("p", str(i)): i for i in range(10)}).copy()
+    assert copy.memory_bytes() == compact.CompactTable({("p", str(i)): i for i in range(10)}).memory_bytes()
+
+
+def test_compact_mode_in_store_and_memory_report(monkeypatch):
+    monkeypatch.setattr(compact, "STORE_MODE", "compact")
+    data_store = {}
+    store.apply_record(data_store, {"op": "create_table", "table": "t"})
+    store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": "s", "value": {"v": 1}})
+    assert isinstance(data_store["t"], compact.CompactTable)
+    assert store.read_item(data_store, "t", ("p", "s")) == (b'{"value":{"v":1}}', 200)
+
+    report = compact.memory_report({**data_store, "plain": {("p", "s"): 1}})
+    assert report["tables"]["t"]["mode"] == "compact"
+    assert report["tables"]["plain"]["mode"] == "dict"
+    assert report["total_bytes"] == sum(t["total_bytes"] for t in report["tables"].values())
@@ -0,0 +1,105 @@
+import json
+import threading
+
+import wal
+from conftest import restart_leader
+
+
+def compact(records, drop_tombstone=lambda offset, deleted_at: False):
+    """compact_segments над одним сирим сегментом; повертає (записи, stats)."""
+    body = b"".join(wal.encode_record(rec) for rec in records)
+    stats = {}
+    out = [json.loads(line) for entries in wal.compact_segments([("seg", 100.0)], lambda key: body,
+                                                               drop_tombstone, stats=stats)
+           for _, line in entries]
+    return out, stats
+
+
+def item(offset, skey, value=None, op="create"):
+    return {"offset": offset, "table": "t", "pkey": "p", "skey": skey, "value": value, "op": op}
+
+
+def test_compaction_keeps_latest_record_per_key():
+    records = [{"offset": 1, "op": "create_table", "table": "t"},
+               item(2, "a", 1), item(3, "b", 1), item(4, "a", op="delete"), item(5, "a", 2)]
+    out, stats = compact(records)
+    assert [rec["offset"] for rec in out] == [1, 3, 5]
+    assert out[-1]["value"] == 2
+    assert stats["superseded"] == 2
+    assert stats["last_offset"] == 5
+
+
+def test_tombstone_kept_until_allowed_and_carries_deleted_at():
+    records = [item(1, "a", 1), item(2, "a", op="delete"), item(3, "b", 1), item(4, "b", op="delete")]
+    snapshot_offset = 2
+    out, stats = compact(records, lambda offset, deleted_at: offset <= snapshot_offset)
+    # tombstone у snapshot-і прибрано, пізніший — лишився з часом commit-у сегмента
+    assert [(rec["offset"], rec.get("deleted_at")) for rec in out] == [(4, 100.0)]
+    assert stats["tombstones"] == 1
+    assert stats["max_dropped_tombstone"] == 2
+
+
+def compacted_records(leader):
+    """Записи стиснених сегментів останньої компакції (tail-буфер індексу ще тримає сирі)."""
+    return [json.loads(line) for key, *_ in leader.compaction_marker["segments"]
+            for line in leader.fetch_segment_range.segment(key).splitlines()]
+
+
+def test_leader_compaction_moves_start_offset(leader, leader_client, monkeypatch):
+    def create(skey, value):
+        return leader_client.post("/create", json={"table_name": "comp_t", "partition_key": "p",
+                                                   "sort_key": skey, "value": value}).get_json()["offset"]
+
+    def delete(skey):
+        return leader_client.delete(f"/delete/comp_t/p/{skey}").get_json()["offset"]
+
+    leader_client.post("/register_table", json={"table_name": "comp_t"})
+    create("k1", 1)
+    delete("k1")
+    k1 = create("k1", 2)
+    create("k2", 1)
+    k2_deleted = delete("k2")
+    assert leader_client.post("/snapshot").status_code == 201
+    create("k3", 1)
+    k3_deleted = delete("k3")           # після snapshot-а — має пережити компакцію
+
+    monkeypatch.setattr(leader, "WAL_COMPACT_TAIL_RECORDS", 0)
+    monkeypatch.setattr(leader, "WAL_TOMBSTONE_RETENTION_S", 0)
+    r = leader_client.post("/wal/compact")
+    assert r.status_code == 200
+    start_offset = r.get_json()["start_offset"]
+    assert k2_deleted < start_offset <= leader.snapshot_offset + 1
+    assert leader.wal_index.start_offset == start_offset
+
+    records = [rec for rec in compacted_records(leader)
+               if rec["table"] == "comp_t" and rec.get("op") != "create_table"]
+    assert [(rec["skey"], rec["offset"]) for rec in records] == [("k1", k1), ("k3", k3_deleted)]
+    assert "deleted_at" in records[-1]
+
+    # читачі з offset-у до start_offset мають спершу завантажити snapshot
+    assert leader_client.get("/fetch?from_offset=1").status_code == 410
+    r = leader_client.get("/stream?from_offset=1")
+    assert r.status_code == 410
+    assert r.get_json()["start_offset"] == start_offset
+
+    expected = {t: dict(items) for t, items in leader.data_store.items()}
+    restart_leader(leader)
+    assert {t: dict(items) for t, items in leader.data_store.items()} == expected
+    assert leader.wal_index.start_offset == start_offset
+
+
+def test_snapshot_and_compaction_are_exclusive(leader, leader_client):
+    leader_client.post("/register_table", json={"table_name": "comp_lock"})
+    leader_client.post("/create", json={"table_name": "comp_lock", "partition_key": "p",
+                                        "sort_key": "s", "value": 1})
+    with leader.maintenance():
+        assert leader_client.post("/snapshot").status_code == 409
+        assert leader_client.post("/wal/compact").status_code == 409
+        # фонові цикли не відмовляють, а чекають своєї черги
+        waiter = threading.Thread(target=leader.take_snapshot)
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert leader_client.post("/snapshot").status_code == 200
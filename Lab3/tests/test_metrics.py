@@ -0,0 +1,39 @@
+import re
+
+import requests
+
+from conftest import wait_until
+
+
+def type_lines(text):
+    return re.findall(r"^# TYPE (\S+)", text, re.M)
+
+
+def test_leader_metrics_have_one_type_line_per_name(leader_client, follower, coordinator):
+    names = type_lines(leader_client.get("/metrics").get_data(as_text=True))
+    assert "table_items" in names
+    assert len(names) == len(set(names))
+
+
+def test_follower_lag_comes_from_the_replication_loop(leader, leader_client, follower, monkeypatch):
+    leader_client.post("/register_table", json={"table_name": "lag"})
+    assert wait_until(lambda: follower.last_offset >= leader.wal_index.last_offset)
+    assert follower.leader_offset >= follower.last_offset
+
+    # scrape не ходить до лідера
+    def no_network(*args, **kwargs):
+        raise AssertionError("scrape must not call the leader")
+
+    monkeypatch.setattr(requests, "get", no_network)
+    text = follower.app.test_client().get("/metrics").get_data(as_text=True)
+    assert f"follower_leader_offset {follower.leader_offset}" in text
+    assert "follower_lag_records 0" in text
+
+
+def test_follower_tracks_leader_offset_ahead_of_applied(follower, monkeypatch):
+    monkeypatch.setattr(follower, "leader_offset", follower.last_offset)
+    follower.observe_leader_offset(str(follower.last_offset + 7))
+    follower.observe_leader_offset(None)
+    follower.observe_leader_offset(1)
+    text = follower.app.test_client().get("/metrics").get_data(as_text=True)
+    assert "follower_lag_records 7" in text
@@ -0,0 +1,73 @@
+import time
+
+from read_cache import ENTRY_OVERHEAD, ReadCache
+
+
+def test_lru_evicts_oldest_within_byte_budget():
+    cache = ReadCache(max_bytes=3 * (ENTRY_OVERHEAD + 10))
+    for key in "abc":
+        cache.put(key, 200, b"x", 10, shard_id=0, applied_offset=0)
+    cache.get("a")
+    cache.put("d", 200, b"x", 10, shard_id=0, applied_offset=0)
+    assert cache.get("b") is None
+    assert cache.get("a") == (200, b"x")
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 3 * (ENTRY_OVERHEAD + 10)
+
+
+def test_pinned_keys_survive_eviction():
+    cache = ReadCache(max_bytes=2 * (ENTRY_OVERHEAD + 10))
+    cache.put("hot", 200, b"x", 10, shard_id=0, applied_offset=0)
+    cache.pin(["hot"])
+    for key in "abcd":
+        cache.put(key, 200, b"x", 10, shard_id=0, applied_offset=0)
+    assert cache.get("hot") is not None
+
+
+def test_ttl_expiry():
+    cache = ReadCache(ttl=0.01)
+    cache.put("a", 200, b"x", 1, shard_id=0, applied_offset=0)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidate_rejects_replies_older_than_acknowledged_write():
+    cache = ReadCache()
+    cache.put("a", 200, b"old", 3, shard_id=0, applied_offset=5)
+    cache.invalidate("a", shard_id=0, offset=7)
+    assert cache.get("a") is None
+
+    # відповідь репліки, яка ще не бачила offset 7, у кеш не потрапляє
+    cache.put("a", 200, b"old", 3, shard_id=0, applied_offset=6)
+    assert cache.get("a") is None
+    cache.put("a", 404, b"{}", 2, shard_id=0, applied_offset=7)
+    assert cache.get("a") == (404, b"{}")
+    # інші shard-и мають свої offset-и
+    cache.put("b", 200, b"x", 1, shard_id=1, applied_offset=1)
+    assert cache.get("b") is not None
+    assert cache.stats()["rejected_stale"] == 1
+
+
+def test_min_offset_bypasses_older_entry():
+    cache = ReadCache()
+    cache.put("a", 200, b"x", 1, shard_id=0, applied_offset=3)
+    assert cache.get("a", min_offset=4) is None
+    assert cache.get("a", min_offset=3) == (200, b"x")
+
+
+def test_coordinator_caches_reads_and_invalidates_on_delete(client, coordinator, leader, leader2):
+    client.post("/register_table", json={"table_name": "cached"})
+    created = client.post("/create", json={"table_name": "cached", "partition_key": "p", "sort_key": "s",
+                                           "value": {"v": 1}}).json()
+    path = "/read/cached/p/s"
+    assert client.get(path, params={"min_offset": created["offset"]}).json()["value"] == {"v": 1}
+    hits = coordinator.cache.stats()["hits"]
+    assert client.get(path).json()["value"] == {"v": 1}
+    assert coordinator.cache.stats()["hits"] == hits + 1
+
+    assert client.delete("/delete/cached/p/s").json()["results"][0]["status"] == 200
+    assert coordinator.cache.get(("cached", "p", "s")) is None
+    owner = {0: leader, 1: leader2}[coordinator.route("cached", "p")[0]]
+    assert client.get(path, params={"min_offset": owner.wal_index.last_offset}).status_code == 404
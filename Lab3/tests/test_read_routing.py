@@ -0,0 +1,36 @@
+import threading
+
+from conftest import load_module, wait_until
+
+
+def test_read_candidates_prefer_caught_up_followers(coordinator, monkeypatch):
+    shard = coordinator.shards[0]
+    follower_url = shard["followers"][0]
+    assert coordinator.read_candidates(0) == [shard["leader"], follower_url]
+
+    monkeypatch.setitem(coordinator.replica_offsets, follower_url, 5)
+    assert coordinator.read_candidates(0, min_offset=5) == [follower_url]
+    # follower ще не застосував offset 6 — читаємо з лідера
+    assert coordinator.read_candidates(0, min_offset=6) == [shard["leader"]]
+
+
+def test_read_with_min_offset_sees_the_write(client, coordinator, follower):
+    client.post("/register_table", json={"table_name": "ryw"})
+    for i in range(5):
+        created = client.post("/create", json={"table_name": "ryw", "partition_key": "p0", "sort_key": f"s{i}",
+                                               "value": {"i": i}}).json()
+        r = client.get(f"/read/ryw/p0/s{i}", params={"min_offset": created["offset"]})
+        assert r.status_code == 200
+        assert r.json()["value"] == {"i": i}
+
+
+def test_handlers_use_state_of_the_served_module(coordinator):
+    # під `python coordinator.py` модуль — __main__; handler-и і фонові потоки мусять бачити один стан
+    served = load_module("coordinator_served", "coordinator.py", HEALTH_CHECK_INTERVAL_S="0.01")
+    threading.Thread(target=served.health_check_loop, daemon=True).start()
+    follower_url = served.shards[0]["followers"][0]
+    assert wait_until(lambda: follower_url in served.replica_offsets)
+
+    served.cache.hits = 4242
+    assert served.app.test_client().get("/cache").json()["hits"] == 4242
+    assert coordinator.cache.stats()["hits"] != 4242
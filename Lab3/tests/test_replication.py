@@ -0,0 +1,46 @@
+from conftest import wait_until
+
+
+def create(client, table, pkey, skey, value):
+    r = client.post("/create", json={"table_name": table, "partition_key": pkey, "sort_key": skey, "value": value})
+    assert r.status_code == 201
+    return r.get_json()["offset"]
+
+
+def test_follower_applies_pushed_records(leader, leader_client, follower):
+    leader_client.post("/register_table", json={"table_name": "repl"})
+    offset = create(leader_client, "repl", "p", "a", {"n": 1})
+    assert wait_until(lambda: follower.last_offset >= offset)
+    assert follower.app.test_client().get("/read/repl/p/a").get_json() == {"value": {"n": 1}}
+
+    leader_client.delete("/delete/repl/p/a")
+    assert wait_until(lambda: follower.last_offset >= leader.wal_index.last_offset)
+    assert follower.app.test_client().get("/read/repl/p/a").status_code == 404
+
+
+def test_stream_starts_at_requested_offset(leader, leader_client, leader_url):
+    import requests
+
+    leader_client.post("/register_table", json={"table_name": "repl_stream"})
+    first = create(leader_client, "repl_stream", "p", "1", 1)
+    create(leader_client, "repl_stream", "p", "2", 2)
+    with requests.get(f"{leader_url}/stream", params={"from_offset": first}, stream=True, timeout=5) as r:
+        assert r.status_code == 200
+        data = b""
+        for chunk in r.iter_content(chunk_size=None):
+            data += chunk
+            if data.count(b"\n") >= 2:
+                break
+    assert data.splitlines()[0].startswith(b'{"offset":%d,' % first)
+
+
+def test_stream_rejects_offsets_before_wal_start(leader, leader_client, monkeypatch):
+    monkeypatch.setattr(leader.wal_index, "start_offset", 5)
+    assert leader_client.get("/stream?from_offset=1").status_code == 410
+
+
+def test_apply_lines_skips_heartbeats_and_already_applied(follower):
+    before = follower.last_offset
+    follower.apply_lines([b"", b'{"offset":%d,"op":"create_table","table":"repl_dup"}' % before])
+    assert follower.last_offset == before
+    assert "repl_dup" not in follower.data_store
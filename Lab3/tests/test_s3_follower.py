@@ -0,0 +1,89 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import LAB3
+
+
+@pytest.fixture
+def s3_follower(leader, leader_url, monkeypatch):
+    """Ще один follower.py з REPLICATION_SOURCE=s3 (потоки реплікації не запущено)."""
+    monkeypatch.setenv("REPLICATION_SOURCE", "s3")
+    monkeypatch.setenv("LEADER_URL", leader_url)
+    monkeypatch.setenv("SHARD_ID", str(leader.SHARD_ID))
+    monkeypatch.setenv("S3_CHUNK_BYTES", "64")          # кілька ranged GET-ів на сегмент
+    spec = importlib.util.spec_from_file_location("follower_s3", os.path.join(LAB3, "follower.py"))
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "follower_s3", module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write(leader_client, table, n):
+    leader_client.post("/register_table", json={"table_name": table})
+    for i in range(n):
+        r = leader_client.post("/create", json={"table_name": table, "partition_key": "p", "sort_key": f"s{i:02d}",
+                                                "value": {"i": i}})
+        assert r.status_code == 201
+
+
+def test_catches_up_from_manifest_segments(leader, leader_client, s3_follower):
+    write(leader_client, "s3_catch_up", 20)
+    leader.publish_manifest()
+
+    manifest = s3_follower.read_manifest()
+    s3_follower.catch_up_from_s3(manifest)
+    assert s3_follower.last_offset == manifest["last_offset"]
+    assert dict(s3_follower.data_store["s3_catch_up"]) == dict(leader.data_store["s3_catch_up"])
+    assert s3_follower.sort_index["s3_catch_up"]["p"] == [f"s{i:02d}" for i in range(20)]
+
+
+def test_tail_past_the_manifest_comes_from_the_leader(leader, leader_client, s3_follower):
+    write(leader_client, "s3_tail", 1)
+    leader.publish_manifest()
+    s3_follower.catch_up_from_s3(s3_follower.read_manifest())
+
+    # ще не в маніфесті — лише в лідера
+    write(leader_client, "s3_tail2", 3)
+    s3_follower.tail_from_leader(time.monotonic() + 0.2)
+    assert s3_follower.last_offset == leader.wal_index.last_offset
+    assert len(s3_follower.data_store["s3_tail2"]) == 3
+
+
+def test_bootstraps_from_s3_snapshot(leader, leader_client, s3_follower):
+    write(leader_client, "s3_snap", 5)
+    assert leader.take_snapshot() is not None
+    manifest = s3_follower.read_manifest()
+    assert manifest["snapshot"]["offset"] == leader.snapshot_offset
+
+    s3_follower.catch_up_from_s3(manifest)
+    assert s3_follower.last_offset >= leader.snapshot_offset
+    assert len(s3_follower.data_store["s3_snap"]) == 5
+
+
+def test_replace_store_never_exposes_a_partial_store(s3_follower):
+    s3_follower.apply_records([{"offset": 1, "op": "create_table", "table": "t"}] +
+                              [{"offset": 2 + i, "table": "t", "pkey": "p", "skey": str(i), "value": i}
+                               for i in range(100)])
+    loaded = {"t": dict(s3_follower.data_store["t"])}
+    stop, misses = threading.Event(), []
+
+    def read():
+        while not stop.is_set():
+            if ("p", "50") not in s3_follower.data_store.get("t", {}):
+                misses.append(1)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(200):
+            s3_follower.replace_store({"t": dict(loaded["t"])}, 101)
+    finally:
+        stop.set()
+        reader.join()
+    assert misses == []
+    assert s3_follower.sort_index["t"]["p"][0] == "0"
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import sequencer as seq
+import store
+import wal
+from conftest import wait_until
+
+
+def pipeline(put_segment, **kwargs):
+    """Sequencer над справжнім GroupCommitWriter-ом: по одному запису на батч."""
+    data_store, discarded = {}, []
+    writer = wal.GroupCommitWriter(
+        put_segment, max_records=1, max_latency=0,
+        on_commit=lambda first, entries: sequencer.on_commit(entries),
+        on_abort=lambda offsets: sequencer.on_abort(offsets),
+        discard_segment=discarded.append, **kwargs,
+    )
+    sequencer = seq.Sequencer(data_store, writer, apply=lambda rec: store.apply_record(data_store, rec))
+    return sequencer, data_store, discarded
+
+
+def write(sequencer, record):
+    with sequencer.batch() as batch:
+        batch.add(record)
+    return batch
+
+
+def test_pending_writes_are_visible_to_checks_and_applied_in_order():
+    sequencer, data_store, _ = pipeline(lambda first, body: None, max_inflight=4)
+    with sequencer.batch() as batch:
+        batch.add({"op": "create_table", "table": "t"})
+        assert batch.table_exists("t")
+        batch.add({"table": "t", "pkey": "p", "skey": "s", "value": 1})
+        assert batch.item_exists("t", ("p", "s"))
+        batch.add({"op": "delete", "table": "t", "pkey": "p", "skey": "s"})
+        assert not batch.item_exists("t", ("p", "s"))
+    batch.wait()
+    assert data_store == {"t": {}}
+    assert (sequencer.last_offset, sequencer.applied_offset, sequencer.pending()) == (3, 3, 0)
+
+
+def test_exception_inside_batch_gives_back_nothing():
+    sequencer, data_store, _ = pipeline(lambda first, body: None)
+    with pytest.raises(RuntimeError):
+        with sequencer.batch() as batch:
+            batch.add({"op": "create_table", "table": "t"})
+            raise RuntimeError("validation failed")
+    assert sequencer.pending() == 0
+    assert not sequencer._table_exists("t")
+
+
+def test_failed_batch_aborts_later_pipelined_batches():
+    gate, written = threading.Event(), {}
+
+    def put_segment(first, body):
+        if first == 1:
+            gate.wait()
+            raise IOError("S3 down")
+        written[first] = body
+
+    sequencer, data_store, discarded = pipeline(put_segment, max_inflight=2)
+    table = write(sequencer, {"op": "create_table", "table": "t"})
+    # item перевірено з урахуванням pending create_table — без нього він не має права застосуватись
+    with sequencer.batch() as item:
+        assert item.table_exists("t")
+        item.add({"table": "t", "pkey": "p", "skey": "s", "value": 1})
+    queued = write(sequencer, {"table": "t", "pkey": "p", "skey": "s2", "value": 2})
+    assert wait_until(lambda: 2 in written)
+
+    gate.set()
+    with pytest.raises(IOError):
+        table.wait()
+    for batch in (item, queued):
+        with pytest.raises(wal.WalAborted):
+            batch.wait()
+    assert data_store == {}
+    assert discarded == [2]             # записаний сегмент скасованого батчу прибрано
+    assert 3 not in written             # а ще не відправлений запис не писався зовсім
+    assert (sequencer.applied_offset, sequencer.pending()) == (3, 0)
+
+    # після скасування leader пише далі; пропущені offset-и — діра в WAL
+    retry = write(sequencer, {"op": "create_table", "table": "t"})
+    retry.wait()
+    assert data_store == {"t": {}}
+    assert sequencer.applied_offset == 4
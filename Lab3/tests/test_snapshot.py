@@ -0,0 +1,59 @@
+import gzip
+import io
+
+import pytest
+
+import snapshot
+import wal
+from conftest import restart_leader
+
+
+def test_snapshot_round_trip():
+    tables = {"t": {("p", "a"): {"x": 1}, ("p", "b"): [1, 2]}, "empty": {}}
+    body = snapshot.encode_snapshot(42, tables)
+    loaded = {}
+    assert snapshot.load_snapshot(io.BytesIO(body), loaded) == 42
+    assert {name: dict(items) for name, items in loaded.items()} == tables
+
+
+def test_snapshot_key_carries_offset():
+    key = snapshot.snapshot_key("shard_1/snapshots", 17)
+    assert snapshot.snapshot_offset(key) == 17
+    assert key < snapshot.snapshot_key("shard_1/snapshots", 100)
+
+
+def test_truncated_snapshot_is_rejected():
+    body = snapshot.encode_snapshot(1, {"t": {("p", str(i)): i for i in range(100)}})
+    with pytest.raises((EOFError, OSError, gzip.BadGzipFile, ValueError)):
+        snapshot.load_snapshot(io.BytesIO(body[: len(body) // 2]), {})
+
+
+def test_restart_replays_only_wal_after_snapshot(leader, leader_client):
+    leader_client.post("/register_table", json={"table_name": "snap"})
+    for i in range(5):
+        leader_client.post("/create", json={"table_name": "snap", "partition_key": "p", "sort_key": str(i), "value": i})
+    r = leader_client.post("/snapshot")
+    assert r.status_code == 201
+    snap_offset = r.get_json()["offset"]
+    leader_client.post("/create", json={"table_name": "snap", "partition_key": "p", "sort_key": "after", "value": 5})
+    leader_client.delete("/delete/snap/p/0")
+    expected = {t: dict(items) for t, items in leader.data_store.items()}
+    total_segments = len(wal.list_segments(leader.s3, leader.BUCKET, leader.WAL_PREFIX))
+
+    restart_leader(leader)
+
+    assert {t: dict(items) for t, items in leader.data_store.items()} == expected
+    assert leader.snapshot_offset == snap_offset
+    assert leader.recovery_status["segments_total"] < total_segments
+    # snapshot не пересоздається без нових записів
+    assert leader_client.post("/snapshot").status_code in (200, 201)
+
+
+def test_get_snapshot_streams_latest(leader, leader_client):
+    leader_client.post("/register_table", json={"table_name": "snap_get"})
+    leader_client.post("/snapshot")
+    r = leader_client.get("/snapshot")
+    assert r.status_code == 200
+    loaded = {}
+    assert snapshot.load_snapshot(io.BytesIO(r.data), loaded) == int(r.headers["X-Snapshot-Offset"])
+    assert "snap_get" in loaded
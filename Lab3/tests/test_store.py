@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import store
+from conftest import wait_until
+
+
+def make_partition(skeys):
+    data_store, sort_index = {}, {}
+    store.apply_record(data_store, {"op": "create_table", "table": "t"}, sort_index)
+    for skey in skeys:
+        store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": skey, "value": skey.upper()}, sort_index)
+    return data_store, sort_index
+
+
+def query(data_store, sort_index, **kwargs):
+    items, last_key = store.query_partition(data_store, sort_index, "t", "p", **kwargs)
+    return [item["sort_key"] for item in items], last_key
+
+
+def test_query_ranges_and_pagination():
+    data_store, sort_index = make_partition(["b2", "a1", "b1", "c1", "b3"])
+    assert query(data_store, sort_index, begins_with="b") == (["b1", "b2", "b3"], None)
+    assert query(data_store, sort_index, start="a5", end="b2") == (["b1", "b2"], None)
+    assert query(data_store, sort_index, limit=2) == (["a1", "b1"], "b1")
+    assert query(data_store, sort_index, limit=2, exclusive_start_key="b1") == (["b2", "b3"], "b3")
+    assert query(data_store, sort_index, exclusive_start_key="b3") == (["c1"], None)
+
+
+def test_delete_and_recreate_keep_index_consistent():
+    data_store, sort_index = make_partition(["a", "b"])
+    store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": "a", "op": "delete"}, sort_index)
+    store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": "a", "op": "delete"}, sort_index)
+    store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": "b", "value": 2}, sort_index)
+    assert sort_index["t"]["p"] == ["b"]
+    assert query(data_store, sort_index) == (["b"], None)
+
+
+def test_query_skips_item_deleted_after_index_read():
+    data_store, sort_index = make_partition(["a", "b", "c"])
+    del data_store["t"][("p", "b")]         # вікно між читанням індексу і значення
+    assert query(data_store, sort_index) == (["a", "c"], None)
+    assert store.query_partition(data_store, sort_index, "missing", "p") == ([], None)
+
+
+def test_concurrent_writes_never_break_queries():
+    data_store, sort_index = make_partition([])
+    errors, done = [], threading.Event()
+
+    def writer():
+        for i in range(3000):
+            skey = f"k{i % 50:02d}"
+            op = "delete" if i % 2 else "create"
+            store.apply_record(data_store, {"table": "t", "pkey": "p", "skey": skey, "value": i, "op": op}, sort_index)
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            try:
+                store.query_partition(data_store, sort_index, "t", "p", limit=1000)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_leader_query_endpoint(leader_client):
+    leader_client.post("/register_table", json={"table_name": "query_t"})
+    for skey in ("x1", "x2", "y1"):
+        leader_client.post("/create", json={"table_name": "query_t", "partition_key": "p", "sort_key": skey, "value": 1})
+    body = leader_client.get("/query/query_t/p?begins_with=x&limit=1").get_json()
+    assert [item["sort_key"] for item in body["items"]] == ["x1"]
+    assert body["last_evaluated_key"] == "x1"
+    assert leader_client.get("/query/missing_table/p").status_code == 404
+
+
+def test_non_numeric_limit_is_400(leader_client, follower):
+    leader_client.post("/register_table", json={"table_name": "query_t"})
+    assert leader_client.get("/query/query_t/p?limit=ten").status_code == 400
+    assert wait_until(lambda: "query_t" in follower.data_store)
+    assert follower.app.test_client().get("/query/query_t/p?limit=ten").status_code == 400
+    with pytest.raises(ValueError):
+        store.parse_query_args({"limit": "ten"})
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+import wal
+
+
+def collect_writer(**kwargs):
+    """GroupCommitWriter, що пише сегменти в dict; commits — [(first_offset, offsets)] у порядку on_commit."""
+    segments, commits, aborts = {}, [], []
+    writer = wal.GroupCommitWriter(
+        lambda first, body: segments.__setitem__(first, body),
+        on_commit=lambda first, entries: commits.append((first, [o for o, _ in entries])),
+        on_abort=aborts.append,
+        **kwargs,
+    )
+    return writer, segments, commits, aborts
+
+
+def test_segment_keys_sort_by_offset():
+    keys = [wal.segment_key("shard_1/wal", offset) for offset in (10, 2, 100)]
+    assert sorted(keys) == [wal.segment_key("shard_1/wal", o) for o in (2, 10, 100)]
+    assert wal.segment_first_offset(keys[0]) == 10
+
+
+def test_group_commit_batches_concurrent_appends():
+    writer, segments, commits, _ = collect_writer(max_records=100, max_latency=0.05)
+    threads = [threading.Thread(target=writer.append, args=({"offset": i, "table": "t"},)) for i in range(1, 21)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # усі 20 записів durable, і їх менше сегментів, ніж записів
+    assert sorted(o for _, offsets in commits for o in offsets) == list(range(1, 21))
+    assert len(segments) < 20
+    for first, body in segments.items():
+        lines = body.splitlines()
+        assert wal.segment_first_offset(wal.segment_key("p", first)) == first
+        assert all(line.startswith(b'{"offset":') for line in lines)
+
+
+def test_batch_splits_on_max_records():
+    writer, segments, commits, _ = collect_writer(max_records=3, max_latency=0.01)
+    writer.append_many([{"offset": i} for i in range(1, 8)])
+    assert [offsets for _, offsets in commits] == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_failed_put_raises_and_aborts():
+    def put_segment(first, body):
+        raise IOError("S3 down")
+
+    aborts = []
+    writer = wal.GroupCommitWriter(put_segment, on_abort=aborts.append, max_latency=0.001)
+    with pytest.raises(IOError):
+        writer.append({"offset": 1})
+    assert aborts == [[1]]
+
+
+def test_leader_acks_after_durable_segment(leader, leader_client):
+    assert leader_client.post("/register_table", json={"table_name": "wal_t"}).status_code == 201
+    r = leader_client.post("/create", json={"table_name": "wal_t", "partition_key": "p",
+                                            "sort_key": "s", "value": {"v": 1}})
+    assert r.status_code == 201
+    offset = r.get_json()["offset"]
+    keys = wal.list_segments(leader.s3, leader.BUCKET, leader.WAL_PREFIX)
+    assert any(wal.segment_first_offset(k) <= offset for k in keys)
+    assert leader_client.get("/read/wal_t/p/s").get_json() == {"value": {"v": 1}}
+
+
+def test_leader_returns_503_when_wal_write_fails(leader, leader_client, monkeypatch):
+    leader_client.post("/register_table", json={"table_name": "wal_fail"})
+
+    def put_segment(first, body):
+        raise IOError("S3 down")
+
+    monkeypatch.setattr(leader.wal_writer, "put_segment", put_segment)
+    r = leader_client.post("/create", json={"table_name": "wal_fail", "partition_key": "p",
+                                            "sort_key": "s", "value": 1})
+    assert r.status_code == 503
+    monkeypatch.undo()
+    # невдалий запис не застосовано — ключ можна створити знову
+    assert leader_client.get("/read/wal_fail/p/s").status_code == 404
+    assert leader_client.post("/create", json={"table_name": "wal_fail", "partition_key": "p",
+                                               "sort_key": "s", "value": 1}).status_code == 201
@@ -0,0 +1,81 @@
+import wal
+
+
+def entries(first, last):
+    return [(o, wal.encode_record({"offset": o, "table": "t", "pkey": "p", "skey": str(o)})) for o in range(first, last + 1)]
+
+
+def build_index(tail_max_records=3):
+    """Індекс з двома сегментами (1-5, 6-10) і сховищем сегментів для fetch_range."""
+    index = wal.WalIndex(tail_max_records=tail_max_records)
+    bodies, reads = {}, []
+    for first, last in ((1, 5), (6, 10)):
+        seg = entries(first, last)
+        key = wal.segment_key("p", first)
+        bodies[key] = b"".join(line for _, line in seg)
+        index.add_segment(key, seg)
+
+    def fetch_range(key, start, end):
+        reads.append((key, start, end))
+        return bodies[key][start:end]
+
+    return index, fetch_range, reads
+
+
+def offsets(lines):
+    return [int(line.split(b",")[0].split(b":")[1]) for line in lines]
+
+
+def test_recent_records_come_from_tail_without_s3():
+    index, fetch_range, reads = build_index()
+    lines, next_offset = index.read(8, fetch_range)
+    assert offsets(lines) == [8, 9, 10]
+    assert next_offset == 11
+    assert reads == []
+
+
+def test_older_records_use_ranged_reads_of_one_segment():
+    index, fetch_range, reads = build_index()
+    lines, next_offset = index.read(3, fetch_range, limit=2)
+    assert offsets(lines) == [3, 4]
+    assert next_offset == 5
+    assert len(reads) == 1 and reads[0][0] == wal.segment_key("p", 1)
+
+
+def test_read_pages_across_segments_into_tail():
+    index, fetch_range, _ = build_index()
+    cursor, seen = 1, []
+    while cursor <= index.last_offset:
+        lines, cursor = index.read(cursor, fetch_range, limit=4)
+        seen += offsets(lines)
+    assert seen == list(range(1, 11))
+
+
+def test_max_bytes_limits_response():
+    index, fetch_range, _ = build_index()
+    size = len(entries(1, 1)[0][1])
+    lines, _ = index.read(1, fetch_range, max_bytes=2 * size)
+    assert offsets(lines) == [1, 2]
+
+
+def test_read_past_end_is_empty():
+    index, fetch_range, _ = build_index()
+    assert index.read(11, fetch_range) == ([], 11)
+
+
+def test_fetch_endpoint_paginates_and_rejects_truncated_offsets(leader, leader_client, monkeypatch):
+    leader_client.post("/register_table", json={"table_name": "fetch_t"})
+    for i in range(3):
+        leader_client.post("/create", json={"table_name": "fetch_t", "partition_key": "p",
+                                            "sort_key": str(i), "value": i})
+    last = leader.wal_index.last_offset
+    body = leader_client.get(f"/fetch?from_offset={last - 2}&limit=2").get_json()
+    assert [rec["offset"] for rec in body["records"]] == [last - 2, last - 1]
+    assert body["next_offset"] == last
+    assert body["last_offset"] == last
+
+    # offset-и до start_offset є лише в snapshot-і
+    monkeypatch.setattr(leader.wal_index, "start_offset", last)
+    r = leader_client.get(f"/fetch?from_offset={last - 1}")
+    assert r.status_code == 410
+    assert r.get_json()["start_offset"] == last
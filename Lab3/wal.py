@@ -0,0 +1,588 @@
+import bisect
+import json
+import queue
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ===========================
+#   WAL SEGMENTS
+# ===========================
+# WAL — це набір незмінних сегментів у S3: shard_{id}/wal/{first_offset}.jsonl
+# Кожен сегмент — одна група записів (group commit), назва = offset першого запису,
+# тому лексикографічний порядок ключів збігається з порядком offset-ів.
+# Після компакції префікс WAL — це стиснені (zlib) сегменти {first_offset}.g{generation}.jsonl.z;
+# які з них живі, визначає маркер компакції (див. COMPACTION нижче).
+
+SEGMENT_DIGITS = 20
+COMPRESSED_SUFFIX = ".jsonl.z"
+
+
+def segment_key(prefix: str, first_offset: int) -> str:
+    return f"{prefix}/{first_offset:0{SEGMENT_DIGITS}d}.jsonl"
+
+
+def compacted_key(prefix: str, first_offset: int, generation: int) -> str:
+    return f"{prefix}/{first_offset:0{SEGMENT_DIGITS}d}.g{generation}{COMPRESSED_SUFFIX}"
+
+
+def is_compressed(key: str) -> bool:
+    return key.endswith(COMPRESSED_SUFFIX)
+
+
+def compress_segment(body: bytes, level=6) -> bytes:
+    return zlib.compress(body, level)
+
+
+def decode_segment(key: str, data: bytes) -> bytes:
+    """Вміст сегмента як JSON lines: стиснені сегменти розпаковуються."""
+    return zlib.decompress(data) if is_compressed(key) else data
+
+
+def segment_first_offset(key: str) -> int:
+    name = key.rsplit("/", 1)[-1]
+    return int(name.split(".", 1)[0])
+
+
+def list_segments(s3, bucket: str, prefix: str, with_sizes=False) -> list:
+    """
+    Повертає відсортований список ключів сегментів (з пагінацією list_objects_v2);
+    with_sizes=True — [(key, розмір об'єкта)].
+    """
+    objects = []
+    kwargs = {"Bucket": bucket, "Prefix": prefix + "/"}
+    while True:
+        resp = s3.list_objects_v2(**kwargs)
+        for obj in resp.get("Contents", []):
+            objects.append((obj["Key"], obj.get("Size", 0)))
+        if not resp.get("IsTruncated"):
+            break
+        kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+    objects.sort(key=lambda obj: segment_first_offset(obj[0]))
+    return objects if with_sizes else [key for key, _ in objects]
+
+
+def manifest_key(prefix: str) -> str:
+    """Маніфест лежить поруч із сегментами, а не серед них (list_segments його не бачить)."""
+    return f"{prefix}-manifest.json"
+
+
+def compaction_key(prefix: str) -> str:
+    """Маркер останньої компакції: стиснені сегменти префікса і horizon, до якого вони все покривають."""
+    return f"{prefix}-compaction.json"
+
+
+def live_segments(keys: list, marker) -> tuple:
+    """
+    (живі ключі за порядком, сміття) з повного списку сегментів і маркера компакції:
+    стиснені сегменти маркера + сирі сегменти після його horizon. Решта — джерела вже
+    закомічених компакцій або недописаний результат перерваної (видаляються пізніше).
+    """
+    if marker is None:
+        return [k for k in keys if not is_compressed(k)], [k for k in keys if is_compressed(k)]
+    compacted = [segment[0] for segment in marker["segments"]]
+    referenced = set(compacted)
+    raw = [k for k in keys if not is_compressed(k) and segment_first_offset(k) > marker["horizon"]]
+    garbage = [k for k in keys if k not in referenced and k not in raw]
+    return compacted + raw, garbage
+
+
+class SegmentReader:
+    """
+    fetch_range(key, start, end) для WalIndex.read і read_segment_chunks.
+    Сирий сегмент читається ranged GET-ом; стиснений — цілим (позиції в індексі рахуються
+    в розпакованих байтах), розпаковується і тримається в невеликому LRU.
+    """
+
+    def __init__(self, get_range, get_object, cache_segments=4):
+        self._get_range = get_range             # get_range(key, start, end) -> bytes
+        self._get_object = get_object           # get_object(key) -> bytes
+        self._cache = OrderedDict()
+        self._cache_segments = cache_segments
+        self._lock = threading.Lock()
+
+    def segment(self, key: str) -> bytes:
+        """Увесь сегмент як JSON lines."""
+        if not is_compressed(key):
+            return self._get_object(key)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                return body
+        body = decode_segment(key, self._get_object(key))
+        with self._lock:
+            self._cache[key] = body
+            while len(self._cache) > self._cache_segments:
+                self._cache.popitem(last=False)
+        return body
+
+    def __call__(self, key: str, start: int, end: int) -> bytes:
+        if is_compressed(key):
+            return self.segment(key)[start:end]
+        return self._get_range(key, start, end)
+
+
+def read_segment_chunks(fetch_range, key: str, size: int, chunk_bytes=1 << 20):
+    """
+    Читає сегмент ranged GET-ами по chunk_bytes і віддає списки цілих рядків;
+    рядок, розрізаний межею шматка, переноситься в наступний.
+    """
+    carry = b""
+    for start in range(0, size, chunk_bytes):
+        lines = (carry + fetch_range(key, start, min(size, start + chunk_bytes))).splitlines(keepends=True)
+        carry = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        if lines:
+            yield lines
+    if carry:
+        yield [carry]
+
+
+def fetch_parallel(fetch_range, fetch_segment, segments: list, chunk_bytes=4 << 20, workers=8,
+                   max_buffered_bytes=64 << 20):
+    """
+    Потокове читання сегментів [(key, розмір об'єкта)] для recovery: сирі сегменти ріжуться на
+    ranged GET-и по chunk_bytes, стиснені читаються цілими (fetch_segment розпаковує).
+    До workers запитів ідуть одночасно, але віддається все строго в порядку WAL:
+    (key, цілі рядки, кінець сегмента?, прочитано байт з S3). Завантаженого, але ще не відданого
+    не більше max_buffered_bytes (для стиснених рахується стиснений розмір).
+    """
+    tasks = []
+    for key, size in segments:
+        if is_compressed(key) or size <= chunk_bytes:
+            tasks.append((key, None, None, size, True))
+        else:
+            for start in range(0, size, chunk_bytes):
+                end = min(size, start + chunk_bytes)
+                tasks.append((key, start, end, end - start, end == size))
+
+    def _fetch(key, start, end):
+        return fetch_segment(key) if start is None else fetch_range(key, start, end)
+
+    pending, buffered, carry = deque(), 0, b""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wal-recovery") as pool:
+        tasks = iter(tasks)
+        task = next(tasks, None)
+        try:
+            while task is not None or pending:
+                # дозавантажуємо наперед, поки вміщаємось у буфер (хоча б один запит — завжди)
+                while task is not None and (not pending or buffered + task[3] <= max_buffered_bytes):
+                    key, start, end, size, last = task
+                    pending.append((key, size, last, pool.submit(_fetch, key, start, end)))
+                    buffered += size
+                    task = next(tasks, None)
+                key, size, last, future = pending.popleft()
+                data = future.result()
+                buffered -= size
+                lines = (carry + data).splitlines(keepends=True)
+                carry = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+                if last and carry:
+                    lines.append(carry)
+                    carry = b""
+                yield key, lines, last, size
+        finally:
+            for *_, future in pending:
+                future.cancel()
+
+
+def encode_record(record: dict) -> bytes:
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+
+# ===========================
+#   COMPACTION
+# ===========================
+def record_key(rec: dict) -> tuple:
+    """Ключ, за яким записи перекривають один одного: item або create_table."""
+    if rec.get("op") == "create_table":
+        return (rec["table"],)
+    return rec["table"], rec["pkey"], rec["skey"]
+
+
+def compact_segments(sources: list, read_segment, drop_tombstone, max_segment_bytes=4 << 20, stats=None):
+    """
+    Log compaction префікса WAL: з кожного ключа лишається лише останній запис, тож replay
+    з будь-якого offset-у приходить до того самого стану. Tombstone (op=delete) лишається, поки
+    drop_tombstone(offset, deleted_at) не дозволить його прибрати; у стиснених сегментах він
+    несе deleted_at — час commit-у, від якого рахується retention.
+    sources — [(key, committed_at)] за порядком offset-ів; read_segment(key) -> JSON lines.
+    Два проходи (спершу останній offset кожного ключа), тож у пам'яті — лише ключі й один сегмент.
+    Генерує списки [(offset, line)] розміром до max_segment_bytes.
+    """
+    stats = {} if stats is None else stats
+    stats.update(records=0, superseded=0, tombstones=0, max_dropped_tombstone=0, last_offset=0)
+
+    latest = {}
+    for key, _ in sources:
+        for line in read_segment(key).splitlines():
+            rec = json.loads(line)
+            latest[record_key(rec)] = rec["offset"]
+
+    out, size = [], 0
+    for key, committed_at in sources:
+        for line in read_segment(key).splitlines(keepends=True):
+            rec = json.loads(line)
+            stats["records"] += 1
+            stats["last_offset"] = max(stats["last_offset"], rec["offset"])
+            if latest[record_key(rec)] != rec["offset"]:
+                stats["superseded"] += 1
+                continue
+            if rec.get("op") == "delete":
+                deleted_at = rec.get("deleted_at", committed_at)
+                if drop_tombstone(rec["offset"], deleted_at):
+                    stats["tombstones"] += 1
+                    stats["max_dropped_tombstone"] = max(stats["max_dropped_tombstone"], rec["offset"])
+                    continue
+                if "deleted_at" not in rec:
+                    line = encode_record({**rec, "deleted_at": deleted_at})
+            if out and size + len(line) > max_segment_bytes:
+                yield out
+                out, size = [], 0
+            out.append((rec["offset"], line))
+            size += len(line)
+    if out:
+        yield out
+
+
+# ===========================
+#   GROUP COMMIT WRITER
+# ===========================
+class WalAborted(Exception):
+    """Батч не підтверджено, бо раніший батч конвеєра не став durable."""
+
+
+class _Pending:
+    __slots__ = ("offset", "line", "done", "error")
+
+    def __init__(self, offset: int, line: bytes):
+        self.offset = offset
+        self.line = line
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitWriter:
+    """
+    Фоновий writer, який збирає записи від паралельних запитів у батч
+    і записує його одним PUT як новий сегмент.
+
+    Батч скидається, коли набирається max_records / max_bytes
+    або минає max_latency секунд від першого запису в батчі.
+    append() повертається лише після того, як батч став durable.
+
+    max_inflight > 1 — конвеєр: наступний батч пишеться, поки попередній ще в PUT-і,
+    але on_commit / on_abort викликаються строго в порядку батчів (в одному потоці).
+    Записи пізніших батчів могли бути перевірені з урахуванням невдалого (create_table →
+    create item), тож on_abort повертає offset, до якого скасовується все: батчі в PUT-і
+    (записаний сегмент прибирається discard_segment-ом) і ще не відправлені записи черги.
+    """
+
+    def __init__(self, put_segment, max_records=256, max_bytes=1 << 20, max_latency=0.005,
+                 on_commit=None, on_abort=None, max_inflight=1, discard_segment=None):
+        self.put_segment = put_segment      # put_segment(first_offset, body: bytes)
+        self.on_commit = on_commit          # on_commit(first_offset, [(offset, line), ...])
+        self.on_abort = on_abort            # on_abort([offset, ...]) -> скасувати до offset-а (або None)
+        self.discard_segment = discard_segment  # discard_segment(first_offset) — сегмент скасованого батчу
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_inflight)
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight)
+        self._committing = queue.Queue()    # (batch, future) у порядку постановки
+        self._aborted_through = 0           # записи з offset <= нього скасовано разом з невдалим батчем
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._commit_loop, daemon=True).start()
+
+    def append(self, record: dict):
+        """Записує один record у WAL і чекає, поки батч буде збережено."""
+        self.append_many([record])
+
+    def append_many(self, records: list):
+        """Записує кілька records (потрапляють в один або кілька батчів)."""
+        self.wait(self.enqueue(records))
+
+    def enqueue(self, records: list) -> list:
+        """Ставить records у чергу без очікування; порядок у черзі = порядок у сегментах."""
+        pending = [_Pending(rec["offset"], encode_record(rec)) for rec in records]
+        with self._cond:
+            for p in pending:
+                self._queue.append(p)
+                self._queued_bytes += len(p.line)
+            self._cond.notify_all()
+        return pending
+
+    @staticmethod
+    def wait(pending: list):
+        for p in pending:
+            p.done.wait()
+            if p.error is not None:
+                raise p.error
+
+    def _take_batch(self) -> list:
+        batch, size = [], 0
+        while self._queue and len(batch) < self.max_records:
+            p = self._queue[0]
+            if batch and size + len(p.line) > self.max_bytes:
+                break
+            self._queue.popleft()
+            batch.append(p)
+            size += len(p.line)
+        self._queued_bytes -= size
+        return batch
+
+    def _run(self):
+        while True:
+            self._slots.acquire()           # не більше max_inflight PUT-ів одночасно
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+
+                # чекаємо, поки батч наповниться, але не довше max_latency
+                deadline = time.monotonic() + self.max_latency
+                while (len(self._queue) < self.max_records
+                       and self._queued_bytes < self.max_bytes):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._take_batch()
+
+            batch.sort(key=lambda p: p.offset)
+            future = self._pool.submit(self.put_segment, batch[0].offset, b"".join(p.line for p in batch))
+            self._committing.put((batch, future))
+
+    def _commit_loop(self):
+        """Підтверджує батчі в порядку offset-ів, навіть якщо PUT-и завершились в іншому порядку."""
+        while True:
+            batch, future = self._committing.get()
+            error = future.exception()
+            if batch[0].offset <= self._aborted_through:
+                # батч уже скасовано разом з попереднім: навіть записаний, він не підтверджується
+                if error is None:
+                    self._discard(batch[0].offset)
+                error = WalAborted(f"earlier WAL batch failed, offsets <= {self._aborted_through} aborted")
+            elif error is not None:
+                self._abort(batch)
+            else:
+                try:
+                    if self.on_commit is not None:
+                        self.on_commit(batch[0].offset, [(p.offset, p.line) for p in batch])
+                except Exception as e:
+                    error = e
+            self._slots.release()
+            for p in batch:
+                p.error = error
+                p.done.set()
+
+    def _abort(self, batch):
+        through = batch[-1].offset
+        if self.on_abort is not None:
+            through = max(through, self.on_abort([p.offset for p in batch]) or 0)
+        self._aborted_through = through
+        # ще не відправлені записи, перевірені до скасування, теж не пишемо
+        with self._cond:
+            dropped = [p for p in self._queue if p.offset <= through]
+            if dropped:
+                self._queue = deque(p for p in self._queue if p.offset > through)
+                self._queued_bytes -= sum(len(p.line) for p in dropped)
+        for p in dropped:
+            p.error = WalAborted(f"earlier WAL batch failed, offsets <= {through} aborted")
+            p.done.set()
+
+    def _discard(self, first_offset):
+        if self.discard_segment is None:
+            return
+        try:
+            self.discard_segment(first_offset)
+        except Exception as e:
+            # лишиться в S3 і застосується при recovery — так само, як і запис, що впав після PUT-у
+            print(f"[WAL] failed to discard aborted segment {first_offset}: {e}")
+
+
+# ===========================
+#   OFFSET INDEX + TAIL BUFFER
+# ===========================
+class WalIndex:
+    """
+    Індекс offset → (сегмент, позиція в байтах) + буфер останніх записів у пам'яті.
+
+    Свіжі записи віддаються з tail-буфера без звернення до S3,
+    старіші — ranged GET-ом лише потрібного шматка сегмента.
+    """
+
+    def __init__(self, tail_max_records=10000, tail_max_bytes=16 << 20):
+        self.tail_max_records = tail_max_records
+        self.tail_max_bytes = tail_max_bytes
+        self.last_offset = 0
+        self.start_offset = 1       # записи з меншим offset доступні лише через snapshot
+
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._seg_first = []        # перший offset кожного сегмента (відсортовано)
+        self._seg_last = []         # останній offset кожного сегмента
+        self._segments = []         # (key, offsets: array, positions: array)
+        self._seg_time = []         # коли сегмент закомічено (для retention tombstone-ів при компакції)
+        self._tail = []             # [(offset, line)], відсортовано за offset
+        self._tail_bytes = 0
+
+    @staticmethod
+    def _arrays(entries: list):
+        offsets, positions, pos = array("q"), array("q"), 0
+        for offset, line in entries:
+            offsets.append(offset)
+            positions.append(pos)
+            pos += len(line)
+        positions.append(pos)
+        return offsets, positions
+
+    def _insert(self, key, offsets, positions, committed_at):
+        i = bisect.bisect(self._seg_first, offsets[0])
+        self._seg_first.insert(i, offsets[0])
+        self._seg_last.insert(i, offsets[-1])
+        self._segments.insert(i, (key, offsets, positions))
+        self._seg_time.insert(i, committed_at)
+
+    def add_segment(self, key: str, entries: list, committed_at=None):
+        """Реєструє сегмент; entries — [(offset, line_bytes)] у порядку запису в сегменті."""
+        if not entries:
+            return
+        offsets, positions = self._arrays(entries)
+        self.add_indexed_segment(key, offsets, positions, entries, committed_at)
+
+    def add_indexed_segment(self, key: str, offsets: array, positions: array, tail_entries, committed_at=None):
+        """
+        Сегмент з уже побудованими offsets / positions (recovery будує їх потоково);
+        tail_entries — останні записи сегмента для tail-буфера (можна не всі).
+        """
+        if not offsets:
+            return
+        tail_entries = list(tail_entries)
+        with self._lock:
+            self._insert(key, offsets, positions, time.time() if committed_at is None else committed_at)
+
+            if self._tail and tail_entries and tail_entries[0][0] < self._tail[-1][0]:
+                self._tail = sorted(self._tail + tail_entries)
+            else:
+                self._tail.extend(tail_entries)
+            self._tail_bytes += sum(len(line) for _, line in tail_entries)
+            self._trim_tail()
+            self.last_offset = max(self.last_offset, offsets[-1])
+            self._committed.notify_all()
+
+    def sealed_prefix(self, upto_offset: int) -> list:
+        """Сегменти від початку WAL, що цілком лежать до upto_offset: [(key, last, bytes, committed_at)]."""
+        with self._lock:
+            n = bisect.bisect_right(self._seg_last, upto_offset)
+            # сегменти відсортовані й не перекриваються, тож префікс — перші n
+            return [(key, self._seg_last[i], positions[-1], self._seg_time[i])
+                    for i, (key, _, positions) in enumerate(self._segments[:n])]
+
+    def replace_prefix(self, old_keys: list, segments: list, committed_at: float, start_offset: int):
+        """
+        Після компакції: замінює old_keys стисненими сегментами [(key, entries)].
+        Tail-буфер не чіпаємо — в ньому сирі записи, вони й так правильні.
+        """
+        old = set(old_keys)
+        with self._lock:
+            keep = [i for i, (key, _, _) in enumerate(self._segments) if key not in old]
+            self._seg_first = [self._seg_first[i] for i in keep]
+            self._seg_last = [self._seg_last[i] for i in keep]
+            self._seg_time = [self._seg_time[i] for i in keep]
+            self._segments = [self._segments[i] for i in keep]
+            for key, entries in segments:
+                self._insert(key, *self._arrays(entries), committed_at)
+            self.start_offset = max(self.start_offset, start_offset)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "compressed_segments": sum(is_compressed(key) for key, _, _ in self._segments),
+                "bytes": sum(positions[-1] for _, _, positions in self._segments),
+                "start_offset": self.start_offset,
+                "last_offset": self.last_offset,
+            }
+
+    def manifest(self, after_offset: int = 0) -> dict:
+        """Закомічені сегменти з записами після after_offset: [[key, first, last, bytes], ...]."""
+        with self._lock:
+            s = bisect.bisect_right(self._seg_last, after_offset)
+            return {
+                "start_offset": max(self.start_offset, after_offset + 1),
+                "last_offset": self.last_offset,
+                "segments": [[key, offsets[0], offsets[-1], positions[-1]]
+                             for key, offsets, positions in self._segments[s:]],
+            }
+
+    def wait_for(self, offset: int, timeout: float) -> bool:
+        """Блокує, поки не буде закомічено запис з offset >= offset (або мине timeout)."""
+        with self._committed:
+            return self._committed.wait_for(lambda: self.last_offset >= offset, timeout)
+
+    def _trim_tail(self):
+        drop, dropped_bytes = 0, 0
+        while (len(self._tail) - drop > self.tail_max_records
+               or self._tail_bytes - dropped_bytes > self.tail_max_bytes):
+            dropped_bytes += len(self._tail[drop][1])
+            drop += 1
+        if drop:
+            del self._tail[:drop]
+            self._tail_bytes -= dropped_bytes
+
+    def _plan(self, cursor: int, limit: int, max_bytes: int):
+        """Під локом вирішує, звідки читати наступний шматок: з tail чи з сегмента."""
+        with self._lock:
+            if self._tail and cursor >= self._tail[0][0]:
+                i = bisect.bisect_left(self._tail, cursor, key=lambda e: e[0])
+                lines, size = [], 0
+                for offset, line in self._tail[i:i + limit]:
+                    if lines and size + len(line) > max_bytes:
+                        break
+                    lines.append(line)
+                    size += len(line)
+                return "tail", lines, self._tail[i + len(lines) - 1][0] if lines else None
+
+            s = bisect.bisect_left(self._seg_last, cursor)
+            if s >= len(self._segments):
+                return None
+            key, offsets, positions = self._segments[s]
+            j = bisect.bisect_left(offsets, cursor)
+            k = j + 1
+            while (k < len(offsets) and k - j < limit
+                   and positions[k + 1] - positions[j] <= max_bytes):
+                k += 1
+            return "segment", (key, positions[j], positions[k]), offsets[k - 1]
+
+    def read(self, from_offset: int, fetch_range, limit=1000, max_bytes=1 << 20):
+        """
+        Повертає (lines, next_offset) для записів з offset >= from_offset.
+        fetch_range(key, start, end) -> bytes читає [start, end) сегмента.
+        """
+        lines, size, cursor = [], 0, from_offset
+        while len(lines) < limit and size < max_bytes:
+            plan = self._plan(cursor, limit - len(lines), max_bytes - size)
+            if plan is None:
+                break
+            source, payload, last = plan
+            if source == "tail":
+                chunk = payload
+            else:
+                key, start, end = payload
+                chunk = fetch_range(key, start, end).splitlines(keepends=True)
+            if not chunk:
+                break
+            lines.extend(chunk)
+            size += sum(len(line) for line in chunk)
+            cursor = last + 1
+            if source == "tail":
+                break
+        return lines, cursor
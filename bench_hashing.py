@@ -0,0 +1,73 @@
+"""
+Бенчмарк ConsistentHashRing: швидкість маршрутизації та рівномірність розподілу.
+
+    python bench_hashing.py
+    python bench_hashing.py --nodes 3 6 12 --vnodes 3 40 160 640 --keys 200000 --json out.json
+
+Для кожної пари (nodes, vnodes) друкує:
+  get_node/s   — одиночні lookup-и за секунду
+  get_nodes/s  — ключів за секунду через батч-маршрутизацію
+  max/avg      — навантаження найзавантаженішого вузла відносно середнього (1.00 — ідеально)
+  stddev %     — стандартне відхилення кількості ключів на вузол, % від середнього
+"""
+import argparse
+import json
+import statistics
+import time
+
+from hashing import ConsistentHashRing
+
+
+def run_case(n_nodes: int, vnodes: int, keys: list) -> dict:
+    ring = ConsistentHashRing(replicas=vnodes)
+    for i in range(n_nodes):
+        ring.add_node(f"http://shard{i}:5000")
+
+    start = time.perf_counter()
+    owners = [ring.get_node(k) for k in keys]
+    single = len(keys) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    bulk_owners = ring.get_nodes(keys)
+    bulk = len(keys) / (time.perf_counter() - start)
+    assert bulk_owners == owners
+
+    counts = {node: 0 for node in ring.nodes()}
+    for node in owners:
+        counts[node] += 1
+    avg = len(keys) / n_nodes
+    return {
+        "nodes": n_nodes,
+        "vnodes": vnodes,
+        "get_node_per_s": round(single),
+        "get_nodes_per_s": round(bulk),
+        "max_over_avg": round(max(counts.values()) / avg, 3),
+        "stddev_pct": round(100 * statistics.pstdev(counts.values()) / avg, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[3, 6, 12])
+    parser.add_argument("--vnodes", type=int, nargs="+", default=[3, 40, 160, 640])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--json", help="зберегти результати у файл")
+    args = parser.parse_args()
+
+    keys = [f"table:pkey{i}" for i in range(args.keys)]
+    results = []
+    print(f"{'nodes':>5} {'vnodes':>6} {'get_node/s':>12} {'get_nodes/s':>12} {'max/avg':>8} {'stddev %':>9}")
+    for n_nodes in args.nodes:
+        for vnodes in args.vnodes:
+            r = run_case(n_nodes, vnodes, keys)
+            results.append(r)
+            print(f"{r['nodes']:>5} {r['vnodes']:>6} {r['get_node_per_s']:>12,} {r['get_nodes_per_s']:>12,} "
+                  f"{r['max_over_avg']:>8.3f} {r['stddev_pct']:>9.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ===========================
+#   PER-TABLE BLOOM FILTERS
+# ===========================
+# Shard тримає Bloom filter ключів (pkey, skey) кожної таблиці й віддає їх усі одним бінарним
+# об'єктом (GET /bloom). Coordinator періодично забирає фільтри і на read/exists ключа, якого
+# фільтр точно не містить, відповідає 404 / exists=false сам, без запиту на shard.
+#
+# Хибно-негативних відповідей бути не може:
+#   - coordinator додає ключ у свою копію фільтра до і після кожного запису через нього
+#     (якщо запис завершився під час pull-а, ключ додається і в щойно отриманий фільтр)
+#   - під час rebalance фільтри не використовуються, після перемикання кільця — скидаються
+# Видалення з Bloom filter неможливе: видалені ключі лишаються хибно-позитивними, доки shard
+# не перебудує фільтр (коли видалень стало більше за BLOOM_REBUILD_DELETES від кількості ключів).
+#
+# Формат (big-endian): b"BLM1" | u32 таблиць | для кожної:
+#   u16 довжина назви | назва | u8 k | u32 ключів | u64 m (біт) | ceil(m/8) байт бітів
+
+BLOOM_FPR = float(os.getenv("BLOOM_FPR", "0.01"))                     # цільова ймовірність хибного «можливо є»
+BLOOM_MAX_BYTES = int(os.getenv("BLOOM_MAX_BYTES", str(8 << 20)))     # стеля пам'яті фільтра однієї таблиці
+BLOOM_MIN_ITEMS = int(os.getenv("BLOOM_MIN_ITEMS", "1024"))
+BLOOM_GROWTH = 2.0                  # фільтр будується на growth * ключів, щоб не перебудовувати на кожному рості
+BLOOM_REBUILD_DELETES = float(os.getenv("BLOOM_REBUILD_DELETES", "0.25"))
+BLOOM_REFRESH_S = float(os.getenv("BLOOM_REFRESH_S", "5"))            # як часто coordinator забирає фільтри
+
+MAGIC = b"BLM1"
+BINARY = "application/octet-stream"
+
+_COUNT = struct.Struct(">I")
+_NAME = struct.Struct(">H")
+_FILTER = struct.Struct(">BIQ")     # k, ключів, m
+
+
+def item_key(pkey: str, skey: str) -> bytes:
+    return f"{pkey}\x00{skey}".encode()
+
+
+class BloomFilter:
+    """m біт, k хешів (double hashing двох 64-бітних половин blake2b)."""
+
+    def __init__(self, m_bits: int, k: int, bits=None, count=0):
+        self.m = m_bits
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((m_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fpr=BLOOM_FPR, max_bytes=BLOOM_MAX_BYTES):
+        """Оптимальні m і k для capacity ключів; m обрізається до max_bytes (тоді FPR вищий)."""
+        capacity = max(capacity, 1)
+        m = math.ceil(-capacity * math.log(fpr) / math.log(2) ** 2)
+        m = max(64, min(m, max_bytes * 8))
+        k = max(1, min(16, round(m / capacity * math.log(2))))
+        return cls(m, k)
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, key: bytes):
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def estimated_fpr(self) -> float:
+        """За фактичною часткою встановлених бітів — враховує й біти видалених ключів."""
+        fill = int.from_bytes(self.bits, "big").bit_count() / self.m
+        return fill ** self.k
+
+    def stats(self) -> dict:
+        return {"items": self.count, "bits": self.m, "hashes": self.k, "bytes": len(self.bits),
+                "estimated_fpr": round(self.estimated_fpr(), 6)}
+
+
+def encode_filters(filters: dict) -> bytes:
+    parts = [MAGIC, _COUNT.pack(len(filters))]
+    for table, bloom in filters.items():
+        name = table.encode()
+        parts += [_NAME.pack(len(name)), name, _FILTER.pack(bloom.k, bloom.count, bloom.m), bytes(bloom.bits)]
+    return b"".join(parts)
+
+
+def decode_filters(data: bytes) -> dict:
+    """{table: BloomFilter}; ValueError — пошкоджені дані."""
+    if data[:4] != MAGIC:
+        raise ValueError("not a bloom filter container")
+    try:
+        (n,) = _COUNT.unpack_from(data, 4)
+        pos, filters = 4 + _COUNT.size, {}
+        for _ in range(n):
+            (name_len,) = _NAME.unpack_from(data, pos)
+            pos += _NAME.size
+            table = data[pos:pos + name_len].decode()
+            pos += name_len
+            k, count, m = _FILTER.unpack_from(data, pos)
+            pos += _FILTER.size
+            size = (m + 7) // 8
+            if pos + size > len(data):
+                raise ValueError("truncated bloom filter")
+            filters[table] = BloomFilter(m, k, bytearray(data[pos:pos + size]), count)
+            pos += size
+        return filters
+    except struct.error as e:
+        raise ValueError(f"truncated bloom filter container: {e}") from e
+
+
+# ---------- shard side ----------
+class TableFilters:
+    """
+    Фільтри таблиць shard-а. keys_of(table) -> (pkey, skey) усіх ключів; tables() -> назви таблиць.
+    Фільтр будується ліниво (на першому encode) і перебудовується, коли ключів стало більше
+    за місткість або видалень — більше за BLOOM_REBUILD_DELETES; між перебудовами — add на кожен insert.
+    """
+
+    def __init__(self, tables, keys_of, fpr=BLOOM_FPR, max_bytes=BLOOM_MAX_BYTES):
+        self._tables = tables
+        self._keys_of = keys_of
+        self.fpr = fpr
+        self.max_bytes = max_bytes
+        self._filters = {}          # table -> (BloomFilter, capacity)
+        self._deletes = {}
+        self._building = {}         # table -> ключі, додані під час перебудови
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()       # одна перебудова за раз
+        self.version = 0            # змінюється на кожну зміну
+        # version після рестарту знову рахує з 0 — без boot_id coordinator міг би отримати 304
+        # на ETag фільтра попереднього процесу і лишитися з ним
+        self.boot_id = uuid.uuid4().hex[:16]
+        self.rebuilds = 0
+
+    @property
+    def etag(self) -> str:
+        """ETag для GET /bloom: унікальний між рестартами процесу."""
+        return f'"{self.boot_id}-{self.version}"'
+
+    def add(self, table: str, pkey: str, skey: str):
+        key = item_key(pkey, skey)
+        with self._lock:
+            self.version += 1
+            if table in self._building:
+                self._building[table].append(key)
+            entry = self._filters.get(table)
+            if entry is not None:
+                entry[0].add(key)
+
+    def remove(self, table: str, pkey: str, skey: str):
+        with self._lock:
+            self.version += 1
+            self._deletes[table] = self._deletes.get(table, 0) + 1
+
+    def _stale(self, table: str) -> bool:
+        entry = self._filters.get(table)
+        if entry is None:
+            return True
+        bloom, capacity = entry
+        live = bloom.count - self._deletes.get(table, 0)
+        return bloom.count > capacity or self._deletes.get(table, 0) > BLOOM_REBUILD_DELETES * max(live, 1)
+
+    def _rebuild(self, table: str):
+        with self._lock:
+            self._building[table] = []
+        keys = list(self._keys_of(table))
+        capacity = max(BLOOM_MIN_ITEMS, int(len(keys) * BLOOM_GROWTH))
+        bloom = BloomFilter.for_capacity(capacity, self.fpr, self.max_bytes)
+        for pkey, skey in keys:
+            bloom.add(item_key(pkey, skey))
+        with self._lock:
+            # ключі, вставлені поки ми читали keys_of, теж мають потрапити у фільтр
+            for key in self._building.pop(table):
+                bloom.add(key)
+            self._filters[table] = (bloom, capacity)
+            self._deletes[table] = 0
+            self.version += 1
+            self.rebuilds += 1
+
+    def current(self) -> dict:
+        """{table: BloomFilter} усіх таблиць (застарілі перебудовуються)."""
+        tables = list(self._tables())
+        with self._rebuild_lock:
+            for table in tables:
+                if self._stale(table):
+                    self._rebuild(table)
+        with self._lock:
+            return {table: self._filters[table][0] for table in tables if table in self._filters}
+
+    def encode(self) -> bytes:
+        filters = self.current()
+        with self._lock:
+            return encode_filters(filters)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"fpr_target": self.fpr, "max_bytes": self.max_bytes, "rebuilds": self.rebuilds,
+                    "tables": {table: {**bloom.stats(), "capacity": capacity,
+                                       "deletes_since_build": self._deletes.get(table, 0)}
+                               for table, (bloom, capacity) in self._filters.items()}}
+
+
+# ---------- coordinator side ----------
+class FilterCache:
+    """
+    Копії фільтрів shard-ів на coordinator-і: {node: {table: BloomFilter}}.
+    might_contain -> False лише тоді, коли ключа точно немає; None — фільтра немає (питаємо shard).
+    """
+
+    def __init__(self):
+        self._filters = {}
+        self._etags = {}
+        self._pulled_at = {}
+        self._recent = []           # (monotonic, node, table, key) завершених записів
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.negatives = 0
+        self.passes = 0
+
+    def might_contain(self, node, table, pkey, skey):
+        bloom = self._filters.get(node, {}).get(table)
+        if bloom is None:
+            return None
+        if item_key(pkey, skey) in bloom:
+            self.passes += 1
+            return True
+        self.negatives += 1
+        return False
+
+    def _add(self, node, table, key):
+        bloom = self._filters.get(node, {}).get(table)
+        if bloom is not None:
+            bloom.add(key)
+
+    @contextmanager
+    def writing(self, items):
+        """
+        Обгортка запису ключів [(node, table, pkey, skey)] на shard-и: ключі додаються у фільтри
+        і до відправки, і після відповіді (навіть помилки — запис міг пройти).
+        """
+        keys = [(node, table, item_key(pkey, skey)) for node, table, pkey, skey in items]
+        with self._lock:
+            for node, table, key in keys:
+                self._add(node, table, key)
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                for node, table, key in keys:
+                    self._add(node, table, key)
+                    self._recent.append((now, node, table, key))
+
+    def begin(self):
+        """Токен pull-а: записи, що завершились після нього, додаються в отримані фільтри."""
+        return self._generation, time.monotonic()
+
+    def etag(self, node):
+        return self._etags.get(node)
+
+    def replace(self, node, filters: dict, etag, token):
+        generation, started = token
+        with self._lock:
+            if generation != self._generation:
+                return              # фільтри скинули (зміна кільця), поки йшов pull
+            for t, n, table, key in self._recent:
+                if n == node and t >= started and table in filters:
+                    filters[table].add(key)
+            self._filters[node] = filters
+            self._etags[node] = etag
+            self._pulled_at[node] = time.time()
+
+    def touch(self, node):
+        """Фільтри node не змінились (304)."""
+        self._pulled_at[node] = time.time()
+
+    def prune(self, before: float):
+        with self._lock:
+            self._recent = [entry for entry in self._recent if entry[0] >= before]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._filters.clear()
+            self._etags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.negatives + self.passes
+            return {
+                "negatives": self.negatives,
+                "passes": self.passes,
+                "negative_ratio": round(self.negatives / lookups, 4) if lookups else 0.0,
+                "bytes": sum(len(b.bits) for filters in self._filters.values() for b in filters.values()),
+                "nodes": {str(node): {"pulled_at": self._pulled_at.get(node),
+                                      "tables": {table: bloom.stats() for table, bloom in filters.items()}}
+                          for node, filters in self._filters.items()},
+            }
+
+
+def pull(cache: FilterCache, endpoints: dict, fetch):
+    """Один прохід pull-а: endpoints {node: URL}, fetch(url, etag) -> requests.Response."""
+    for node, url in endpoints.items():
+        token = cache.begin()
+        try:
+            r = fetch(url, cache.etag(node))
+            if r.status_code == 304:
+                cache.touch(node)
+            elif r.status_code == 200:
+                cache.replace(node, decode_filters(r.content), r.headers.get("ETag"), token)
+        except Exception as e:
+            print(f"[Bloom] pull from {url} failed: {e}")
+
+
+def pull_loop(cache: FilterCache, endpoints, fetch, active=lambda: True, interval=BLOOM_REFRESH_S):
+    """
+    Фоновий pull: endpoints() -> {node: URL}, fetch(url, etag) -> requests.Response.
+    Поки active() == False (напр. rebalance), фільтри не оновлюються.
+    """
+    while True:
+        started = time.monotonic()
+        if active():
+            pull(cache, dict(endpoints()), fetch)
+        cache.prune(started)
+        time.sleep(interval)
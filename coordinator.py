@@ -1,11 +1,50 @@
 import connexion
-from flask import jsonify
+import json
+from connexion.lifecycle import ConnexionResponse
+from connexion.resolver import Resolver
+from contextlib import contextmanager
+from flask import Response, jsonify, request
+import os
 import requests
+import threading
+import bloom
+import http_pool
+import hotkeys
+import metrics
+import rebalance
+import rpc
+import scan
+import wire
 from hashing import ConsistentHashRing
 
+def resolve_handler(operation_id):
+    """
+    operationId "coordinator.read" → функція саме цього екземпляра модуля.
+    Під `python coordinator.py` модуль — __main__, і connexion інакше імпортував би
+    другу копію coordinator: метрики реєструвались би двічі, а handler-и не бачили б
+    стану, який оновлюють фонові потоки (bloom-фільтри).
+    """
+    return globals()[operation_id.rpartition(".")[2]]
+
 # Ініціалізація connexion для автоматичної верифікації запитів
 app = connexion.App(__name__, specification_dir='.')
-app.add_api("openapi.yaml", strict_validation=True, validate_responses=True)
+# VALIDATE_RESPONSES=0 прибирає ще один json-розбір кожної відповіді (відповіді shard-ів ідуть passthrough)
+app.add_api("openapi.yaml", strict_validation=True, resolver=Resolver(resolve_handler),
+            validate_responses=os.getenv("VALIDATE_RESPONSES", "1") == "1")
+
+def shard_unavailable(request, exc):
+    """Недоступний / повільний shard → 503 замість 500"""
+    return ConnexionResponse(
+        status_code=503,
+        content_type="application/json",
+        body=json.dumps({"error": f"Shard unavailable: {exc}"}),
+    )
+
+app.add_error_handler(requests.RequestException, shard_unavailable)
+
+# /metrics (поза OpenAPI-специфікацією) + latency/лічильники на кожен route
+metrics.instrument_app(app.app)
+app.add_url_rule("/metrics", "metrics", metrics.metrics_response)
 
 # Ініціалізація хеш-кільця
 ring = ConsistentHashRing()
@@ -13,12 +52,116 @@ nodes = ["http://localhost:5001", "http://localhost:5002", "http://localhost:500
 for n in nodes:
     ring.add_node(n)
 
+# Online rebalance: у цьому варіанті node == URL shard-а
+rebalancer = rebalance.Rebalancer(leader_url=lambda node: node)
+
+routed_keys = metrics.Counter("ring_routed_keys_total", "Keys routed to each node", ["node"])
+metrics.Gauge("ring_ownership_ratio", "Share of the hash space owned by each node", ["node"],
+              callback=lambda: {(node,): share for node, share in ring.ownership().items()})
+
+def route(table, pkey):
+    """(node, previous_node): previous_node != None лише для ключів, що зараз переїжджають"""
+    # маршрутизуємо лише за partition key — уся партиція живе на одному shard-і
+    owner, previous = rebalancer.owners(ring, f"{table}:{pkey}")
+    routed_keys.inc(owner)
+    return owner, previous
+
+def switch_ring(new_ring):
+    global ring, nodes
+    ring = new_ring
+    nodes = new_ring.nodes()
+    # items переїхали повз coordinator — старі фільтри їх не містять
+    bloom_filters.clear()
+
+# SHARD_TRANSPORT=rpc — create/read/delete/exists ідуть persistent TCP-каналом (rpc.py,
+# shard-и з RPC_ENABLED=1); batch, query і міграція — як і раніше, HTTP
+SHARD_TRANSPORT = os.getenv("SHARD_TRANSPORT", "http")
+
+def shard_item(node, op, table, pkey, skey, value=None):
+    """Item-операція на shard-і; відповідь у формі requests.Response для обох транспортів."""
+    if SHARD_TRANSPORT == "rpc":
+        args = {"value": value} if op == "create" else {}
+        return rpc.call(node, op, table_name=table, partition_key=pkey, sort_key=skey, **args)
+    if op == "create":
+        return http_pool.post(f"{node}/create", json={"table_name": table, "partition_key": pkey,
+                                                      "sort_key": skey, "value": value})
+    send = http_pool.delete if op == "delete" else http_pool.get
+    return send(f"{node}/{op}/{table}/{pkey}/{skey}")
+
+# Гарячі ключі (hotkeys.py): відповіді на read/exists гарячих на читання ключів тримаються
+# в короткоживучому кеші coordinator-а, тож shard, якому належить ключ, бачить його не частіше
+# ніж раз на HOT_KEY_CACHE_TTL_S або запис. Гарячі на запис лише звітуються.
+hot_cache = hotkeys.HotKeyCache()
+hot_reads = hotkeys.HotKeyTracker("reads", on_change=lambda hot, previous: hot_cache.retain(hot))
+hot_writes = hotkeys.HotKeyTracker("writes")
+
+metrics.Gauge("hot_keys", "Keys currently classified as hot", ["kind"],
+              callback=lambda: {("reads",): len(hot_reads.hot), ("writes",): len(hot_writes.hot)})
+for stat in ("hits", "misses", "entries"):
+    metrics.Gauge(f"hot_key_cache_{stat}", f"Hot key cache {stat}", callback=lambda stat=stat: hot_cache.stats()[stat])
+
+def hot_read(node, table, pkey, skey, previous):
+    """read/exists з кешу гарячих ключів; ключі, що переїжджають, не кешуються."""
+    key = (table, pkey, skey)
+    hot_reads.record(key)
+    if previous is not None or not hot_reads.is_hot(key):
+        return None
+    cached = hot_cache.get(key)
+    if cached is not None:
+        return cached
+    token = hot_cache.begin()
+    r = shard_item(node, "read", table, pkey, skey)
+    if r.status_code in (200, 404):
+        hot_cache.put(key, token, r.status_code, r.content)
+    return r.status_code, r.content
+
+@contextmanager
+def writing_keys(keys):
+    """
+    Обгортка запису ключів [(table, pkey, skey)] на shard-и. Кеш гарячих ключів інвалідується
+    після відповіді shard-а (і при помилці — запис міг пройти): читання, що почалося до того
+    і ще бачило старе значення, вже не покладе його в кеш.
+    """
+    for key in keys:
+        hot_writes.record(key)
+    try:
+        yield
+    finally:
+        for key in keys:
+            hot_cache.invalidate(key)
+
+# Bloom filter-и shard-ів (bloom.py): read/exists ключа, якого точно немає, — без запиту на shard.
+# BLOOM_ENABLED=0 вимикає (фільтри не забираються).
+BLOOM_ENABLED = os.getenv("BLOOM_ENABLED", "1") == "1"
+bloom_filters = bloom.FilterCache()
+metrics.Gauge("bloom_negative_answers", "read/exists answered from a Bloom filter",
+              callback=lambda: bloom_filters.negatives)
+metrics.Gauge("bloom_filters_bytes", "Memory of Bloom filters pulled from shards",
+              callback=lambda: bloom_filters.stats()["bytes"])
+
+def definitely_missing(node, table, pkey, skey, previous):
+    # під час міграції items переїжджають повз coordinator — фільтрам не віримо
+    if previous is not None or rebalancer.active:
+        return False
+    return bloom_filters.might_contain(node, table, pkey, skey) is False
+
+def bloom_endpoints():
+    return {node: node for node in nodes}
+
+def fetch_bloom(url, etag):
+    return http_pool.get(f"{url}/bloom", headers={"If-None-Match": etag} if etag else {})
+
+def pull_bloom_filters():
+    bloom.pull_loop(bloom_filters, bloom_endpoints, fetch_bloom, active=lambda: not rebalancer.active)
+
 # API-методи
 
 def register_table(body):
     table_name = body.get("table_name")
-    for node in nodes:
-        requests.post(f"{node}/register_table", json={"table_name": table_name})
+    http_pool.fan_out(
+        lambda node: http_pool.post(f"{node}/register_table", json={"table_name": table_name}),
+        nodes,
+    )
     return jsonify({"status": f"Table {table_name} registered on all shards"}), 201
 
 def create(body):
@@ -27,28 +170,269 @@ def create(body):
     skey = body["sort_key"]
     value = body["value"]
 
-    compound_key = f"{table}:{pkey}:{skey}"
-    node = ring.get_node(compound_key)
-    r = requests.post(f"{node}/create", json=body)
-    return jsonify(r.json()), r.status_code
+    node, previous = route(table, pkey)
+    with writing_keys([(table, pkey, skey)]):
+        if previous is not None:
+            # ключ ще може лежати у старого власника — не дозволяємо дублікат
+            r = shard_item(previous, "exists", table, pkey, skey)
+            if r.json().get("exists"):
+                return jsonify({"error": "Item already exists"}), 400
+        with bloom_filters.writing([(node, table, pkey, skey)]):
+            r = shard_item(node, "create", table, pkey, skey, value)
+    return wire.passthrough(r)
 
 def read(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    node = ring.get_node(compound_key)
-    r = requests.get(f"{node}/read/{table_name}/{partition_key}/{sort_key}")
-    return jsonify(r.json()), r.status_code
+    node, previous = route(table_name, partition_key)
+    cached = hot_read(node, table_name, partition_key, sort_key, previous)
+    if cached is not None:
+        return Response(cached[1], cached[0], mimetype=wire.JSON)
+    if definitely_missing(node, table_name, partition_key, sort_key, previous):
+        return jsonify({"error": "Item not found"}), 404
+    r = shard_item(node, "read", table_name, partition_key, sort_key)
+    if r.status_code == 404 and previous is not None:
+        r = shard_item(previous, "read", table_name, partition_key, sort_key)
+    return wire.passthrough(r)
 
 def delete(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    node = ring.get_node(compound_key)
-    r = requests.delete(f"{node}/delete/{table_name}/{partition_key}/{sort_key}")
-    return jsonify(r.json()), r.status_code
+    node, previous = route(table_name, partition_key)
+    with writing_keys([(table_name, partition_key, sort_key)]):
+        r = shard_item(node, "delete", table_name, partition_key, sort_key)
+        if previous is not None:
+            rebalancer.record_delete(node, table_name, partition_key, sort_key)
+            r_prev = shard_item(previous, "delete", table_name, partition_key, sort_key)
+            if r.status_code == 404:
+                r = r_prev
+    return wire.passthrough(r)
 
 def exists(table_name, partition_key, sort_key):
-    compound_key = f"{table_name}:{partition_key}:{sort_key}"
-    node = ring.get_node(compound_key)
-    r = requests.get(f"{node}/exists/{table_name}/{partition_key}/{sort_key}")
-    return jsonify(r.json()), r.status_code
+    node, previous = route(table_name, partition_key)
+    # відповідь /read гарячого ключа відповідає і на exists
+    cached = hot_read(node, table_name, partition_key, sort_key, previous)
+    if cached is not None:
+        return jsonify({"exists": cached[0] == 200}), 200
+    if definitely_missing(node, table_name, partition_key, sort_key, previous):
+        return jsonify({"exists": False}), 200
+    r = shard_item(node, "exists", table_name, partition_key, sort_key)
+    if previous is not None and not r.json().get("exists"):
+        r = shard_item(previous, "exists", table_name, partition_key, sort_key)
+    return wire.passthrough(r)
+
+def query(table_name, partition_key, begins_with=None, start=None, end=None,
+          exclusive_start_key=None, limit=100):
+    # уся партиція лежить на одному шарді — запит іде на один вузол
+    node, previous = route(table_name, partition_key)
+    params = {"begins_with": begins_with, "start": start, "end": end,
+              "exclusive_start_key": exclusive_start_key, "limit": limit}
+    params = {k: v for k, v in params.items() if v is not None}
+    if previous is None:
+        return wire.passthrough(http_pool.get(f"{node}/query/{table_name}/{partition_key}", params=params))
+
+    # партиція переїжджає — частина items ще у старого власника; сторінки зливаємо тут
+    r = http_pool.get(f"{node}/query/{table_name}/{partition_key}", params=params, headers=wire.ACCEPT_BINARY)
+    if r.status_code == 200:
+        r_prev = http_pool.get(f"{previous}/query/{table_name}/{partition_key}", params=params,
+                               headers=wire.ACCEPT_BINARY)
+        if r_prev.status_code == 200:
+            return jsonify(rebalance.merge_query_pages(wire.decode(r), wire.decode(r_prev), limit)), 200
+    return jsonify(wire.decode(r)), r.status_code
+
+def route_many(items):
+    """route() для батчу: [(node, previous_node)] у порядку items — з одного знімка кілець"""
+    return rebalancer.owners_many(ring, (f"{item['table_name']}:{item['partition_key']}" for item in items))
+
+def group_by_node(items, routes):
+    """Групує items за шардом: {node: [(index у запиті, item), ...]}"""
+    groups = {}
+    for i, (item, (owner, _)) in enumerate(zip(items, routes)):
+        groups.setdefault(owner, []).append((i, item))
+    for owner, group in groups.items():
+        routed_keys.inc(owner, amount=len(group))
+    return groups
+
+def item_result(item, res):
+    return {"table_name": item["table_name"], "partition_key": item["partition_key"],
+            "sort_key": item["sort_key"], **res}
+
+def scatter_gather(items, routes, path, body_field):
+    """
+    Розсилає по одному батч-запиту на кожен шард паралельно
+    і збирає результати назад у порядку items.
+    """
+    groups = group_by_node(items, routes)
+    results = [None] * len(items)
+
+    def _send(node, group):
+        try:
+            r = http_pool.post(f"{node}/{path}", json={body_field: [item for _, item in group]},
+                               headers=wire.ACCEPT_BINARY)
+            return group, wire.decode(r)["results"]
+        except Exception as e:
+            return group, [{"status": 503, "error": f"Shard {node} unavailable: {e}"}] * len(group)
+
+    for group, shard_results in http_pool.fan_out(lambda g: _send(*g), groups.items()):
+        for (i, item), res in zip(group, shard_results):
+            results[i] = item_result(item, res)
+    return results
+
+def blocked_by_previous(items, routes):
+    """
+    Як і в create: ключ, що переїжджає, ще може лежати у старого власника — дублікат не пишемо.
+    {index: результат} для items, які писати не можна (один batch_read на старий вузол).
+    """
+    by_node = {}
+    for i, (_, previous) in enumerate(routes):
+        if previous is not None:
+            by_node.setdefault(previous, []).append(i)
+
+    def _check(node, idx):
+        keys = [{k: items[i][k] for k in ("table_name", "partition_key", "sort_key")} for i in idx]
+        try:
+            r = http_pool.post(f"{node}/batch_read", json={"keys": keys}, headers=wire.ACCEPT_BINARY)
+            return idx, wire.decode(r)["results"], None
+        except Exception as e:
+            return idx, None, e
+
+    blocked = {}
+    for idx, found, error in http_pool.fan_out(lambda g: _check(*g), by_node.items()):
+        for j, i in enumerate(idx):
+            if error is not None:
+                blocked[i] = {"status": 503, "error": f"Shard unavailable: {error}"}
+            elif found[j].get("found"):
+                blocked[i] = {"status": 400, "error": "Item already exists"}
+    return blocked
+
+def batch_write(body):
+    items = body["items"]
+    routes = route_many(items)
+    with writing_keys([(item["table_name"], item["partition_key"], item["sort_key"]) for item in items]):
+        blocked = blocked_by_previous(items, routes)
+        todo = [i for i in range(len(items)) if i not in blocked]
+        with bloom_filters.writing([(routes[i][0], items[i]["table_name"], items[i]["partition_key"],
+                                     items[i]["sort_key"]) for i in todo]):
+            written = scatter_gather([items[i] for i in todo], [routes[i] for i in todo], "batch_create", "items")
+    results = [None] * len(items)
+    for i, res in zip(todo, written):
+        results[i] = res
+    for i, res in blocked.items():
+        results[i] = item_result(items[i], res)
+    return jsonify({"results": results}), 200
+
+def batch_get(body):
+    keys = body["keys"]
+    routes = route_many(keys)
+    results = scatter_gather(keys, routes, "batch_read", "keys")
+
+    # під час міграції промахи перевіряємо ще й у старого власника
+    by_node = {}
+    for i, (res, (_, previous)) in enumerate(zip(results, routes)):
+        if not res.get("found") and previous is not None:
+            by_node.setdefault(previous, []).append(i)
+    for node, idx in by_node.items():
+        r = http_pool.post(f"{node}/batch_read", json={"keys": [keys[i] for i in idx]},
+                           headers=wire.ACCEPT_BINARY)
+        for i, res in zip(idx, wire.decode(r)["results"]):
+            if res.get("found"):
+                results[i].update(res)
+    return jsonify({"results": results}), 200
+
+# ---------------------------
+#   SCAN / EXPORT
+# ---------------------------
+exports = {}        # table -> scan.ExportJob (останній експорт таблиці)
+
+def make_scan(table_name, segments, cursor=None):
+    """TableScan по всіх shard-ах: segments потоків на кожен shard або позиції з курсора."""
+    topology = sorted(nodes)
+    if cursor is None:
+        positions = {f"{node}|{i}": None for node in nodes for i in range(segments)}
+    else:
+        segments, positions, cursor_topology = scan.decode_cursor(cursor)
+        if cursor_topology != topology:
+            raise ValueError("Shards changed since the cursor was issued, restart the scan")
+
+    def open_stream(stream_id, after):
+        node, segment = stream_id.rsplit("|", 1)
+        params = {"segment": segment, "total_segments": segments}
+        if after is not None:
+            params["after"] = json.dumps(after)
+        return http_pool.get(f"{node}/scan/{table_name}", params=params, stream=True)
+
+    return scan.TableScan(positions, segments, open_stream, topology)
+
+def scan_table(table_name):
+    """
+    GET /scan/<table_name>?segments=&cursor= — NDJSON-стрім усіх items таблиці (формат — у scan.py).
+    Поза OpenAPI-специфікацією: connexion буферизує і валідує *json-відповіді, а цю треба стрімити.
+    """
+    try:
+        segments = min(max(int(request.args.get("segments", scan.SCAN_SEGMENTS)), 1), 64)
+    except ValueError:
+        return jsonify({"error": "segments must be an integer"}), 400
+    cursor = request.args.get("cursor")
+    # під час міграції items переїжджають між shard-ами — скан пропустив би або повторив їх
+    if rebalancer.active:
+        return jsonify({"error": "Rebalance in progress, retry the scan later"}), 409
+    try:
+        table_scan = make_scan(table_name, segments, cursor).start()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except scan.ScanError as e:
+        return jsonify({"error": str(e)}), e.status
+    return Response(scan.ndjson_response(table_scan), mimetype=scan.NDJSON)
+
+app.add_url_rule("/scan/<table_name>", "scan_table", scan_table)
+
+def start_export(table_name, segments=scan.SCAN_SEGMENTS):
+    job = exports.get(table_name)
+    if (job is not None and job.running) or rebalancer.active:
+        return jsonify({"error": "Export already running or rebalance in progress"}), 409
+    job = exports[table_name] = scan.ExportJob(
+        table_name, lambda cursor: make_scan(table_name, segments, cursor)
+    ).start()
+    return jsonify(job.status), 202
+
+def export_status(table_name):
+    job = exports.get(table_name)
+    if job is None:
+        return jsonify({"error": "No export for this table"}), 404
+    return jsonify(job.status), 200
+
+# ---------------------------
+#   RESHARDING
+# ---------------------------
+def add_shard(body):
+    node = body["node"]
+    if node in ring.weights or rebalancer.active:
+        return jsonify({"error": "Shard already in ring or rebalance in progress"}), 409
+    new_ring = ring.copy()
+    new_ring.add_node(node, body.get("weight", 1))
+    nodes.append(node)          # нові таблиці одразу реєструються і на новому shard-і
+    rebalancer.start(ring, new_ring, switch_ring)
+    return jsonify({"status": "rebalance started", "node": node}), 202
+
+def remove_shard(body):
+    node = body["node"]
+    if node not in ring.weights or len(ring.weights) == 1 or rebalancer.active:
+        return jsonify({"error": "Unknown/last shard or rebalance in progress"}), 409
+    new_ring = ring.copy()
+    new_ring.remove_node(node)
+    rebalancer.start(ring, new_ring, switch_ring)
+    return jsonify({"status": "rebalance started", "node": node}), 202
+
+def rebalance_status():
+    return jsonify({**rebalancer.status, "nodes": nodes}), 200
+
+# ---------------------------
+#   HOT KEYS
+# ---------------------------
+def bloom_stats():
+    return jsonify({"enabled": BLOOM_ENABLED, **bloom_filters.stats()}), 200
+
+def hot_keys(top=20):
+    return jsonify({"reads": hot_reads.stats(top), "writes": hot_writes.stats(top),
+                    "cache": hot_cache.stats()}), 200
 
 if __name__ == "__main__":
+    if BLOOM_ENABLED:
+        threading.Thread(target=pull_bloom_filters, daemon=True).start()
     app.run(host="127.0.0.1", port=5000)
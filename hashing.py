@@ -1,31 +1,139 @@
-import hashlib
 import bisect
+import hashlib
+from array import array
+
+DEFAULT_REPLICAS = 160      # віртуальних вузлів на одиницю ваги
+HASH_SPACE = 1 << 64
+
+
+def hash64(key: str) -> int:
+    """Стабільний 64-бітний хеш (однаковий у всіх процесах, на відміну від hash())."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
 
 class ConsistentHashRing:
-    def __init__(self, replicas=3):
+    """
+    Консистентне хеш-кільце з віртуальними вузлами.
+
+    Токени зберігаються у відсортованому array('Q'), власники — у паралельному списку,
+    тож get_node — це один бінарний пошук без побудови hexdigest.
+    Вузол з weight=2 отримує вдвічі більше vnode-ів (і приблизно вдвічі більше ключів).
+    """
+
+    def __init__(self, replicas=DEFAULT_REPLICAS):
         self.replicas = replicas
-        self.ring = {}
-        self.sorted_keys = []
+        self.weights = {}           # node -> weight
+        self._tokens = array("Q")   # відсортовані токени vnode-ів
+        self._owners = []           # _owners[i] — вузол, якому належить _tokens[i];
+                                    # останній елемент = _owners[0] (замикаємо кільце)
+
+    def _vnode_tokens(self, node, weight) -> list:
+        count = max(1, round(self.replicas * weight))
+        return [hash64(f"{node}:{i}") for i in range(count)]
+
+    def _rebuild(self):
+        pairs = []
+        for node, weight in self.weights.items():
+            pairs.extend((token, node) for token in self._vnode_tokens(node, weight))
+        pairs.sort(key=lambda p: p[0])
+        self._tokens = array("Q", (token for token, _ in pairs))
+        self._owners = [node for _, node in pairs]
+        if self._owners:
+            self._owners.append(self._owners[0])
+
+    def add_node(self, node, weight=1):
+        self.weights[node] = weight
+        self._rebuild()
 
-    def _hash(self, key: str) -> int:
-        return int(hashlib.md5(key.encode()).hexdigest(), 16)
+    def remove_node(self, node):
+        del self.weights[node]
+        self._rebuild()
 
-    def add_node(self, node: str):
-        for i in range(self.replicas):
-            key = self._hash(f"{node}:{i}")
-            self.ring[key] = node
-            bisect.insort(self.sorted_keys, key)
+    def nodes(self) -> list:
+        return list(self.weights)
 
-    def remove_node(self, node: str):
-        for i in range(self.replicas):
-            key = self._hash(f"{node}:{i}")
-            del self.ring[key]
-            self.sorted_keys.remove(key)
+    def copy(self):
+        ring = ConsistentHashRing(self.replicas)
+        ring.weights = dict(self.weights)
+        ring._tokens = array("Q", self._tokens)
+        ring._owners = list(self._owners)
+        return ring
 
-    def get_node(self, key: str) -> str:
+    def tokens(self) -> array:
+        return self._tokens
+
+    def ownership(self) -> dict:
+        """Частка простору хешів (≈ частка ключів), яка дістається кожному вузлу."""
+        shares = {node: 0 for node in self.weights}
+        prev = 0
+        for token, node in zip(self._tokens, self._owners):
+            shares[node] += token - prev
+            prev = token
+        if self._owners:
+            shares[self._owners[-1]] += HASH_SPACE - prev
+        return {node: share / HASH_SPACE for node, share in shares.items()}
+
+    def owner_of_hash(self, h: int):
+        """Власник точки кільця h (h — результат hash64)."""
+        if not self._owners:
+            return None
+        return self._owners[bisect.bisect(self._tokens, h)]
+
+    def get_node(self, key: str):
         """Повертає адресу шарду для конкретного partition key"""
-        if not self.ring:
+        if not self._owners:
             return None
-        key_hash = self._hash(key)
-        idx = bisect.bisect(self.sorted_keys, key_hash) % len(self.sorted_keys)
-        return self.ring[self.sorted_keys[idx]]
+        return self._owners[bisect.bisect(self._tokens, hash64(key))]
+
+    def get_nodes(self, keys) -> list:
+        """
+        Маршрутизує цілий батч ключів за один прохід (результат — у порядку keys).
+        Хеш і пошук інлайняться в один цикл з локальними посиланнями,
+        тож на ключ не витрачається накладний виклик get_node/hash64.
+        """
+        if not self._owners:
+            return [None for _ in keys]
+        tokens, owners = self._tokens, self._owners
+        bisect_right, blake2b, from_bytes = bisect.bisect_right, hashlib.blake2b, int.from_bytes
+        return [
+            owners[bisect_right(tokens, from_bytes(blake2b(k.encode(), digest_size=8).digest(), "big"))]
+            for k in keys
+        ]
+
+
+def moved_ranges(old_ring, new_ring) -> dict:
+    """
+    Діапазони хешів [start, end), які змінюють власника між двома кільцями:
+    {(old_node, new_node): [[start, end], ...]}.
+    Межі кілець ділять простір на відрізки, усередині яких власник не змінюється,
+    тож достатньо порівняти власників на початку кожного відрізка.
+    """
+    bounds = sorted(set(old_ring.tokens()) | set(new_ring.tokens()))
+    starts = [0] + bounds
+    ends = bounds + [HASH_SPACE]
+
+    moves = {}
+    for start, end in zip(starts, ends):
+        if start == end:
+            continue
+        old, new = old_ring.owner_of_hash(start), new_ring.owner_of_hash(start)
+        if old == new:
+            continue
+        ranges = moves.setdefault((old, new), [])
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end             # зливаємо сусідні відрізки
+        else:
+            ranges.append([start, end])
+    return moves
+
+
+def range_filter(ranges):
+    """Повертає функцію key -> bool: чи потрапляє hash64(key) в один з діапазонів [start, end)."""
+    ranges = sorted(ranges)
+    starts = [start for start, _ in ranges]
+
+    def contains(key: str) -> bool:
+        h = hash64(key)
+        i = bisect.bisect(starts, h) - 1
+        return i >= 0 and h < ranges[i][1]
+    return contains
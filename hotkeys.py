@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# ===========================
+#   HOT-KEY DETECTION
+# ===========================
+# Ring маршрутизує за partition key, тож увесь трафік популярного ключа йде на один shard.
+# Coordinator рахує частоту ключів space-saving sketch-ем (Metwally et al.): top-K з пам'яттю
+# O(capacity) незалежно від кількості ключів. Для кожного ключа sketch знає оцінку count
+# і максимальну похибку error; «гарячий» — ключ, у якого навіть count - error перевищує
+# HOT_KEY_MIN_SHARE трафіку (і HOT_KEY_MIN_COUNT). Раз на HOT_KEYS_WINDOW_S лічильники
+# діляться навпіл, тож ключ, що охолов, випадає з гарячих за кілька вікон.
+
+HOT_KEYS_CAPACITY = int(os.getenv("HOT_KEYS_CAPACITY", "256"))      # ключів у sketch-і
+HOT_KEY_MIN_SHARE = float(os.getenv("HOT_KEY_MIN_SHARE", "0.01"))   # частка всіх звернень
+HOT_KEY_MIN_COUNT = int(os.getenv("HOT_KEY_MIN_COUNT", "50"))
+HOT_KEYS_WINDOW_S = float(os.getenv("HOT_KEYS_WINDOW_S", "10"))     # період згасання лічильників
+HOT_KEYS_REFRESH_S = float(os.getenv("HOT_KEYS_REFRESH_S", "1"))    # як часто перераховуємо набір гарячих
+HOT_KEY_CACHE_TTL_S = float(os.getenv("HOT_KEY_CACHE_TTL_S", "1"))
+
+
+class SpaceSaving:
+    """
+    Space-saving top-K: {key: [count, error]}; новий ключ витісняє ключ з найменшим count.
+    Мінімум шукається в min-heap з ледачою інвалідацією: offer існуючого ключа heap не чіпає,
+    тож запис у heap може мати застарілий (менший) count — його оновлюють, лише коли він
+    опиняється на вершині. Витіснення — O(log capacity) амортизовано, а не O(capacity).
+    """
+
+    def __init__(self, capacity=HOT_KEYS_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}
+        self.total = 0
+        self._heap = []             # (count на момент запису, seq, key) — рівно один на ключ
+        self._seq = itertools.count()
+
+    def offer(self, key, amount=1):
+        self.total += amount
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += amount
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [amount, 0]
+            heapq.heappush(self._heap, (amount, next(self._seq), key))
+            return
+        # count-и між decay лише ростуть: застарілий запис на вершині оновлюємо і шукаємо далі
+        while True:
+            floor, _, victim = self._heap[0]
+            count = self.counters[victim][0]
+            if count == floor:
+                break
+            heapq.heapreplace(self._heap, (count, next(self._seq), victim))
+        # новий ключ успадковує count витісненого як похибку — справжній count не більший
+        del self.counters[victim]
+        self.counters[key] = [floor + amount, floor]
+        heapq.heapreplace(self._heap, (floor + amount, next(self._seq), key))
+
+    def decay(self):
+        self.total //= 2
+        for key in list(self.counters):
+            counter = self.counters[key]
+            counter[0] //= 2
+            counter[1] //= 2
+            if not counter[0]:
+                del self.counters[key]
+        self._heap = [(count, next(self._seq), key) for key, (count, _) in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, k=None):
+        """[(key, count, error)] за спаданням гарантованого count - error."""
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0] - kv[1][1], reverse=True)
+        return [(key, count, error) for key, (count, error) in ranked[:k]]
+
+
+class HotKeyTracker:
+    """
+    Потокобезпечна обгортка над SpaceSaving: record() на кожен запит, is_hot() — без локу
+    (набір гарячих ключів перераховується не частіше за refresh і підміняється цілим).
+    on_change(hot, previous) викликається, коли набір змінився (напр. pin/unpin у кеші).
+    """
+
+    def __init__(self, name, capacity=HOT_KEYS_CAPACITY, min_share=HOT_KEY_MIN_SHARE,
+                 min_count=HOT_KEY_MIN_COUNT, window=HOT_KEYS_WINDOW_S, refresh=HOT_KEYS_REFRESH_S,
+                 on_change=None):
+        self.name = name
+        self.min_share = min_share
+        self.min_count = min_count
+        self.window = window
+        self.refresh = refresh
+        self.on_change = on_change
+        self._sketch = SpaceSaving(capacity)
+        self._hot = frozenset()
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._decay_at = now + window
+        self._refresh_at = now + refresh
+
+    def record(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._sketch.offer(key)
+            if now < self._refresh_at:
+                return
+            self._refresh_at = now + self.refresh
+            previous, hot = self._hot, self._compute_hot()
+            self._hot = hot
+            if now >= self._decay_at:
+                self._decay_at = now + self.window
+                self._sketch.decay()
+            # під локом — щоб старіший набір не перезаписав новіший
+            if hot != previous and self.on_change is not None:
+                self.on_change(hot, previous)
+
+    def _compute_hot(self) -> frozenset:
+        threshold = max(self.min_count, self.min_share * self._sketch.total)
+        return frozenset(key for key, (count, error) in self._sketch.counters.items()
+                         if count - error >= threshold)
+
+    def is_hot(self, key) -> bool:
+        return key in self._hot
+
+    @property
+    def hot(self) -> frozenset:
+        return self._hot
+
+    def stats(self, top=20) -> dict:
+        with self._lock:
+            total = self._sketch.total
+            return {
+                "tracked": len(self._sketch.counters),
+                "capacity": self._sketch.capacity,
+                "total": total,
+                "hot": len(self._hot),
+                "top": [{"key": list(key), "count": count, "error": error,
+                         "share": round(count / total, 4) if total else 0.0, "hot": key in self._hot}
+                        for key, count, error in self._sketch.top(top)],
+            }
+
+
+class HotKeyCache:
+    """
+    Короткоживучий кеш відповідей лише для гарячих ключів (там, де немає ReadCache).
+    Запис через coordinator інвалідовує ключ; відповідь читання, що стартувало до
+    інвалідації, не кладеться (token з begin()). Застарілість обмежена ttl — на випадок
+    записів повз coordinator.
+    """
+
+    def __init__(self, ttl=HOT_KEY_CACHE_TTL_S):
+        self.ttl = ttl
+        self._entries = {}          # key -> (expires_at, status, payload)
+        self._invalidated = {}      # key -> seq останньої інвалідації (лише для гарячих ключів)
+        self._hot = frozenset()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(status, payload) або None."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def begin(self) -> int:
+        return self._seq
+
+    def put(self, key, token, status, payload):
+        with self._lock:
+            if key not in self._hot or self._invalidated.get(key, 0) > token:
+                return              # ключ охолов або за час читання його змінили
+            self._entries[key] = (time.monotonic() + self.ttl, status, payload)
+
+    def invalidate(self, key):
+        if key not in self._hot:
+            return
+        with self._lock:
+            self._seq += 1
+            self._invalidated[key] = self._seq
+            self._entries.pop(key, None)
+
+    def retain(self, keys):
+        """Кешуються лише ключі з keys (новий набір гарячих) — пам'ять обмежена розміром sketch-а."""
+        with self._lock:
+            self._hot = keys
+            self._entries = {k: v for k, v in self._entries.items() if k in keys}
+            self._invalidated = {k: v for k, v in self._invalidated.items() if k in keys}
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "ttl_s": self.ttl, "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0}
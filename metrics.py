@@ -0,0 +1,237 @@
+import bisect
+import itertools
+import sys
+import threading
+import time
+
+from flask import Response, g, request
+
+# ===========================
+#   PROMETHEUS METRICS
+# ===========================
+# Легкі Counter / Gauge / Histogram без зовнішніх залежностей + /metrics у text format 0.0.4.
+# На hot path — лише dict lookup і інкремент під локом метрики;
+# дорожчі значення (розміри таблиць, розподіл кільця) рахуються callback-ами під час scrape.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in itertools.chain(zip(names, values), extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}          # name -> metric; одна метрика на ім'я — один блок # TYPE
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Та сама метрика ще раз (повторний імпорт модуля, кілька екземплярів в одному процесі)
+        замінює попередню; те саме ім'я з іншим типом або labels — помилка.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and (existing.type, existing.labelnames) != (metric.type, metric.labelnames):
+                raise ValueError(f"metric {metric.name!r} already registered as {existing.type} "
+                                 f"with labels {existing.labelnames}")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(_Metric):
+    """Значення задається set() або рахується callback() під час scrape."""
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), callback=None, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.callback = callback    # () -> number або {labels tuple: number}
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                return
+            items = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield (f"{self.name}_bucket",
+                       _labels(self.labelnames, labels, [("le", _number(bound))]), cumulative)
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), count
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+# ===========================
+#   FLASK INSTRUMENTATION
+# ===========================
+http_requests = Counter("http_requests_total", "HTTP requests handled", ["route", "method", "status"])
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", ["route", "method"])
+
+
+def instrument_app(app):
+    """Лічильник і гістограма latency на кожен route (шаблон URL, а не конкретний шлях)."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    def _observe(status):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_latency.observe(time.perf_counter() - start, route, request.method)
+            http_requests.inc(route, request.method, status)
+
+    @app.after_request
+    def _record(response):
+        _observe(str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _record_exception(exc):
+        # виняток, який обробляє не Flask (напр. error handler connexion → 503)
+        if exc is not None:
+            _observe("exception")
+
+
+def metrics_response():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ===========================
+#   MEMORY ESTIMATE
+# ===========================
+def deep_size(obj) -> int:
+    """Приблизний розмір об'єкта з вкладеними dict/list/tuple (без урахування спільних об'єктів)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(v) for v in obj)
+    return size
+
+
+def approx_table_bytes(table: dict, sample=64) -> int:
+    """
+    Оцінка пам'яті таблиці {key: value}: розмір самого dict + середній розмір
+    запису на вибірці з перших sample items × кількість items (O(sample), а не O(n)).
+    """
+    if hasattr(table, "memory_bytes"):          # compact-таблиця рахує себе сама
+        return table.memory_bytes()
+    n = len(table)
+    if n == 0:
+        return sys.getsizeof(table)
+    picked = list(itertools.islice(table.items(), sample))
+    per_item = sum(deep_size(k) + deep_size(v) for k, v in picked) / len(picked)
+    return int(sys.getsizeof(table) + per_item * n)
+
+
+def table_gauges(data_store: dict):
+    """Gauge-і table_items і table_memory_bytes для data_store {table: {key: value}}."""
+    Gauge("table_items", "Items per table", ["table"],
+          callback=lambda: {(t,): len(items) for t, items in list(data_store.items())})
+    Gauge("table_memory_bytes", "Approximate memory per table (sampled)", ["table"],
+          callback=lambda: {(t,): approx_table_bytes(items) for t, items in list(data_store.items())})
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import http_pool
+from hashing import moved_ranges
+
+# ===========================
+#   ONLINE REBALANCE
+# ===========================
+# Додавання / видалення shard-а без зупинки:
+#   1. рахуємо діапазони хешів, які змінюють власника (moved_ranges)
+#   2. поки йде міграція — нові записи йдуть новому власнику,
+#      читання спершу у нового, при промаху — у старого (dual-read),
+#      видалення — в обох (і запам'ятовуємо, щоб повторити після копіювання)
+#   3. стрімимо з old-лідерів лише ключі з цих діапазонів → bulk import у new-лідерів
+#   4. атомарно перемикаємо кільце і чистимо перенесені ключі на старих лідерах
+
+IMPORT_CHUNK = 1000             # рядків NDJSON на один /migrate/import
+
+
+class Rebalancer:
+    def __init__(self, leader_url):
+        self.leader_url = leader_url    # node -> base URL лідера цього node
+        # (old_ring, new_ring) поточної міграції або None; обидва кільця ставляться і
+        # знімаються одним присвоєнням, тож читач без локу не побачить лише одне з них
+        self.rings = None
+        self.status = {"state": "idle"}
+        self._deleted = []              # (new_owner, table, pkey, skey), видалені під час міграції
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.rings is not None
+
+    def owners(self, ring, route_key: str):
+        """
+        (owner, previous_owner): куди писати/читати зараз і, якщо ключ
+        саме переїжджає, — де він міг лишитися (інакше previous_owner = None).
+        """
+        return self.owners_many(ring, [route_key])[0]
+
+    def owners_many(self, ring, route_keys) -> list:
+        """owners() для батчу ключів — з одного знімка кілець: [(owner, previous_owner), ...]."""
+        rings = self.rings
+        if rings is None:
+            return [(owner, None) for owner in ring.get_nodes(route_keys)]
+        old_ring, new_ring = rings
+        route_keys = list(route_keys)
+        return [(owner, previous if previous != owner else None)
+                for owner, previous in zip(new_ring.get_nodes(route_keys), old_ring.get_nodes(route_keys))]
+
+    def record_delete(self, owner, table, pkey, skey):
+        with self._lock:
+            if self.active:
+                self._deleted.append((owner, table, pkey, skey))
+
+    def start(self, ring, new_ring, on_switch) -> bool:
+        """Запускає міграцію у фоні; on_switch(new_ring) атомарно ставить нове кільце."""
+        with self._lock:
+            if self.active:
+                return False
+            self.rings = (ring, new_ring)
+            self._deleted = []
+            self.status = {"state": "running", "started_at": time.time(), "moved_items": 0}
+        threading.Thread(target=self._run, args=(on_switch,), daemon=True).start()
+        return True
+
+    def _run(self, on_switch):
+        old_ring, new_ring = self.rings
+        try:
+            moves = moved_ranges(old_ring, new_ring)
+            self.status["ranges"] = sum(len(r) for r in moves.values())
+
+            for (old, new), ranges in moves.items():
+                self._copy(old, new, ranges)
+
+            # видалення, які могли «воскреснути» через копіювання — повторюємо
+            with self._lock:
+                deleted, self._deleted = self._deleted, []
+            for owner, table, pkey, skey in deleted:
+                http_pool.delete(f"{self.leader_url(owner)}/delete/{table}/{pkey}/{skey}")
+
+            on_switch(new_ring)
+            with self._lock:
+                self.rings = None
+
+            # ключі вже живуть у нових власників — прибираємо копії у старих
+            # (shard, який виводимо з кільця, не чистимо — його просто вимикають)
+            for (old, new), ranges in moves.items():
+                if old not in new_ring.weights:
+                    continue
+                try:
+                    http_pool.post(f"{self.leader_url(old)}/migrate/purge", json={"ranges": ranges})
+                except Exception as e:
+                    print(f"[Rebalance] purge on {old} failed: {e}")
+
+            self.status.update(state="done", finished_at=time.time())
+        except Exception as e:
+            with self._lock:
+                self.rings = None
+            self.status.update(state="failed", error=str(e), finished_at=time.time())
+            print(f"[Rebalance] failed: {e}")
+
+    def _copy(self, old, new, ranges):
+        """Стрімить ключі з діапазонів ranges від лідера old до лідера new."""
+        src, dst = self.leader_url(old), self.leader_url(new)
+        chunk = []
+        with http_pool.post(f"{src}/migrate/export", json={"ranges": ranges},
+                            stream=True, timeout=(http_pool.CONNECT_TIMEOUT, None)) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk.append(line)
+                if len(chunk) >= IMPORT_CHUNK:
+                    self._import(dst, chunk)
+                    chunk = []
+        if chunk:
+            self._import(dst, chunk)
+
+    def _import(self, dst, lines):
+        r = http_pool.post(f"{dst}/migrate/import", data=b"\n".join(lines) + b"\n",
+                           headers={"Content-Type": "application/x-ndjson"})
+        r.raise_for_status()
+        self.status["moved_items"] += r.json().get("imported", 0)
+
+
+def merge_query_pages(primary: dict, secondary: dict, limit: int) -> dict:
+    """
+    Зливає сторінки /query з нового (primary) і старого (secondary) власника партиції
+    під час міграції: за однакового sort key перемагає primary.
+    """
+    items = {it["sort_key"]: it for it in secondary.get("items", [])}
+    items.update({it["sort_key"]: it for it in primary.get("items", [])})
+    merged = sorted(items.values(), key=lambda it: it["sort_key"])
+    more = (len(merged) > limit or primary.get("last_evaluated_key") is not None
+            or secondary.get("last_evaluated_key") is not None)
+    merged = merged[:limit]
+    return {"items": merged, "last_evaluated_key": merged[-1]["sort_key"] if merged and more else None}
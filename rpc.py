@@ -0,0 +1,282 @@
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import Counter, Histogram
+
+# ===========================
+#   INTERNAL RPC TRANSPORT
+# ===========================
+# Альтернатива HTTP для item-операцій coordinator → shard (create / read / delete / exists):
+#   - persistent TCP-з'єднання, без HTTP-парсингу, routing-у і WSGI на кожен запит
+#   - кадри з префіксом довжини; кожен запит має request id, тож відповіді можуть іти
+#     не по черзі, а одне з'єднання несе тисячі запитів у польоті (pipelining)
+# Формат (big-endian):
+#   запит:     u32 довжина | u32 id | u8 довжина op | op | JSON-аргументи
+#   відповідь: u32 довжина | u32 id | u16 статус | i64 applied offset (-1 — немає) | JSON-тіло
+# Тіло відповіді — той самий JSON, що й у HTTP-відповіді, тож coordinator віддає його як є.
+# Shard слухає RPC на HTTP-порт + RPC_PORT_OFFSET (RPC_ENABLED=1).
+
+RPC_ENABLED = os.getenv("RPC_ENABLED", "0") == "1"
+RPC_PORT_OFFSET = int(os.getenv("RPC_PORT_OFFSET", "1000"))
+RPC_CONNECTIONS = int(os.getenv("RPC_CONNECTIONS", "2"))        # persistent з'єднань на один shard
+RPC_WORKERS = int(os.getenv("RPC_WORKERS", "32"))               # потоки для блокуючих op (запис у WAL)
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "1"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+MAX_FRAME_BYTES = 64 << 20
+
+JSON = "application/json"
+
+_LENGTH = struct.Struct(">I")
+_REQUEST = struct.Struct(">IB")         # id, довжина op
+_RESPONSE = struct.Struct(">IHq")       # id, статус, applied offset
+
+rpc_requests = Counter("rpc_requests_total", "Outbound RPC requests per upstream shard/replica",
+                       ["upstream", "op", "status"])
+rpc_latency = Histogram("rpc_request_duration_seconds", "Outbound RPC latency", ["upstream", "op"])
+rpc_served = Counter("rpc_served_total", "RPC requests served by this process", ["op", "status"])
+
+
+def _read_frame(reader):
+    """Один кадр без префікса довжини; None — з'єднання закрите між кадрами."""
+    head = reader.read(_LENGTH.size)
+    if not head:
+        return None
+    if len(head) < _LENGTH.size:
+        raise OSError("connection closed mid-frame")
+    (length,) = _LENGTH.unpack(head)
+    if length > MAX_FRAME_BYTES:
+        raise OSError(f"frame of {length} bytes exceeds limit")
+    frame = reader.read(length)
+    if len(frame) < length:
+        raise OSError("connection closed mid-frame")
+    return frame
+
+
+def rpc_address(endpoint: str):
+    """HTTP URL shard-а → (host, RPC-порт)."""
+    url = urlsplit(endpoint)
+    return url.hostname, (url.port or 80) + RPC_PORT_OFFSET
+
+
+# ===========================
+#   SERVER (shard / leader / follower)
+# ===========================
+class RpcServer:
+    """
+    handlers: {op: fn(**args) -> (body, status)}; body — dict або вже готовий JSON (bytes).
+    Op-и з blocking виконуються в пулі потоків (напр. create, що чекає durable commit WAL),
+    решта — одразу в потоці з'єднання: відповіді на читання йдуть без передачі між потоками.
+    applied_offset() береться ДО виконання op — як X-Applied-Offset в HTTP-відповідях.
+    """
+
+    def __init__(self, handlers: dict, blocking=(), applied_offset=None, workers=RPC_WORKERS):
+        self.handlers = handlers
+        self.blocking = set(blocking)
+        self.applied_offset = applied_offset
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rpc")
+
+    def start(self, port: int, host="0.0.0.0"):
+        """Слухає port у фоновому потоці (bind — одразу, щоб зайнятий порт був помилкою старту)."""
+        sock = socket.create_server((host, port))
+        threading.Thread(target=self._accept_loop, args=(sock,), daemon=True).start()
+        print(f"[RPC] listening on {host}:{port}")
+
+    def _accept_loop(self, sock):
+        while True:
+            conn, _ = sock.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        send_lock = threading.Lock()
+        try:
+            while True:
+                frame = _read_frame(reader)
+                if frame is None:
+                    break
+                request_id, op_len = _REQUEST.unpack_from(frame)
+                op = frame[_REQUEST.size:_REQUEST.size + op_len].decode()
+                args = json.loads(frame[_REQUEST.size + op_len:] or b"{}")
+                if op in self.blocking:
+                    self._pool.submit(self._handle, conn, send_lock, request_id, op, args)
+                else:
+                    self._handle(conn, send_lock, request_id, op, args)
+        except (OSError, ValueError) as e:
+            print(f"[RPC] connection dropped: {e}")
+        finally:
+            conn.close()
+
+    def _handle(self, conn, send_lock, request_id, op, args):
+        offset = self.applied_offset() if self.applied_offset is not None else -1
+        handler = self.handlers.get(op)
+        try:
+            if handler is None:
+                body, status = {"error": f"Unknown op {op}"}, 400
+            else:
+                body, status = handler(**args)
+        except Exception as e:
+            body, status = {"error": f"{type(e).__name__}: {e}"}, 500
+        rpc_served.inc(op, str(status))
+
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        frame = (_LENGTH.pack(_RESPONSE.size + len(payload)) + _RESPONSE.pack(request_id, status, offset)
+                 + payload)
+        try:
+            with send_lock:
+                conn.sendall(frame)
+        except OSError:
+            pass                    # клієнт уже пішов — відповідати нікому
+
+
+# ===========================
+#   CLIENT (coordinator)
+# ===========================
+class RpcError(requests.ConnectionError):
+    """Shard недоступний по RPC — для coordinator-а (503, breaker, hedging) те саме, що HTTP-помилка."""
+
+
+class RpcTimeout(RpcError, requests.Timeout):
+    pass
+
+
+class RpcResponse:
+    """Відповідь у формі requests.Response: балансувальник, кеш і wire.passthrough працюють без змін."""
+    __slots__ = ("status_code", "content", "headers")
+
+    def __init__(self, status_code: int, content: bytes, offset: int):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"Content-Type": JSON}
+        if offset >= 0:
+            self.headers["X-Applied-Offset"] = str(offset)
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class _Connection:
+    """Одне TCP-з'єднання: запити пишуться під локом, окремий потік розбирає відповіді за id."""
+
+    def __init__(self, address):
+        try:
+            self.sock = socket.create_connection(address, timeout=CONNECT_TIMEOUT)
+        except OSError as e:
+            raise RpcError(f"RPC connect to {address[0]}:{address[1]} failed: {e}") from e
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.address = address
+        self.closed = False
+        self.pending = {}           # request id -> Future
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def send(self, op: str, args: dict):
+        op = op.encode()
+        payload = json.dumps(args).encode()
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self.pending[request_id] = future
+            try:
+                self.sock.sendall(_LENGTH.pack(_REQUEST.size + len(op) + len(payload))
+                                  + _REQUEST.pack(request_id, len(op)) + op + payload)
+            except OSError as e:
+                self.pending.pop(request_id, None)
+                self.close()
+                raise RpcError(f"RPC send to {self.address[0]}:{self.address[1]} failed: {e}") from e
+        return request_id, future
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _read_loop(self):
+        reader = self.sock.makefile("rb")
+        error = "connection closed"
+        try:
+            while True:
+                frame = _read_frame(reader)
+                if frame is None:
+                    break
+                request_id, status, offset = _RESPONSE.unpack_from(frame)
+                future = self.pending.pop(request_id, None)
+                if future is not None:
+                    future.set_result(RpcResponse(status, frame[_RESPONSE.size:], offset))
+        except (OSError, struct.error) as e:
+            error = str(e)
+        finally:
+            self.closed = True
+            self.sock.close()
+            # запити в польоті вже не отримають відповіді
+            for request_id in list(self.pending):
+                future = self.pending.pop(request_id, None)
+                if future is not None:
+                    future.set_exception(RpcError(f"RPC {self.address[0]}:{self.address[1]}: {error}"))
+
+
+class RpcClient:
+    """RPC_CONNECTIONS persistent з'єднань до одного shard-а (round-robin); обірване — перевідкривається."""
+
+    def __init__(self, address, connections=RPC_CONNECTIONS):
+        self.address = address
+        self._conns = [None] * max(1, connections)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> _Connection:
+        i = next(self._next) % len(self._conns)
+        conn = self._conns[i]
+        if conn is None or conn.closed:
+            with self._lock:
+                conn = self._conns[i]
+                if conn is None or conn.closed:
+                    conn = self._conns[i] = _Connection(self.address)
+        return conn
+
+    def request(self, op: str, args: dict, timeout=READ_TIMEOUT) -> RpcResponse:
+        conn = self._connection()
+        request_id, future = conn.send(op, args)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            conn.pending.pop(request_id, None)
+            raise RpcTimeout(f"RPC {op} to {self.address[0]}:{self.address[1]} timed out after {timeout}s")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client(endpoint: str) -> RpcClient:
+    rpc_client = _clients.get(endpoint)
+    if rpc_client is None:
+        with _clients_lock:
+            rpc_client = _clients.setdefault(endpoint, RpcClient(rpc_address(endpoint)))
+    return rpc_client
+
+
+def call(endpoint: str, op: str, **args) -> RpcResponse:
+    """Виконує op на shard-і за його HTTP URL (endpoint); відповідь — як від http_pool."""
+    start = time.perf_counter()
+    try:
+        r = client(endpoint).request(op, args)
+    except RpcError:
+        rpc_requests.inc(endpoint, op, "error")
+        raise
+    rpc_latency.observe(time.perf_counter() - start, endpoint, op)
+    rpc_requests.inc(endpoint, op, str(r.status_code))
+    return r
@@ -1,7 +1,80 @@
-from flask import Flask, request, jsonify
+import bisect
+import json
+import os
+import threading
+from flask import Flask, Response, request, jsonify
+from hashing import range_filter
+import bloom
+import compact
+import metrics
+import rpc
+import scan
+import storage
+import wire
 
 app = Flask(__name__)
-data_store = {}  # {table_name: { (partition_key, sort_key): value }}
+
+# STORAGE_ENGINE=bitcask — append-only лог у DATA_DIR (переживає рестарт, значення не тримаються в RAM);
+# за замовчуванням — як і раніше, усе в пам'яті
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "memory")
+engine = storage.open_engine(
+    STORAGE_ENGINE,
+    os.getenv("DATA_DIR", "data"),
+    max_file_bytes=int(os.getenv("STORAGE_MAX_FILE_BYTES", str(64 << 20))),
+    sync=os.getenv("STORAGE_SYNC", "0") == "1",
+    merge_interval=float(os.getenv("STORAGE_MERGE_INTERVAL_S", "60")),
+)
+sort_index = {}  # {table_name: { partition_key: [sorted sort_keys] }}
+
+metrics.instrument_app(app)
+if isinstance(engine, storage.MemoryEngine):
+    metrics.table_gauges(engine.data)
+else:
+    metrics.Gauge("table_items", "Items per table", ["table"],
+                  callback=lambda: {(t,): engine.count(t) for t in engine.tables()})
+    for stat in ("disk_bytes", "dead_bytes", "files", "merges"):
+        metrics.Gauge(f"storage_{stat}", f"Storage engine {stat}", callback=lambda stat=stat: engine.stats()[stat])
+
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 1000
+
+# Bloom filter-и таблиць для coordinator-а (bloom.py); будуються на першому GET /bloom
+bloom_filters = bloom.TableFilters(engine.tables, engine.keys)
+for stat in ("bytes", "estimated_fpr"):
+    metrics.Gauge(f"bloom_filter_{stat}", f"Bloom filter {stat} per table", ["table"],
+                  callback=lambda stat=stat: {(t,): st[stat] for t, st in bloom_filters.stats()["tables"].items()})
+
+# кожна вставка / видалення проходить через sort_index — там же оновлюємо і фільтр.
+# Flask обробляє запити в кількох потоках: зміни індексу — під локом (читачі /query — без нього)
+index_lock = threading.Lock()
+
+def index_add(table, pkey, skey):
+    with index_lock:
+        skeys = sort_index.setdefault(table, {}).setdefault(pkey, [])
+        bisect.insort(skeys, skey)
+    bloom_filters.add(table, pkey, skey)
+
+def index_remove(table, pkey, skey):
+    with index_lock:
+        partitions = sort_index.get(table, {})
+        skeys = partitions.get(pkey, [])
+        i = bisect.bisect_left(skeys, skey)
+        if i < len(skeys) and skeys[i] == skey:
+            del skeys[i]
+        if not skeys:
+            partitions.pop(pkey, None)
+    bloom_filters.remove(table, pkey, skey)
+
+def build_index():
+    """Після старту з диска відновлюємо sort_index з ключів (значення не читаються)."""
+    for table in engine.tables():
+        partitions = sort_index.setdefault(table, {})
+        for pkey, skey in engine.keys(table):
+            partitions.setdefault(pkey, []).append(skey)
+        for skeys in partitions.values():
+            skeys.sort()
+
+build_index()
 
 @app.route("/register_table", methods=["POST"])
 def register_table():
@@ -9,56 +82,250 @@ def register_table():
     table_name = body.get("table_name")
     if not table_name:
         return jsonify({"error": "Missing table_name"}), 400
-    if table_name in data_store:
+    if not engine.create_table(table_name):
         return jsonify({"error": "Table already exists"}), 400
-    data_store[table_name] = {}
+    sort_index[table_name] = {}
     return jsonify({"status": "registered", "table": table_name}), 201
 
+# ===========================
+#   ITEM OPERATIONS (HTTP + RPC)
+# ===========================
+# (body, status) — спільні для HTTP-маршрутів і RPC-сервера (rpc.py)
+def create_item(table_name, partition_key, sort_key, value=None):
+    if not engine.has_table(table_name):
+        return {"error": f"Table {table_name} not found"}, 404
+    key = (partition_key, sort_key)
+    if engine.contains(table_name, key):
+        return {"error": "Item already exists"}, 400
+    engine.put(table_name, key, value)
+    index_add(table_name, partition_key, sort_key)
+    return {"status": "created"}, 201
+
+def read_item(table_name, partition_key, sort_key):
+    if not engine.has_table(table_name):
+        return {"error": "Table not found"}, 404
+    key = (partition_key, sort_key)
+    raw = engine.get_raw(table_name, key)
+    if raw is None:
+        return {"error": "Item not found"}, 404
+    # значення вже збережене як JSON — вставляємо його у відповідь без json.loads/dumps
+    return compact.json_with_raw({"table": table_name, "key": key}, "value", raw), 200
+
+def delete_item(table_name, partition_key, sort_key):
+    if not engine.has_table(table_name):
+        return {"error": "Table not found"}, 404
+    if engine.delete(table_name, (partition_key, sort_key)):
+        index_remove(table_name, partition_key, sort_key)
+        return {"status": "deleted"}, 200
+    return {"error": "Item not found"}, 404
+
+def item_exists(table_name, partition_key, sort_key):
+    return {"exists": engine.contains(table_name, (partition_key, sort_key))}, 200
+
+rpc_server = rpc.RpcServer({"create": create_item, "read": read_item,
+                            "delete": delete_item, "exists": item_exists})
+
 @app.route("/create", methods=["POST"])
 def create():
     body = request.json
-    table = body.get("table_name")
-    pkey = body.get("partition_key")
-    skey = body.get("sort_key")
-    value = body.get("value")
+    return wire.json_response(*create_item(body.get("table_name"), body.get("partition_key"),
+                                           body.get("sort_key"), body.get("value")))
 
-    if table not in data_store:
-        return jsonify({"error": f"Table {table} not found"}), 404
+@app.route("/batch_create", methods=["POST"])
+def batch_create():
+    """Створює кілька items за один запит; статус — окремо для кожного item."""
+    results = []
+    for item in request.json.get("items", []):
+        table = item.get("table_name")
+        key = (item.get("partition_key"), item.get("sort_key"))
+        if not engine.has_table(table):
+            results.append({"status": 404, "error": f"Table {table} not found"})
+        elif engine.contains(table, key):
+            results.append({"status": 400, "error": "Item already exists"})
+        else:
+            engine.put(table, key, item.get("value"))
+            index_add(table, *key)
+            results.append({"status": 201})
+    return wire.respond({"results": results})
 
-    key = (pkey, skey)
-    if key in data_store[table]:
-        return jsonify({"error": "Item already exists"}), 400
+@app.route("/batch_read", methods=["POST"])
+def batch_read():
+    """Читає кілька items за один запит; для відсутніх — found: false."""
+    keys = [(item.get("table_name"), (item.get("partition_key"), item.get("sort_key")))
+            for item in request.json.get("keys", [])]
+    if wire.wants_msgpack():
+        results = []
+        for table, key in keys:
+            try:
+                results.append({"found": True, "value": engine.get(table, key)})
+            except KeyError:
+                results.append({"found": False})
+        return wire.respond({"results": results})
 
-    data_store[table][key] = value
-    return jsonify({"status": "created"}), 201
+    # JSON: збережені значення вставляються як є
+    results = []
+    for table, key in keys:
+        raw = engine.get_raw(table, key)
+        results.append(b'{"found":false}' if raw is None else compact.json_with_raw({"found": True}, "value", raw))
+    return Response(b'{"results":[' + b",".join(results) + b"]}", mimetype="application/json")
 
 @app.route("/read/<table>/<partition_key>/<sort_key>", methods=["GET"])
 def read(table, partition_key, sort_key):
-    if table not in data_store:
-        return jsonify({"error": "Table not found"}), 404
-    key = (partition_key, sort_key)
-    if key not in data_store[table]:
-        return jsonify({"error": "Item not found"}), 404
-    return jsonify({"table": table, "key": key, "value": data_store[table][key]}), 200
+    return wire.json_response(*read_item(table, partition_key, sort_key))
 
 @app.route("/delete/<table>/<partition_key>/<sort_key>", methods=["DELETE"])
 def delete(table, partition_key, sort_key):
-    if table not in data_store:
+    return wire.json_response(*delete_item(table, partition_key, sort_key))
+
+@app.route("/query/<table>/<partition_key>", methods=["GET"])
+def query(table, partition_key):
+    """
+    Діапазонний запит по партиції за зростанням sort key:
+    begins_with, start/end (between, включно), limit, exclusive_start_key (пагінація).
+    """
+    if not engine.has_table(table):
         return jsonify({"error": "Table not found"}), 404
-    key = (partition_key, sort_key)
-    if key in data_store[table]:
-        del data_store[table][key]
-        return jsonify({"status": "deleted"}), 200
-    return jsonify({"error": "Item not found"}), 404
+    skeys = sort_index[table].get(partition_key, [])
+    lo, hi = 0, len(skeys)
+
+    begins_with = request.args.get("begins_with")
+    if begins_with:
+        lo = bisect.bisect_left(skeys, begins_with)
+        hi = bisect.bisect_left(skeys, begins_with[:-1] + chr(ord(begins_with[-1]) + 1))
+    if "start" in request.args:
+        lo = max(lo, bisect.bisect_left(skeys, request.args["start"]))
+    if "end" in request.args:
+        hi = min(hi, bisect.bisect_right(skeys, request.args["end"]))
+    if "exclusive_start_key" in request.args:
+        lo = max(lo, bisect.bisect_right(skeys, request.args["exclusive_start_key"]))
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", QUERY_DEFAULT_LIMIT)), QUERY_MAX_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    page = skeys[lo:min(hi, lo + limit)]
+    items = []
+    for skey in page:
+        try:
+            items.append({"sort_key": skey, "value": engine.get(table, (partition_key, skey))})
+        except KeyError:
+            continue        # видалено після того, як сторінку взято з індексу
+    last_key = page[-1] if page and lo + len(page) < hi else None
+    return wire.respond({"items": items, "last_evaluated_key": last_key})
 
 @app.route("/exists/<table>/<partition_key>/<sort_key>", methods=["GET"])
 def exists(table, partition_key, sort_key):
-    if table not in data_store:
-        return jsonify({"exists": False}), 200
-    key = (partition_key, sort_key)
-    return jsonify({"exists": key in data_store[table]}), 200
+    return wire.json_response(*item_exists(table, partition_key, sort_key))
+
+@app.route("/scan/<table>", methods=["GET"])
+def scan_table(table):
+    """Один сегмент паралельного скану таблиці (NDJSON з курсорами, див. scan.py)."""
+    if not engine.has_table(table):
+        return jsonify({"error": "Table not found"}), 404
+    try:
+        segment, total, after = scan.parse_segment_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    keys = scan.scan_keys(sort_index.get(table, {}), segment, total, after)
+    return Response(scan.ndjson_segment(keys, lambda key: engine.get_raw(table, key)), mimetype=scan.NDJSON)
+
+# ===========================
+#   MIGRATION (online rebalance)
+# ===========================
+@app.route("/migrate/export", methods=["POST"])
+def migrate_export():
+    """
+    Стрімить (NDJSON) усі items, чий route key (table:pkey) потрапляє в ranges.
+    Першими йдуть рядки create_table, щоб новий shard мав усі таблиці.
+    """
+    contains = range_filter(request.json["ranges"])
+
+    def generate():
+        for table in engine.tables():
+            yield json.dumps({"op": "create_table", "table": table}) + "\n"
+        for table in engine.tables():
+            for (pkey, skey) in [k for k in engine.keys(table) if contains(f"{table}:{k[0]}")]:
+                try:
+                    value = engine.get(table, (pkey, skey))
+                except KeyError:
+                    continue
+                yield json.dumps({"table": table, "pkey": pkey, "skey": skey, "value": value}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route("/migrate/import", methods=["POST"])
+def migrate_import():
+    """Bulk import з /migrate/export; вже наявні items не перезаписуються (вони новіші)."""
+    imported = 0
+    for line in request.get_data().splitlines():
+        if not line:
+            continue
+        rec = json.loads(line)
+        table = rec["table"]
+        if rec.get("op") == "create_table":
+            engine.create_table(table)
+            sort_index.setdefault(table, {})
+            continue
+        key = (rec["pkey"], rec["skey"])
+        engine.create_table(table)
+        if not engine.contains(table, key):
+            engine.put(table, key, rec["value"])
+            index_add(table, *key)
+            imported += 1
+    return jsonify({"imported": imported}), 200
+
+@app.route("/migrate/purge", methods=["POST"])
+def migrate_purge():
+    """Видаляє items з ranges після того, як вони переїхали на інший shard."""
+    contains = range_filter(request.json["ranges"])
+    purged = 0
+    for table in engine.tables():
+        for (pkey, skey) in [k for k in engine.keys(table) if contains(f"{table}:{k[0]}")]:
+            if engine.delete(table, (pkey, skey)):
+                index_remove(table, pkey, skey)
+                purged += 1
+    return jsonify({"purged": purged}), 200
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.metrics_response()
+
+@app.route("/bloom", methods=["GET"])
+def bloom_export():
+    """Bloom filter-и всіх таблиць у бінарному форматі bloom.py; If-None-Match → 304, якщо нічого не змінилось."""
+    etag = bloom_filters.etag           # до encode: зміни під час нього дадуть новий ETag наступного разу
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+    return Response(bloom_filters.encode(), mimetype=bloom.BINARY, headers={"ETag": etag})
+
+@app.route("/bloom/stats", methods=["GET"])
+def bloom_stats():
+    return jsonify(bloom_filters.stats()), 200
+
+@app.route("/storage", methods=["GET"])
+def storage_stats():
+    return jsonify(engine.stats()), 200
+
+@app.route("/memory", methods=["GET"])
+def memory():
+    """Скільки пам'яті займає кожна таблиця (STORE_MODE=compact — точний розклад)."""
+    return jsonify(engine.memory_report()), 200
+
+@app.route("/storage/merge", methods=["POST"])
+def storage_merge():
+    """Примусовий merge (без очікування фонового порогу мертвих байтів)."""
+    if not hasattr(engine, "merge"):
+        return jsonify({"error": "Engine has no merge"}), 400
+    return jsonify({"merged": engine.merge(), **engine.stats()}), 200
 
 if __name__ == "__main__":
+    import atexit
+    import signal
     import sys
+    # docker stop шле SIGTERM: виходимо через sys.exit, щоб atexit встиг записати hint і закрити файли
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    atexit.register(engine.close)
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5001
+    if rpc.RPC_ENABLED:
+        rpc_server.start(port + rpc.RPC_PORT_OFFSET, host="127.0.0.1")
     app.run(port=port)
@@ -0,0 +1,488 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+import compact
+import metrics
+
+# ===========================
+#   STORAGE ENGINES FOR shard.py
+# ===========================
+# Однаковий інтерфейс для двох рушіїв:
+#   MemoryEngine  — як і раніше, усе в dict (за замовчуванням)
+#   BitcaskEngine — append-only лог на диску + keydir у пам'яті (лише ключі й позиції),
+#                   значення читаються ліниво з mmap-ів; hint-файли дозволяють
+#                   стартувати без читання значень; фоновий merge прибирає мертві записи.
+#
+# Ключ item-а — (partition_key, sort_key), як і в data_store.
+
+
+class MemoryEngine:
+    def __init__(self):
+        self.data = {}          # {table: {(pkey, skey): value}}
+
+    def create_table(self, table) -> bool:
+        if table in self.data:
+            return False
+        self.data[table] = compact.new_table()
+        return True
+
+    def tables(self) -> list:
+        return list(self.data)
+
+    def has_table(self, table) -> bool:
+        return table in self.data
+
+    def contains(self, table, key) -> bool:
+        return key in self.data.get(table, ())
+
+    def get(self, table, key):
+        """Значення item-а; KeyError, якщо його немає."""
+        return self.data[table][key]
+
+    def get_raw(self, table, key):
+        """Значення як JSON bytes або None (у STORE_MODE=compact — без серіалізації)."""
+        return compact.get_raw(self.data.get(table, {}), key)
+
+    def put(self, table, key, value):
+        self.create_table(table)
+        self.data[table][key] = value
+
+    def delete(self, table, key) -> bool:
+        return self.data.get(table, {}).pop(key, _MISSING) is not _MISSING
+
+    def keys(self, table) -> list:
+        return list(self.data.get(table, ()))
+
+    def items(self, table):
+        return list(self.data.get(table, {}).items())
+
+    def count(self, table) -> int:
+        return len(self.data.get(table, ()))
+
+    def memory_report(self) -> dict:
+        return compact.memory_report(self.data)
+
+    def stats(self) -> dict:
+        return {"engine": "memory", "tables": len(self.data), "keys": sum(len(t) for t in self.data.values())}
+
+    def close(self):
+        pass
+
+
+_MISSING = object()
+
+# ---------- формат запису ----------
+# header: crc32 | key_len | value_len | flags, далі key bytes, value bytes.
+# crc рахується по всьому, що після нього (щоб відрізати обірваний хвіст після краху).
+HEADER = struct.Struct("<IIIB")
+# hint: key_len | value_len | value_pos | flags, далі key bytes
+HINT = struct.Struct("<IIQB")
+
+FLAG_PUT, FLAG_DELETE, FLAG_TABLE = 0, 1, 2
+
+FILE_RE = re.compile(r"^(data|merge)-(\d{10})\.(log|hint)$")
+
+
+def _encode_key(table, key=None) -> bytes:
+    return json.dumps([table] if key is None else [table, key[0], key[1]],
+                      separators=(",", ":")).encode()
+
+
+def _encode_record(key_bytes: bytes, value_bytes: bytes, flags: int) -> bytes:
+    body = HEADER.pack(0, len(key_bytes), len(value_bytes), flags)[4:] + key_bytes + value_bytes
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+class _Segment:
+    """Один файл логу. Запечатані файли читаються через mmap, активний — через pread."""
+
+    def __init__(self, file_id, path):
+        self.file_id = file_id
+        self.path = path
+        self.hint_path = path[:-len(".log")] + ".hint"
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.dead = 0
+        self.closed = False
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        self._mm = None
+
+    def seal(self):
+        if self.size:
+            self._mm = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+
+    def read(self, pos, length) -> bytes:
+        if self._mm is not None:
+            return self._mm[pos:pos + length]
+        return os.pread(self._fd, length, pos)
+
+    def scan(self):
+        """
+        (key_bytes, value_pos, value_len, flags, record_size) для кожного цілого запису.
+        Зупиняється на першому пошкодженому/обірваному записі; self.size — кінець валідних даних.
+        """
+        mm = self._mm or (mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ) if self.size else None)
+        pos, end = 0, self.size
+        while pos + HEADER.size <= end:
+            crc, key_len, value_len, flags = HEADER.unpack_from(mm, pos)
+            record_size = HEADER.size + key_len + value_len
+            if pos + record_size > end or zlib.crc32(mm[pos + 4:pos + record_size]) != crc:
+                break
+            key_pos = pos + HEADER.size
+            yield mm[key_pos:key_pos + key_len], key_pos + key_len, value_len, flags, record_size
+            pos += record_size
+        self.size = pos
+
+    def load_hint(self):
+        with open(self.hint_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        pos = 0
+        while pos < len(mm):
+            key_len, value_len, value_pos, flags = HINT.unpack_from(mm, pos)
+            pos += HINT.size
+            yield mm[pos:pos + key_len], value_pos, value_len, flags, HEADER.size + key_len + value_len
+            pos += key_len
+        mm.close()
+
+    def close(self):
+        self.closed = True
+        if self._mm is not None:
+            self._mm.close()
+        os.close(self._fd)
+
+
+def _write_hint(path, entries):
+    """entries — [(key_bytes, value_pos, value_len, flags)]; пишемо через tmp + rename."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for key_bytes, value_pos, value_len, flags in entries:
+            f.write(HINT.pack(len(key_bytes), value_len, value_pos, flags))
+            f.write(key_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class BitcaskEngine:
+    """
+    Bitcask-подібний рушій: data-NNNNNNNNNN.log — append-only файли, останній з них активний.
+    keydir: {table: {(pkey, skey): (file_id, value_pos, value_len, record_size)}}.
+
+    Merge переписує живі записи всіх запечатаних файлів у merge-N.log (+ hint),
+    де N — найбільший id серед них; після цього всі файли з id <= N зайві.
+    Під час старту найновіший merge-N завантажується першим, далі data-файли з id > N.
+    """
+
+    def __init__(self, data_dir, max_file_bytes=64 << 20, sync=False,
+                 merge_interval=60.0, merge_min_dead_ratio=0.4):
+        self.data_dir = data_dir
+        self.max_file_bytes = max_file_bytes
+        self.sync = sync
+        self.merge_min_dead_ratio = merge_min_dead_ratio
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._files = {}            # file_id -> _Segment
+        self._keydir = {}
+        self._active = None
+        self._active_hint = []      # hint-записи активного файла (пишуться при rotate)
+        self.merges = 0
+
+        started = time.monotonic()
+        self._recover()
+        self.load_seconds = round(time.monotonic() - started, 3)
+
+        if merge_interval:
+            threading.Thread(target=self._merge_loop, args=(merge_interval,), daemon=True).start()
+
+    # ---------- recovery ----------
+    def _path(self, kind, file_id, ext="log"):
+        return os.path.join(self.data_dir, f"{kind}-{file_id:010d}.{ext}")
+
+    def _recover(self):
+        found = {"data": set(), "merge": set()}
+        for name in os.listdir(self.data_dir):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.data_dir, name))     # недописаний merge / hint
+                continue
+            m = FILE_RE.match(name)
+            if m and m.group(3) == "log":
+                found[m.group(1)].add(int(m.group(2)))
+
+        merged = max(found["merge"], default=None)
+        if merged is not None:
+            # файли, які вже увійшли в merge-N, але не встигли видалитися до краху
+            for kind, ids in (("merge", [i for i in found["merge"] if i < merged]),
+                              ("data", [i for i in found["data"] if i <= merged])):
+                for file_id in ids:
+                    for ext in ("log", "hint"):
+                        if os.path.exists(self._path(kind, file_id, ext)):
+                            os.remove(self._path(kind, file_id, ext))
+            self._load_segment(_Segment(merged, self._path("merge", merged)))
+
+        data_ids = sorted(i for i in found["data"] if merged is None or i > merged)
+        for file_id in data_ids:
+            self._load_segment(_Segment(file_id, self._path("data", file_id)))
+
+        next_id = max([merged or 0] + data_ids) + 1
+        self._open_active(next_id)
+
+    def _load_segment(self, seg):
+        if os.path.exists(seg.hint_path):
+            seg.seal()
+            entries = seg.load_hint()
+        else:
+            entries = list(seg.scan())
+            if not entries:
+                seg.close()
+                os.remove(seg.path)
+                return
+            # обірваний хвіст після краху відрізаємо, а на майбутнє пишемо hint
+            os.truncate(seg.path, seg.size)
+            seg.seal()
+            _write_hint(seg.hint_path, [(k, p, n, f) for k, p, n, f, _ in entries])
+        for key_bytes, value_pos, value_len, flags, record_size in entries:
+            self._apply(seg, key_bytes, (seg.file_id, value_pos, value_len, record_size), flags)
+        self._files[seg.file_id] = seg
+
+    def _apply(self, seg, key_bytes, loc, flags):
+        parts = json.loads(key_bytes)
+        if flags == FLAG_TABLE:
+            self._keydir.setdefault(parts[0], {})
+            return
+        table, key = parts[0], (parts[1], parts[2])
+        items = self._keydir.setdefault(table, {})
+        old = items.pop(key, None)
+        if old is not None:
+            (seg if old[0] == seg.file_id else self._files[old[0]]).dead += old[3]
+        if flags == FLAG_PUT:
+            items[key] = loc
+        else:
+            seg.dead += loc[3]                  # tombstone мертвий одразу — merge його викине
+
+    # ---------- active file ----------
+    def _open_active(self, file_id):
+        self._active = _Segment(file_id, self._path("data", file_id))
+        self._active_hint = []
+        self._files[file_id] = self._active
+
+    def _rotate(self):
+        seg = self._active
+        if not self.sync:
+            os.fsync(seg._fd)
+        _write_hint(seg.hint_path, self._active_hint)
+        seg.seal()
+        self._open_active(seg.file_id + 1)
+
+    def _append(self, key_bytes, value_bytes, flags):
+        """Дописує запис в активний файл; повертає loc (під self._lock)."""
+        record = _encode_record(key_bytes, value_bytes, flags)
+        seg = self._active
+        pos = seg.size
+        os.pwrite(seg._fd, record, pos)
+        if self.sync:
+            os.fsync(seg._fd)
+        seg.size += len(record)
+        value_pos = pos + HEADER.size + len(key_bytes)
+        self._active_hint.append((key_bytes, value_pos, len(value_bytes), flags))
+        loc = (seg.file_id, value_pos, len(value_bytes), len(record))
+        if seg.size >= self.max_file_bytes:
+            self._rotate()
+        return loc
+
+    def _mark_dead(self, loc):
+        seg = self._files.get(loc[0])
+        if seg is not None:
+            seg.dead += loc[3]
+
+    # ---------- API ----------
+    def create_table(self, table) -> bool:
+        with self._lock:
+            if table in self._keydir:
+                return False
+            self._append(_encode_key(table), b"", FLAG_TABLE)
+            self._keydir[table] = {}
+            return True
+
+    def tables(self) -> list:
+        return list(self._keydir)
+
+    def has_table(self, table) -> bool:
+        return table in self._keydir
+
+    def contains(self, table, key) -> bool:
+        return key in self._keydir.get(table, ())
+
+    def get(self, table, key):
+        raw = self.get_raw(table, key)
+        if raw is None:
+            raise KeyError(key)
+        return json.loads(raw)
+
+    def get_raw(self, table, key):
+        """Значення — уже JSON на диску, тож віддаємо bytes без json.loads/dumps."""
+        while True:
+            with self._lock:
+                loc = self._keydir.get(table, {}).get(key)
+                if loc is None:
+                    return None
+                seg = self._files[loc[0]]
+            # читаємо поза локом; якщо merge тим часом закрив файл — ключ уже в merge-файлі, шукаємо знову
+            try:
+                return seg.read(loc[1], loc[2])
+            except ValueError:
+                if not seg.closed or self._active.closed:      # сам рушій уже закрито
+                    raise
+
+    def put(self, table, key, value):
+        value_bytes = json.dumps(value, separators=(",", ":")).encode()
+        with self._lock:
+            items = self._keydir.setdefault(table, {})
+            loc = self._append(_encode_key(table, key), value_bytes, FLAG_PUT)
+            old = items.get(key)
+            items[key] = loc
+            if old is not None:
+                self._mark_dead(old)
+
+    def delete(self, table, key) -> bool:
+        with self._lock:
+            old = self._keydir.get(table, {}).pop(key, None)
+            if old is None:
+                return False
+            tomb = self._append(_encode_key(table, key), b"", FLAG_DELETE)
+            self._mark_dead(old)
+            self._mark_dead(tomb)
+            return True
+
+    def keys(self, table) -> list:
+        with self._lock:
+            return list(self._keydir.get(table, ()))
+
+    def items(self, table):
+        """Лінивий ітератор (key, value): значення читаються з диска по одному."""
+        for key in self.keys(table):
+            try:
+                yield key, self.get(table, key)
+            except KeyError:
+                continue                        # видалили, поки ітерували
+
+    def count(self, table) -> int:
+        return len(self._keydir.get(table, ()))
+
+    # ---------- merge ----------
+    def _merge_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                sealed = [s for s in list(self._files.values()) if s is not self._active]
+                total = sum(s.size for s in sealed)
+                if total and sum(s.dead for s in sealed) / total >= self.merge_min_dead_ratio:
+                    self.merge()
+            except Exception as e:
+                print(f"[Storage] merge failed: {e}")
+
+    def merge(self) -> bool:
+        """Переписує живі записи запечатаних файлів у один merge-файл. False — нічого зливати."""
+        with self._merge_lock:
+            with self._lock:
+                sealed = {fid: seg for fid, seg in self._files.items() if seg is not self._active}
+                if not sealed:
+                    return False
+                target = max(sealed)
+                tables = list(self._keydir)
+                live = [(table, key, loc) for table, items in self._keydir.items()
+                        for key, loc in items.items() if loc[0] in sealed]
+
+            # пишемо без локу: запечатані файли незмінні
+            path = self._path("merge", target)
+            hint, moved, pos = [], [], 0
+            with open(path + ".tmp", "wb") as f:
+                for table in tables:
+                    key_bytes = _encode_key(table)
+                    record = _encode_record(key_bytes, b"", FLAG_TABLE)
+                    f.write(record)
+                    hint.append((key_bytes, pos + HEADER.size + len(key_bytes), 0, FLAG_TABLE))
+                    pos += len(record)
+                for table, key, loc in live:
+                    key_bytes = _encode_key(table, key)
+                    value_bytes = sealed[loc[0]].read(loc[1], loc[2])
+                    record = _encode_record(key_bytes, value_bytes, FLAG_PUT)
+                    f.write(record)
+                    value_pos = pos + HEADER.size + len(key_bytes)
+                    hint.append((key_bytes, value_pos, len(value_bytes), FLAG_PUT))
+                    moved.append((table, key, loc, (target, value_pos, len(value_bytes), len(record))))
+                    pos += len(record)
+                f.flush()
+                os.fsync(f.fileno())
+            _write_hint(self._path("merge", target, "hint") + ".tmp", hint)
+
+            with self._lock:
+                os.replace(path + ".tmp", path)
+                os.replace(self._path("merge", target, "hint") + ".tmp", self._path("merge", target, "hint"))
+                merged = _Segment(target, path)
+                merged.seal()
+                for table, key, old_loc, new_loc in moved:
+                    items = self._keydir.get(table, {})
+                    if items.get(key) == old_loc:
+                        items[key] = new_loc
+                    else:
+                        merged.dead += new_loc[3]   # ключ змінили/видалили під час merge
+                for fid, seg in sealed.items():
+                    seg.close()
+                    del self._files[fid]
+                self._files[target] = merged
+                self.merges += 1
+
+            # старі файли вже не потрібні
+            for seg in sealed.values():
+                for p in (seg.path, seg.hint_path):
+                    if p != path and p != merged.hint_path and os.path.exists(p):
+                        os.remove(p)
+            return True
+
+    def memory_report(self) -> dict:
+        """У пам'яті лише keydir: ключ -> позиція у файлі (значення на диску)."""
+        with self._lock:
+            tables = {table: {"mode": "keydir", "items": len(items),
+                              "total_bytes": metrics.approx_table_bytes(items)}
+                      for table, items in self._keydir.items()}
+        return {"store_mode": "bitcask", "total_bytes": sum(t["total_bytes"] for t in tables.values()),
+                "tables": tables}
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = list(self._files.values())
+            return {
+                "engine": "bitcask",
+                "data_dir": self.data_dir,
+                "files": len(files),
+                "disk_bytes": sum(s.size for s in files),
+                "dead_bytes": sum(s.dead for s in files),
+                "keys": sum(len(items) for items in self._keydir.values()),
+                "merges": self.merges,
+                "load_seconds": self.load_seconds,
+            }
+
+    def close(self):
+        with self._merge_lock, self._lock:
+            if self._active.closed:
+                return
+            os.fsync(self._active._fd)
+            if self._active.size:
+                _write_hint(self._active.hint_path, self._active_hint)     # наступний старт — без scan
+            for seg in self._files.values():
+                seg.close()
+
+
+def open_engine(kind="memory", data_dir="data", **options):
+    if kind == "memory":
+        return MemoryEngine()
+    if kind == "bitcask":
+        return BitcaskEngine(data_dir, **options)
+    raise ValueError(f"Unknown storage engine {kind!r}")
@@ -0,0 +1,61 @@
+import importlib.util
+import os
+import sys
+import threading
+
+import pytest
+
+# модулі імпортуються плоско (import shard), як і під час запуску python coordinator.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_module(name, filename, **env):
+    """Ще один незалежний екземпляр модуля (напр. кілька shard-ів в одному процесі); env — до імпорту."""
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve(app):
+    """Flask app на випадковому порту у фоновому потоці; повертає (url, server)."""
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+@pytest.fixture(scope="session")
+def shards():
+    """Три in-memory shard.py: {url: модуль}."""
+    cluster, servers = {}, []
+    for i in range(3):
+        module = load_module(f"shard_{i}", "shard.py", STORAGE_ENGINE="memory")
+        url, server = serve(module.app)
+        cluster[url] = module
+        servers.append(server)
+    yield cluster
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def coordinator(shards):
+    """coordinator.py, чиє кільце складається з shard-ів фікстури shards."""
+    import coordinator
+    from hashing import ConsistentHashRing
+
+    ring = ConsistentHashRing()
+    for url in shards:
+        ring.add_node(url)
+    coordinator.switch_ring(ring)
+    return coordinator
+
+
+@pytest.fixture(scope="session")
+def client(coordinator):
+    return coordinator.app.test_client()
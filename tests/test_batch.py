@@ -0,0 +1,43 @@
+from hashing import ConsistentHashRing
+
+
+def items(table, n, pkey="p"):
+    return [{"table_name": table, "partition_key": f"{pkey}{i}", "sort_key": "s", "value": {"i": i}} for i in range(n)]
+
+
+def test_batch_write_scatters_by_owner(client, coordinator, shards):
+    client.post("/register_table", json={"table_name": "batch"})
+    batch = items("batch", 30)
+    r = client.post("/batch_write", json={"items": batch})
+    assert r.status_code == 200
+    assert [res["status"] for res in r.json()["results"]] == [201] * 30
+
+    # кожен item лежить лише на shard-і, якому його призначає кільце
+    for item in batch:
+        owner = coordinator.ring.get_node(f"batch:{item['partition_key']}")
+        for url, shard in shards.items():
+            assert shard.engine.contains("batch", (item["partition_key"], "s")) == (url == owner)
+
+
+def test_batch_write_reports_status_per_item(client):
+    client.post("/register_table", json={"table_name": "batch_status"})
+    client.post("/batch_write", json={"items": items("batch_status", 1)})
+    r = client.post("/batch_write", json={"items": items("batch_status", 2) + items("no_such_table", 1)})
+    assert [res["status"] for res in r.json()["results"]] == [400, 201, 404]
+
+
+def test_batch_get_keeps_request_order(client):
+    client.post("/register_table", json={"table_name": "batch_get"})
+    client.post("/batch_write", json={"items": items("batch_get", 5)})
+    keys = [{"table_name": "batch_get", "partition_key": f"p{i}", "sort_key": "s"} for i in (4, 9, 0)]
+    results = client.post("/batch_get", json={"keys": keys}).json()["results"]
+    assert [(res["partition_key"], res["found"]) for res in results] == [("p4", True), ("p9", False), ("p0", True)]
+    assert results[0]["value"] == {"i": 4}
+
+
+def test_unavailable_shard_fails_only_its_items(client, coordinator, monkeypatch):
+    dead = ConsistentHashRing()
+    dead.add_node("http://127.0.0.1:9")
+    monkeypatch.setattr(coordinator, "ring", dead)
+    results = client.post("/batch_write", json={"items": items("batch", 2, pkey="dead")}).json()["results"]
+    assert [res["status"] for res in results] == [503, 503]
@@ -0,0 +1,83 @@
+import pytest
+
+import bloom
+
+
+def keys(prefix, n):
+    return [(f"{prefix}{i}", f"s{i % 7}") for i in range(n)]
+
+
+def test_filters_round_trip_through_binary_format():
+    a = bloom.BloomFilter.for_capacity(1000)
+    b = bloom.BloomFilter.for_capacity(10)
+    for pkey, skey in keys("p", 500):
+        a.add(bloom.item_key(pkey, skey))
+    decoded = bloom.decode_filters(bloom.encode_filters({"a": a, "таблиця": b}))
+    assert set(decoded) == {"a", "таблиця"}
+    assert (decoded["a"].m, decoded["a"].k, decoded["a"].count, decoded["a"].bits) == (a.m, a.k, a.count, a.bits)
+
+    data = bloom.encode_filters({"a": a})
+    with pytest.raises(ValueError):
+        bloom.decode_filters(data[:-1])
+    with pytest.raises(ValueError):
+        bloom.decode_filters(b"NOPE" + data[4:])
+
+
+def test_table_filters_have_no_false_negatives():
+    stored = {"t": set(keys("p", 3000))}
+    filters = bloom.TableFilters(lambda: list(stored), lambda table: list(stored[table]))
+    decoded = bloom.decode_filters(filters.encode())
+    assert all(bloom.item_key(*key) in decoded["t"] for key in stored["t"])
+
+    # вставки після побудови — через add, і вони теж видимі в наступному encode
+    for key in keys("late", 100):
+        stored["t"].add(key)
+        filters.add("t", *key)
+    decoded = bloom.decode_filters(filters.encode())
+    assert all(bloom.item_key(*key) in decoded["t"] for key in stored["t"])
+    fp = sum(bloom.item_key(*key) in decoded["t"] for key in keys("absent", 2000))
+    assert fp < 2000 * filters.fpr * 3
+
+
+def test_etag_changes_across_restarts():
+    first = bloom.TableFilters(lambda: [], lambda table: [])
+    restarted = bloom.TableFilters(lambda: [], lambda table: [])
+    assert first.version == restarted.version
+    assert first.etag != restarted.etag
+    etag = first.etag
+    first.add("t", "p", "s")
+    assert first.etag != etag
+
+
+def test_coordinator_answers_negatives_from_pulled_filters(client, coordinator, shards, monkeypatch):
+    client.post("/register_table", json={"table_name": "bloom_t"})
+    client.post("/batch_write", json={"items": [{"table_name": "bloom_t", "partition_key": pkey, "sort_key": skey,
+                                                 "value": {"v": 1}} for pkey, skey in keys("p", 50)]})
+    # перший encode на shard-і будує фільтри, тож версія, з якою вони віддані, вже застаріла
+    for _ in range(2):
+        bloom.pull(coordinator.bloom_filters, coordinator.bloom_endpoints(), coordinator.fetch_bloom)
+    # повторний pull без змін — 304 за ETag
+    etags = {node: coordinator.bloom_filters.etag(node) for node in shards}
+    assert all(etags.values())
+    fetched = []
+    bloom.pull(coordinator.bloom_filters, coordinator.bloom_endpoints(),
+               lambda url, etag: fetched.append(coordinator.fetch_bloom(url, etag)) or fetched[-1])
+    assert [r.status_code for r in fetched] == [304] * len(shards)
+
+    asked = []
+    shard_item = coordinator.shard_item
+    monkeypatch.setattr(coordinator, "shard_item", lambda node, op, *args, **kwargs:
+                        asked.append(op) or shard_item(node, op, *args, **kwargs))
+    misses = [key for key in keys("absent", 50)
+              if not any(coordinator.bloom_filters.might_contain(node, "bloom_t", *key) for node in shards)]
+    assert misses
+    negatives = coordinator.bloom_filters.negatives
+    for pkey, skey in misses:
+        assert client.get(f"/read/bloom_t/{pkey}/{skey}").status_code == 404
+    assert coordinator.bloom_filters.negatives >= negatives + len(misses)
+    assert asked.count("read") == 0                         # shard не питали
+
+    # жодних хибно-негативних: кожен записаний ключ читається
+    for pkey, skey in keys("p", 50):
+        assert client.get(f"/read/bloom_t/{pkey}/{skey}").status_code == 200
+    coordinator.bloom_filters.clear()
@@ -0,0 +1,61 @@
+import hashlib
+
+import pytest
+
+from hashing import ConsistentHashRing, hash64, moved_ranges, range_filter
+
+KEYS = [f"table:pkey{i}" for i in range(20000)]
+
+
+def ring_of(*nodes, **weights):
+    ring = ConsistentHashRing()
+    for node in nodes:
+        ring.add_node(node, weights.get(node, 1))
+    return ring
+
+
+def test_hash_is_stable_across_processes():
+    # blake2b, а не hash(): значення не залежить від PYTHONHASHSEED
+    assert hash64("table:pkey") == int.from_bytes(hashlib.blake2b(b"table:pkey", digest_size=8).digest(), "big")
+
+
+def test_bulk_routing_matches_single_key_routing():
+    ring = ring_of("a", "b", "c")
+    assert ring.get_nodes(KEYS[:500]) == [ring.get_node(k) for k in KEYS[:500]]
+
+
+def test_keys_spread_evenly_and_follow_weights():
+    ring = ring_of("a", "b", "c", "d", d=2)
+    counts = {}
+    for node in ring.get_nodes(KEYS):
+        counts[node] = counts.get(node, 0) + 1
+    share = {node: n / len(KEYS) for node, n in counts.items()}
+    for node in "abc":
+        assert share[node] == pytest.approx(0.2, abs=0.04)
+    assert share["d"] == pytest.approx(0.4, abs=0.05)
+    assert sum(ring.ownership().values()) == pytest.approx(1.0)
+
+
+def test_adding_a_node_moves_only_its_share():
+    old = ring_of("a", "b", "c")
+    new = old.copy()
+    new.add_node("d")
+    before, after = old.get_nodes(KEYS), new.get_nodes(KEYS)
+    moved = [(b, a) for b, a in zip(before, after) if b != a]
+    assert all(a == "d" for _, a in moved)
+    assert len(moved) / len(KEYS) == pytest.approx(0.25, abs=0.05)
+
+    # moved_ranges описує рівно ці ключі
+    contains = {pair: range_filter(ranges) for pair, ranges in moved_ranges(old, new).items()}
+    for key, b, a in zip(KEYS, before, after):
+        assert any(f(key) for f in contains.values()) == (b != a)
+        if b != a:
+            assert contains[(b, a)](key)
+
+
+def test_empty_ring_and_unknown_node():
+    ring = ConsistentHashRing()
+    assert ring.get_node("k") is None
+    assert ring.get_nodes(["k", "j"]) == [None, None]
+    with pytest.raises(KeyError):
+        ring.remove_node("missing")
@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+import hotkeys
+
+
+def test_space_saving_counts_exactly_below_capacity():
+    sketch = hotkeys.SpaceSaving(capacity=8)
+    for key in "aabbbc":
+        sketch.offer(key)
+    assert sketch.top() == [("b", 3, 0), ("a", 2, 0), ("c", 1, 0)]
+    assert sketch.total == 6
+
+
+def test_space_saving_bounds_hold_under_eviction():
+    rng = random.Random(7)
+    # Zipf-подібний потік: кілька важких ключів і довгий хвіст
+    stream = [f"k{min(int(rng.paretovariate(1.0)), 500)}" for _ in range(20000)]
+    sketch = hotkeys.SpaceSaving(capacity=32)
+    for key in stream:
+        sketch.offer(key)
+
+    truth = Counter(stream)
+    assert len(sketch.counters) == 32
+    assert sketch.total == len(stream)
+    for key, (count, error) in sketch.counters.items():
+        assert count - error <= truth[key] <= count
+    # гарантія space-saving: ключ, частіший за total / capacity, не витіснено
+    for key, n in truth.items():
+        if n > len(stream) / 32:
+            assert key in sketch.counters
+    # heap тримає рівно один запис на кожен ключ sketch-а
+    assert sorted(key for _, _, key in sketch._heap) == sorted(sketch.counters)
+
+
+def test_space_saving_evicts_minimum_after_decay():
+    sketch = hotkeys.SpaceSaving(capacity=2)
+    for key in "aaaab":
+        sketch.offer(key)
+    sketch.decay()                      # a: 2, b: 0 — b прибрано
+    assert sketch.top() == [("a", 2, 0)]
+    sketch.offer("c")
+    sketch.offer("d")                   # витісняє c (count 1), а не a
+    assert sketch.top() == [("a", 2, 0), ("d", 2, 1)]
+
+
+def test_hot_key_cache_rejects_reads_started_before_invalidation():
+    cache = hotkeys.HotKeyCache(ttl=60)
+    key = ("t", "p", "s")
+    cache.put(key, cache.begin(), 200, b"cold")
+    assert cache.get(key) is None       # ще не гарячий — не кешується
+
+    cache.retain(frozenset({key}))
+    token = cache.begin()
+    cache.invalidate(key)
+    cache.put(key, token, 200, b"old")
+    assert cache.get(key) is None
+    cache.put(key, cache.begin(), 200, b"new")
+    assert cache.get(key) == (200, b"new")
+    cache.invalidate(key)
+    assert cache.get(key) is None
+
+
+def test_read_during_write_does_not_cache_old_value(client, coordinator, monkeypatch):
+    table, pkey, skey = "hot_t", "p", "s"
+    key = (table, pkey, skey)
+    client.post("/register_table", json={"table_name": table})
+    assert client.post("/create", json={"table_name": table, "partition_key": pkey, "sort_key": skey,
+                                        "value": {"v": 1}}).status_code == 201
+    monkeypatch.setattr(coordinator.hot_reads, "_hot", frozenset({key}))
+    coordinator.hot_cache.retain(frozenset({key}))
+    monkeypatch.setattr(coordinator.hot_cache, "_entries", {})
+
+    shard_item = coordinator.shard_item
+
+    def interleaved(node, op, *args, **kwargs):
+        if op == "delete":
+            # читання, що почалося після старту запису, але до того, як shard його застосував
+            assert coordinator.hot_read(node, table, pkey, skey, None)[0] == 200
+        return shard_item(node, op, *args, **kwargs)
+
+    monkeypatch.setattr(coordinator, "shard_item", interleaved)
+    assert client.delete(f"/delete/{table}/{pkey}/{skey}").status_code == 200
+    monkeypatch.setattr(coordinator, "shard_item", shard_item)
+
+    assert coordinator.hot_cache.get(key) is None
+    assert client.get(f"/read/{table}/{pkey}/{skey}").status_code == 404
+    coordinator.hot_cache.retain(frozenset())
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_pool
+
+
+class Upstream(BaseHTTPRequestHandler):
+    # werkzeug закриває з'єднання після кожної відповіді — keep-alive перевіряємо на http.server
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(0.5)
+        body = str(self.client_address[1]).encode()      # клієнтський порт = TCP-з'єднання
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_sequential_requests_reuse_one_connection(upstream):
+    ports = {http_pool.get(f"{upstream}/ok").text for _ in range(5)}
+    assert len(ports) == 1
+
+
+def test_fan_out_is_parallel_and_keeps_order():
+    started = time.perf_counter()
+    results = http_pool.fan_out(lambda i: (time.sleep(0.2), i)[1], range(8))
+    assert results == list(range(8))
+    assert time.perf_counter() - started < 0.2 * 4
+
+
+def test_fan_out_runs_single_call_inline():
+    assert http_pool.fan_out(lambda _: threading.current_thread().name, [1]) == [threading.current_thread().name]
+
+
+def test_timeout_and_unreachable_upstream_raise(upstream):
+    with pytest.raises(requests.Timeout):
+        http_pool.get(f"{upstream}/slow", timeout=(1, 0.1))
+    with pytest.raises(requests.ConnectionError):
+        http_pool.get("http://127.0.0.1:9/ok")
+    errors = dict(((labels, value) for _, labels, value in http_pool.upstream_requests.samples()))
+    assert errors['{upstream="http://127.0.0.1:9",method="GET",status="error"}'] >= 1
@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+import metrics
+from conftest import load_module
+
+
+def render(*defs):
+    registry = metrics.Registry()
+    for define in defs:
+        define(registry)
+    return registry.render()
+
+
+def test_counter_and_histogram_text_format():
+    def define(registry):
+        metrics.Counter("c_total", "c", ["route"], registry=registry).inc("/a", amount=2)
+        h = metrics.Histogram("h_seconds", "h", buckets=(0.1, 1.0), registry=registry)
+        h.observe(0.05)
+        h.observe(0.5)
+
+    text = render(define)
+    assert 'c_total{route="/a"} 2' in text
+    assert 'h_seconds_bucket{le="0.1"} 1' in text
+    assert 'h_seconds_bucket{le="+Inf"} 2' in text
+    assert "h_seconds_count 2" in text
+
+
+def test_same_metric_registered_twice_renders_once():
+    registry = metrics.Registry()
+    metrics.Gauge("items", "first", ["table"], callback=lambda: {("a",): 1}, registry=registry)
+    metrics.Gauge("items", "second", ["table"], callback=lambda: {("a",): 2}, registry=registry)
+    text = registry.render()
+    assert text.count("# TYPE items gauge") == 1
+    assert 'items{table="a"} 2' in text
+
+
+def test_conflicting_registration_is_rejected():
+    registry = metrics.Registry()
+    metrics.Gauge("x", "x", ["table"], registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Counter("x", "x", ["table"], registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Gauge("x", "x", ["shard"], registry=registry)
+
+
+def test_coordinator_metrics_have_one_type_line_per_name(client, shards):
+    client.get("/rebalance")
+    text = client.get("/metrics").text
+    names = re.findall(r"^# TYPE (\S+)", text, re.M)
+    assert names and len(names) == len(set(names))
+    assert 'http_requests_total{route="/rebalance"' in text
+
+
+def test_handlers_belong_to_the_served_module(coordinator):
+    # під `python coordinator.py` модуль — __main__: connexion не повинен імпортувати другу копію
+    served = load_module("coordinator_served", "coordinator.py")
+    served.rebalancer.status = {"state": "served"}
+    assert served.app.test_client().get("/rebalance").json()["state"] == "served"
+    assert coordinator.rebalancer.status.get("state") != "served"
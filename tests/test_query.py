@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def partition(client):
+    client.post("/register_table", json={"table_name": "query"})
+    for skey in ("b2", "a1", "b1", "c1", "b3"):
+        client.post("/create", json={"table_name": "query", "partition_key": "p", "sort_key": skey, "value": {"s": skey}})
+    return "/query/query/p"
+
+
+def sort_keys(client, url, **params):
+    body = client.get(url, params=params).json()
+    return [item["sort_key"] for item in body["items"]], body["last_evaluated_key"]
+
+
+def test_query_ranges_and_pagination(client, partition):
+    assert sort_keys(client, partition, begins_with="b") == (["b1", "b2", "b3"], None)
+    assert sort_keys(client, partition, start="a5", end="b2") == (["b1", "b2"], None)
+    assert sort_keys(client, partition, limit=2) == (["a1", "b1"], "b1")
+    assert sort_keys(client, partition, limit=2, exclusive_start_key="b1") == (["b2", "b3"], "b3")
+
+
+def test_query_unknown_table_is_404(client):
+    assert client.get("/query/no_such_table/p").status_code == 404
+
+
+def owner(coordinator, shards, table, pkey):
+    return shards[coordinator.ring.get_node(f"{table}:{pkey}")]
+
+
+def test_index_remove_only_drops_matching_key(coordinator, shards, partition):
+    shard = owner(coordinator, shards, "query", "p")
+    shard.index_remove("query", "p", "b15")          # немає в індексі — сусід b2 лишається
+    shard.index_remove("query", "p", "zz")
+    assert shard.sort_index["query"]["p"] == ["a1", "b1", "b2", "b3", "c1"]
+
+
+def test_query_skips_item_deleted_after_index_read(client, coordinator, shards, partition):
+    shard = owner(coordinator, shards, "query", "p")
+    shard.engine.delete("query", ("p", "c1"))          # вікно між delete і index_remove
+    try:
+        assert sort_keys(client, partition, begins_with="c") == ([], None)
+    finally:
+        shard.index_remove("query", "p", "c1")
+
+
+def test_shard_rejects_non_numeric_limit(partition, coordinator, shards):
+    shard = owner(coordinator, shards, "query", "p")
+    assert shard.app.test_client().get("/query/query/p?limit=ten").status_code == 400
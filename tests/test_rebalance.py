@@ -0,0 +1,80 @@
+import threading
+
+from hashing import ConsistentHashRing
+from rebalance import Rebalancer
+
+
+def ring_of(*nodes):
+    ring = ConsistentHashRing()
+    for node in nodes:
+        ring.add_node(node)
+    return ring
+
+
+def test_owners_many_without_migration_has_no_previous():
+    rebalancer = Rebalancer(lambda node: node)
+    ring = ring_of("a", "b")
+    keys = [f"t:{i}" for i in range(20)]
+    assert rebalancer.owners_many(ring, keys) == [(ring.get_node(k), None) for k in keys]
+
+
+def test_owners_many_during_migration_reports_moved_keys_only():
+    rebalancer = Rebalancer(lambda node: node)
+    old, new = ring_of("a"), ring_of("a", "b")
+    rebalancer.rings = (old, new)
+    for key in (f"t:{i}" for i in range(50)):
+        owner, previous = rebalancer.owners(ring_of("unused"), key)
+        assert owner == new.get_node(key)
+        assert previous == ("a" if owner == "b" else None)
+
+
+def test_owners_never_sees_half_swapped_rings():
+    rebalancer = Rebalancer(lambda node: node)
+    ring, rings = ring_of("a"), (ring_of("a"), ring_of("a", "b"))
+    stop, errors = threading.Event(), []
+
+    def toggle():
+        while not stop.is_set():
+            rebalancer.rings = rings
+            rebalancer.rings = None
+
+    thread = threading.Thread(target=toggle)
+    thread.start()
+    try:
+        for i in range(20000):
+            try:
+                rebalancer.owners(ring, f"t:{i}")
+            except Exception as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+
+
+def test_batch_write_rejects_keys_still_on_previous_owner(client, coordinator, shards, monkeypatch):
+    old_node, new_node = list(shards)[:2]
+    old, new = ring_of(old_node), ring_of(new_node)
+    client.post("/register_table", json={"table_name": "moving"})
+    monkeypatch.setattr(coordinator, "ring", old)
+    assert client.post("/create", json={"table_name": "moving", "partition_key": "p0", "sort_key": "s",
+                                        "value": {"v": "old"}}).status_code == 201
+
+    monkeypatch.setattr(coordinator.rebalancer, "rings", (old, new))
+    batch = [{"table_name": "moving", "partition_key": f"p{i}", "sort_key": "s", "value": {"v": "new"}}
+             for i in range(2)]
+    results = client.post("/batch_write", json={"items": batch}).json()["results"]
+    assert [(res["partition_key"], res["status"]) for res in results] == [("p0", 400), ("p1", 201)]
+    assert results[0]["error"] == "Item already exists"
+    assert not shards[new_node].engine.contains("moving", ("p0", "s"))
+    assert shards[new_node].engine.contains("moving", ("p1", "s"))
+
+
+def test_batch_write_fails_moving_keys_when_previous_owner_is_down(client, coordinator, shards, monkeypatch):
+    new_node = list(shards)[0]
+    monkeypatch.setattr(coordinator.rebalancer, "rings", (ring_of("http://127.0.0.1:9"), ring_of(new_node)))
+    client.post("/register_table", json={"table_name": "moving_down"})
+    item = {"table_name": "moving_down", "partition_key": "p", "sort_key": "s", "value": {}}
+    results = client.post("/batch_write", json={"items": [item]}).json()["results"]
+    assert results[0]["status"] == 503
+    assert not shards[new_node].engine.contains("moving_down", ("p", "s"))
@@ -0,0 +1,112 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import rpc
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def address():
+    gate = [threading.Event()]
+
+    def slow():
+        gate[0].wait(5)
+        return {"op": "slow"}, 200
+
+    def release():
+        # відпускає всі slow у польоті; наступні знову чекатимуть
+        gate[0].set()
+        gate[0] = threading.Event()
+        return {}, 200
+
+    def boom():
+        raise RuntimeError("handler failed")
+
+    server = rpc.RpcServer({
+        "echo": lambda **args: (args, 200),
+        "raw": lambda: (b'{"value":1}', 201),
+        "slow": slow,
+        "release": release,
+        "boom": boom,
+    }, blocking={"slow"}, applied_offset=lambda: 42)
+    port = free_port()
+    server.start(port, host="127.0.0.1")
+    return "127.0.0.1", port
+
+
+def test_request_response_round_trip(address):
+    client = rpc.RpcClient(address, connections=1)
+    r = client.request("echo", {"a": [1, "ї"]})
+    assert (r.status_code, r.json()) == (200, {"a": [1, "ї"]})
+    assert r.headers["X-Applied-Offset"] == "42"
+
+    r = client.request("raw", {})
+    assert (r.status_code, r.content) == (201, b'{"value":1}')
+
+
+def test_responses_are_matched_by_id_out_of_order(address):
+    client = rpc.RpcClient(address, connections=1)
+    conn = client._connection()
+    _, slow = conn.send("slow", {})
+    # швидкий запит на тому самому з'єднанні обганяє blocking op
+    _, fast = conn.send("echo", {"n": 1})
+    assert fast.result(2).json() == {"n": 1}
+    assert not slow.done()
+    client.request("release", {})
+    assert slow.result(2).json() == {"op": "slow"}
+
+
+def test_error_frames(address):
+    client = rpc.RpcClient(address)
+    r = client.request("nope", {})
+    assert r.status_code == 400 and "Unknown op" in r.json()["error"]
+    r = client.request("boom", {})
+    assert r.status_code == 500 and "handler failed" in r.json()["error"]
+
+
+def test_timeout_and_unreachable_are_connection_errors(address):
+    client = rpc.RpcClient(address, connections=1)
+    with pytest.raises(rpc.RpcTimeout):
+        client.request("slow", {}, timeout=0.05)
+    client.request("release", {})
+
+    with pytest.raises(requests.ConnectionError):
+        rpc.RpcClient(("127.0.0.1", free_port())).request("echo", {})
+
+
+def test_in_flight_requests_fail_when_connection_drops():
+    listener = socket.create_server(("127.0.0.1", 0))
+    def accept():
+        conn, _ = listener.accept()
+        conn.recv(1024)
+        time.sleep(0.05)
+        conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    client = rpc.RpcClient(listener.getsockname(), connections=1)
+    with pytest.raises(rpc.RpcError):
+        client.request("echo", {}, timeout=2)
+    listener.close()
+
+
+def test_shard_serves_item_ops_over_rpc(shards):
+    url, shard = next(iter(shards.items()))
+    port = free_port()
+    shard.rpc_server.start(port, host="127.0.0.1")
+    client = rpc.RpcClient(("127.0.0.1", port))
+    shard.app.test_client().post("/register_table", json={"table_name": "rpc_t"})
+    assert client.request("create", {"table_name": "rpc_t", "partition_key": "p", "sort_key": "s",
+                                     "value": {"v": 1}}).status_code == 201
+    r = client.request("read", {"table_name": "rpc_t", "partition_key": "p", "sort_key": "s"})
+    assert r.json()["value"] == {"v": 1}
+    assert client.request("exists", {"table_name": "rpc_t", "partition_key": "p", "sort_key": "x"}).json() == \
+        {"exists": False}
@@ -0,0 +1,162 @@
+import json
+
+import pytest
+
+import scan
+
+# два "shard-и" по одному сегменту: {stream_id: {pkey: [skey, ...]}}
+PARTITIONS = {
+    "a": {"p1": ["s1", "s2", "s3"], "p2": ["s1", "s2"]},
+    "b": {"q1": ["s1", "s2", "s3", "s4"]},
+}
+ALL_KEYS = sorted((stream_id, p, s) for stream_id, parts in PARTITIONS.items()
+                  for p, skeys in parts.items() for s in skeys)
+
+
+class FakeStream:
+    """Відповідь /scan shard-а у формі requests.Response; fail_after — обрив після стількох рядків."""
+
+    def __init__(self, body: bytes, fail_after=None, status_code=200):
+        self.lines = body.splitlines()
+        self.fail_after = fail_after
+        self.status_code = status_code
+        self.text = body.decode()
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_lines(self, chunk_size=None):
+        for i, line in enumerate(self.lines):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise ConnectionError("connection reset by shard")
+            yield line
+
+    def close(self):
+        pass
+
+
+def open_streams(failures=None):
+    """open_stream(stream_id, after) для TableScan; failures — {stream_id: fail_after} (один раз)."""
+    failures = dict(failures or {})
+    opened = []
+
+    def open_stream(stream_id, after):
+        opened.append((stream_id, after))
+        keys = scan.scan_keys(PARTITIONS[stream_id], after=after)
+        body = b"".join(scan.ndjson_segment(keys, lambda key: json.dumps(key[1]).encode(), chunk=2))
+        return FakeStream(body, failures.pop(stream_id, None))
+
+    return open_stream, opened
+
+
+def drain(table_scan):
+    data = b""
+    for chunk, _ in table_scan.chunks():
+        data += chunk
+    return data
+
+
+def test_scan_reads_every_item_once():
+    open_stream, _ = open_streams()
+    table_scan = scan.TableScan({"a": None, "b": None}, 1, open_stream).start()
+    items = [line for line in drain(table_scan).splitlines() if line]
+    assert len(items) == len(ALL_KEYS) == table_scan.items
+    assert table_scan.cursor is None
+
+
+def test_interrupted_scan_resumes_from_cursor():
+    # потік "a" обривається після першого chunk-а (2 items + курсор)
+    open_stream, opened = open_streams({"a": 3})
+    table_scan = scan.TableScan({"a": None, "b": None}, 1, open_stream, topology=["x"]).start()
+    before = b""
+    with pytest.raises(scan.ScanInterrupted) as e:
+        for chunk, _ in table_scan.chunks():
+            before += chunk
+    segments, positions, topology = scan.decode_cursor(e.value.cursor)
+    assert (segments, topology) == (1, ["x"])
+    assert positions.get("a") == ["p1", "s2"]
+
+    opened.clear()
+    after = drain(scan.TableScan(positions, segments, open_stream, topology).start())
+    # продовження відкриває лише незавершені потоки і з їхніх позицій
+    assert ("a", ["p1", "s2"]) in opened
+
+    def item_keys(data):
+        return sorted((item["partition_key"], item["sort_key"])
+                      for item in map(json.loads, filter(None, data.splitlines())))
+
+    expected = sorted((p, s) for _, p, s in ALL_KEYS)
+    assert item_keys(before + after) == expected        # нічого не загублено і не повторено
+
+
+def test_ndjson_response_reports_cursor_on_interrupt():
+    open_stream, _ = open_streams({"b": 0})
+    table_scan = scan.TableScan({"b": None}, 1, open_stream).start()
+    last = list(scan.ndjson_response(table_scan))[-1]
+    body = json.loads(last)
+    assert "ConnectionError" in body["error"]
+    assert scan.decode_cursor(body["cursor"])[1] == {"b": None}
+
+
+def test_parse_segment_args_validation():
+    assert scan.parse_segment_args({"segment": "1", "total_segments": "4", "after": '["p", "s"]'}) \
+        == (1, 4, ["p", "s"])
+    with pytest.raises(ValueError):
+        scan.parse_segment_args({"segment": "4", "total_segments": "4"})
+    with pytest.raises(ValueError):
+        scan.parse_segment_args({"after": '["p"]'})
+    with pytest.raises(ValueError):
+        scan.decode_cursor("not-a-cursor")
+
+
+def make_export(tmp_path, open_stream):
+    def make_scan(cursor):
+        positions, segments = {"a": None, "b": None}, 1
+        if cursor is not None:
+            segments, positions, _ = scan.decode_cursor(cursor)
+        return scan.TableScan(positions, segments, open_stream)
+
+    return scan.ExportJob("t", make_scan, export_dir=str(tmp_path))
+
+
+def test_export_retries_from_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan, "EXPORT_RETRY_DELAY_S", 0)
+    open_stream, _ = open_streams({"a": 3})
+    job = make_export(tmp_path, open_stream)
+    job._run()
+
+    assert job.status["state"] == "done", job.status["error"]
+    assert job.status["retries"] == 1
+    with open(job.path, "rb") as f:
+        lines = [json.loads(line) for line in f.read().splitlines()]
+    assert sorted((item["partition_key"], item["sort_key"]) for item in lines) \
+        == sorted((p, s) for _, p, s in ALL_KEYS)
+    assert job.status["items"] == len(lines)
+    assert not (tmp_path / (job.path.rsplit("/", 1)[1] + ".part")).exists()
+
+
+def test_export_gives_up_after_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan, "EXPORT_RETRY_DELAY_S", 0)
+    monkeypatch.setattr(scan, "EXPORT_RETRIES", 1)
+
+    def open_stream(stream_id, after):
+        return FakeStream(b'{"cursor":null}\n', fail_after=0)
+
+    job = make_export(tmp_path, open_stream)
+    job._run()
+    assert job.status["state"] == "failed"
+    assert job.status["retries"] == 2
+    assert not (tmp_path / job.path.rsplit("/", 1)[1]).exists()
+
+
+def test_export_does_not_retry_client_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan, "EXPORT_RETRY_DELAY_S", 0)
+
+    def open_stream(stream_id, after):
+        return FakeStream(b'{"error": "Table not found"}', status_code=404)
+
+    job = make_export(tmp_path, open_stream)
+    job._run()
+    assert job.status["state"] == "failed"
+    assert job.status["retries"] == 0
+    assert "Table not found" in job.status["error"]
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+import requests
+from flask import Flask
+
+import wire
+from conftest import serve
+
+BODY = {"results": [{"found": True, "value": {"n": 1, "s": "ї"}}]}
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    app = Flask(__name__)
+    app.add_url_rule("/respond", "respond", lambda: wire.respond(BODY))
+    app.add_url_rule("/raw", "raw", lambda: wire.json_response(b'{"value":[1,2]}', 404))
+    url, server = serve(app)
+    yield url
+    server.shutdown()
+
+
+def test_shard_answers_msgpack_when_asked(upstream):
+    r = requests.get(f"{upstream}/respond", headers=wire.ACCEPT_BINARY)
+    assert r.headers["Content-Type"] == wire.MSGPACK
+    assert wire.decode(r) == BODY
+
+
+def test_shard_answers_json_by_default(upstream):
+    r = requests.get(f"{upstream}/respond")
+    assert r.headers["Content-Type"].startswith(wire.JSON)
+    assert wire.decode(r) == BODY
+
+
+def test_without_msgpack_everything_is_json(upstream, monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", None)
+    r = requests.get(f"{upstream}/respond", headers={"Accept": wire.MSGPACK})
+    assert wire.decode(r) == BODY
+
+
+def test_passthrough_keeps_bytes_status_and_type(upstream):
+    r = requests.get(f"{upstream}/raw")
+    with Flask(__name__).app_context():
+        response = wire.passthrough(r)
+    assert (response.status_code, response.get_data(), response.mimetype) == (404, b'{"value":[1,2]}', wire.JSON)
+
+
+def test_coordinator_clients_always_get_json(client):
+    client.post("/register_table", json={"table_name": "wire"})
+    client.post("/create", json={"table_name": "wire", "partition_key": "p", "sort_key": "s", "value": {"v": 1}})
+    r = client.post("/batch_get", json={"keys": [{"table_name": "wire", "partition_key": "p", "sort_key": "s"}]},
+                    headers={"Accept": wire.MSGPACK})
+    assert r.headers["Content-Type"].startswith(wire.JSON)
+    assert json.loads(r.content)["results"][0]["value"] == {"v": 1}
@@ -0,0 +1,55 @@
+import json
+
+from flask import Response, jsonify, request
+
+try:
+    import msgpack
+except ImportError:             # msgpack необов'язковий: без нього coordinator і shard-и говорять JSON-ом
+    msgpack = None
+
+# ===========================
+#   WIRE FORMAT coordinator <-> shard
+# ===========================
+# Зовнішні клієнти завжди отримують JSON. Між coordinator-ом і shard-ами:
+#   - відповіді, які coordinator не змінює, передаються далі як є (passthrough) —
+#     без json.loads на coordinator-і і повторного jsonify
+#   - відповіді, які coordinator розбирає (scatter-gather, злиття сторінок під час міграції),
+#     shard віддає в msgpack, якщо його попросили через Accept і пакет встановлено
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# заголовок для запитів, відповідь на які coordinator декодує сам
+ACCEPT_BINARY = {"Accept": f"{MSGPACK}, {JSON};q=0.5"} if msgpack is not None else {}
+
+
+# ---------- shard side ----------
+def wants_msgpack() -> bool:
+    return msgpack is not None and request.accept_mimetypes.best_match([JSON, MSGPACK]) == MSGPACK
+
+
+def respond(obj, status=200):
+    """jsonify(obj) або msgpack — залежно від Accept запиту."""
+    if wants_msgpack():
+        return Response(msgpack.packb(obj), status, mimetype=MSGPACK)
+    return jsonify(obj), status
+
+
+def json_response(body, status=200):
+    """(body, status) спільних для HTTP і RPC обробників: dict або вже готовий JSON (bytes)."""
+    if isinstance(body, bytes):
+        return Response(body, status, mimetype=JSON)
+    return jsonify(body), status
+
+
+# ---------- coordinator side ----------
+def decode(r):
+    """Тіло відповіді shard-а (requests.Response) у JSON або msgpack."""
+    if msgpack is not None and r.headers.get("Content-Type", "").startswith(MSGPACK):
+        return msgpack.unpackb(r.content)
+    return json.loads(r.content)
+
+
+def passthrough(r):
+    """Відповідь shard-а клієнту як є: ті самі bytes, статус і Content-Type."""
+    return Response(r.content, r.status_code, content_type=r.headers.get("Content-Type", JSON))